@@ -1,5 +1,6 @@
 import logging
 from . import models
+from . import controllers
 from . import wizards
 from . import uninstall_hook
 from .post_init_hook import post_init_hook
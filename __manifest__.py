@@ -32,10 +32,16 @@
         'views/lark_tasklist_views.xml',
         'views/lark_task_views.xml',
         'views/lark_api_log_views.xml',
+        'views/lark_user_map_views.xml',
+        'views/lark_sync_job_views.xml',
+        'views/lark_sync_run_views.xml',
+        'views/lark_webhook_event_views.xml',
+        'views/lark_outbox_views.xml',
         'views/lark_menus.xml',
         
         # Data
         'data/mail_data.xml',
+        'data/lark_sync_cron.xml',
         # 'data/ir_cron.xml',
     ],
     "demo": [
@@ -59,6 +65,7 @@
         "python": [
             "lark_oapi",
             "requests",
+            "cryptography",
         ],
     },
     "summary": "Synchronize tasks between Odoo Projects and Lark Tasklists",
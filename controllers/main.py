@@ -2,7 +2,6 @@ import json
 import logging
 from odoo import http, _
 from odoo.http import request, Response
-import requests
 from datetime import datetime, timedelta
 
 _logger = logging.getLogger(__name__)
@@ -27,7 +26,12 @@ class LarkOAuthController(http.Controller):
             "app_id": lark_api.app_id,
             "app_secret": lark_api.app_secret,
         }
-        response = requests.post("https://accounts.larksuite.com/open-apis/authen/v1/authorize", json=payload)
+        client = lark_api._get_lark_client()
+        response = client.post(
+            "https://accounts.larksuite.com/open-apis/authen/v1/authorize",
+            json=payload,
+            authenticate=False,
+        )
         data = response.json()
         if data.get("code") != 0:
             return f"Failed to get token: {data.get('msg')}"
@@ -43,14 +47,25 @@ class LarkOAuthController(http.Controller):
         })
         return "Lark access token updated! You can close this window."
         
-    @http.route('/xcd_lark_project_sync/sync', type='http', auth='user', methods=['POST'], csrf=False)
+    @http.route('/xcd_lark_project_sync/sync', type='http', auth='user', methods=['POST'])
     def sync_tasks(self, **kwargs):
         """
         Handle task synchronization from Lark to Odoo
         
+        Only administrators may queue syncs, which then run as superuser.
+        
         Returns:
             JSON response with sync results
         """
+        if not request.env.user.has_group('base.group_system'):
+            return Response(
+                json.dumps({
+                    'success': False,
+                    'message': 'Only administrators can synchronize Lark tasks.'
+                }),
+                content_type='application/json',
+                status=403
+            )
         try:
             # Get the active Lark API configuration
             lark_api = request.env['lark.api'].sudo().search([], limit=1)
@@ -71,14 +86,19 @@ class LarkOAuthController(http.Controller):
                     project_id = int(project_id)
                 except (ValueError, TypeError):
                     project_id = None
+            projects = None
+            if project_id:
+                projects = request.env['project.project'].sudo().browse(project_id).exists()
             
-            # Start synchronization
-            result = lark_api.sync_lark_tasks(project_id=project_id)
+            # Queue the synchronization; the cron workers run the jobs
+            jobs = lark_api._enqueue_task_sync(projects=projects)
             
             return Response(
                 json.dumps({
                     'success': True,
-                    'result': result
+                    'result': {
+                        'queued_jobs': jobs.ids,
+                    }
                 }),
                 content_type='application/json'
             )
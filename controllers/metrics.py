@@ -0,0 +1,32 @@
+import hmac
+import logging
+
+from odoo import http
+from odoo.http import request, Response
+
+_logger = logging.getLogger(__name__)
+
+METRICS_TOKEN_PARAM = 'xcd_lark_project_sync.metrics_token'
+
+
+class LarkMetricsController(http.Controller):
+
+    @http.route('/xcd_lark_project_sync/metrics', type='http', auth='public', methods=['GET'], csrf=False)
+    def lark_metrics(self, token=None, **kwargs):
+        """Expose the Lark integration metrics to a Prometheus scraper.
+
+        The scraper authenticates with the configured metrics token, as a
+        Bearer authorization header or a ``token`` query parameter. The
+        endpoint answers 404 while no token is configured.
+        """
+        expected = request.env['ir.config_parameter'].sudo().get_param(METRICS_TOKEN_PARAM) or ''
+        if not expected:
+            return Response('metrics disabled\n', content_type='text/plain', status=404)
+        authorization = request.httprequest.headers.get('Authorization') or ''
+        if authorization.lower().startswith('bearer '):
+            token = authorization[7:].strip()
+        if not token or not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8')):
+            _logger.warning("Rejected Lark metrics scrape with an invalid token")
+            return Response('forbidden\n', content_type='text/plain', status=403)
+        body = request.env['lark.metric'].sudo()._render_prometheus()
+        return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,88 @@
+import json
+import logging
+
+from odoo import http
+from odoo.http import request, Response
+
+from ..models.lark_webhook_event import (
+    WEBHOOK_ENCRYPT_KEY_PARAM,
+    WEBHOOK_VERIFY_TOKEN_PARAM,
+    decrypt_lark_payload,
+    verify_lark_signature,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+def _json_response(data, status=200):
+    return Response(json.dumps(data), content_type='application/json', status=status)
+
+
+class LarkWebhookController(http.Controller):
+
+    @http.route('/xcd_lark_project_sync/webhook', type='http', auth='public', methods=['POST'], csrf=False)
+    def lark_webhook(self, **kwargs):
+        """Receive Lark event callbacks.
+
+        Answers the URL verification challenge, checks the signature and
+        verification token, then stores the event in the inbox. Once an
+        encrypt key is configured, only encrypted events are accepted and
+        all of them but the URL verification must carry a valid signature;
+        events are refused while neither a key nor a token is set. The task
+        itself is fetched and applied by the inbox cron, triggered right away,
+        so Lark gets its answer well within its 3 second timeout.
+        """
+        body = request.httprequest.get_data()
+        get_param = request.env['ir.config_parameter'].sudo().get_param
+        verify_token = get_param(WEBHOOK_VERIFY_TOKEN_PARAM) or ''
+        encrypt_key = get_param(WEBHOOK_ENCRYPT_KEY_PARAM) or ''
+
+        if not (verify_token or encrypt_key):
+            _logger.warning("Lark event refused: no webhook verification token nor encrypt key is configured")
+            return _json_response({'error': 'webhook not configured'}, status=403)
+
+        try:
+            event = json.loads(body or b'{}')
+        except ValueError:
+            return _json_response({'error': 'invalid json'}, status=400)
+        if not isinstance(event, dict):
+            return _json_response({'error': 'invalid payload'}, status=400)
+
+        if 'encrypt' in event:
+            if not encrypt_key:
+                _logger.warning("Encrypted Lark event received but no encrypt key is configured")
+                return _json_response({'error': 'encryption not configured'}, status=400)
+            try:
+                event = decrypt_lark_payload(encrypt_key, event['encrypt'])
+                if not isinstance(event, dict):
+                    raise ValueError("Decrypted Lark event is not an object")
+            except ValueError as e:
+                _logger.warning("Could not decrypt Lark event: %s", str(e))
+                return _json_response({'error': 'invalid payload'}, status=400)
+            # URL verification requests are encrypted but not signed
+            if event.get('type') != 'url_verification':
+                headers = request.httprequest.headers
+                if not verify_lark_signature(
+                        headers.get('X-Lark-Request-Timestamp'), headers.get('X-Lark-Request-Nonce'),
+                        encrypt_key, body, headers.get('X-Lark-Signature')):
+                    _logger.warning("Rejected Lark event with a missing or invalid signature")
+                    return _json_response({'error': 'invalid signature'}, status=401)
+        elif encrypt_key:
+            _logger.warning("Rejected a plaintext Lark event: an encrypt key is configured")
+            return _json_response({'error': 'encrypted payload required'}, status=400)
+
+        token = (event.get('header') or {}).get('token') or event.get('token')
+        if verify_token and token != verify_token:
+            _logger.warning("Rejected Lark event with an invalid verification token")
+            return _json_response({'error': 'invalid token'}, status=401)
+
+        if event.get('type') == 'url_verification':
+            return _json_response({'challenge': event.get('challenge')})
+
+        try:
+            stored = request.env['lark.webhook.event'].sudo()._ingest(event)
+        except ValueError as e:
+            return _json_response({'error': str(e)}, status=400)
+        if stored:
+            request.env.ref('xcd_lark_project_sync.ir_cron_process_lark_webhook_events').sudo()._trigger()
+        return _json_response({'ok': True})
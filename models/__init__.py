@@ -4,4 +4,11 @@ from . import lark_tasklist
 from . import lark_task
 from . import res_config_settings
 from . import project_extension
-from . import project
\ No newline at end of file
+from . import project
+from . import lark_sync_cursor
+from . import lark_user_map
+from . import lark_sync_job
+from . import lark_sync_run
+from . import lark_webhook_event
+from . import lark_outbox
+from . import lark_metrics
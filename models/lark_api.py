@@ -1,21 +1,166 @@
 import json
 import logging
+import random
 import time
 import traceback
-from datetime import datetime, timedelta
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 import requests
-from odoo import _, api, fields, models, http
+from markupsafe import Markup
+from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT as DATETIME_FORMAT
 
+from . import lark_client, lark_metrics
+from .lark_outbox import LARK_PUSH_FIELDS
+from .lark_sync_run import SyncMetrics, SyncProfiler, sync_phase
+from .lark_task import lark_payload_hash
+
 _logger = logging.getLogger(__name__)
+# Per-task detail of the syncs; set it to DEBUG to trace every task
+_trace_logger = logging.getLogger(__name__ + '.trace')
+
+DEBUG_MODE_PARAM = 'xcd_lark_project_sync.debug_mode'
+TRACE_SAMPLE_PARAM = 'xcd_lark_project_sync.trace_sample_rate'
+TASK_TRACE_FIELDS = ('id', 'summary', 'description', 'due', 'completed', 'assignee_id', 'parent_id')
+
+# Per-task outcome counters reported by _process_task_data
+SYNC_COUNTERS = ('created', 'updated', 'unchanged', 'failed')
+
+# lark.task values that differ from task to task: during a bulk sync a batch
+# of updates sets them with a single UPDATE, bypassing lark.task.write(); the
+# other values are written through the ORM per group of tasks. Only plain
+# columns of lark.task whose write has no side effect besides the recompute
+# of the stored fields depending on them belong here. Never add relational
+# fields (project_id, assignee_id, parent_id, task_id: their inverses and the
+# company checks need the ORM), active, company_id, status/state (tracked,
+# mapped to stages), task_sequence, or any field a write() override reacts to.
+LARK_TASK_ROW_FIELDS = ('name', 'description', 'lark_guid', 'lark_etag', 'due_date', 'json_data', 'lark_payload_hash')
+
+# Context of a bulk sync: no per-field tracking values, creation messages
+# or follower subscriptions on the synced records
+BULK_SYNC_CONTEXT = {
+    'lark_bulk_sync': True,
+    'tracking_disable': True,
+    'mail_create_nolog': True,
+    'mail_create_nosubscribe': True,
+    'mail_notrack': True,
+}
+
 
 def lark_ms_to_odoo_datetime(ms):
     if not ms:
         return False
     return datetime.fromtimestamp(int(ms) / 1000.0)
 
+
+def lark_ms_to_utc_datetime(ms):
+    """Convert a Lark millisecond timestamp to a naive UTC datetime, as stored by Odoo"""
+    if not ms:
+        return False
+    try:
+        return datetime.fromtimestamp(int(ms) / 1000.0, tz=timezone.utc).replace(tzinfo=None)
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+
+def filter_tasks_updated_since(tasks, watermark):
+    """Split ``tasks`` against an incremental sync watermark.
+
+    :param list tasks: raw or normalized Lark tasks of one page
+    :param datetime watermark: naive UTC watermark, or False for a full sync
+    :return: ``(changed_tasks, newest_updated_at)``; tasks without an
+             ``updated_at`` are always considered changed
+    """
+    changed = []
+    newest = False
+    for task in tasks:
+        updated = lark_ms_to_utc_datetime(task.get('updated_at'))
+        if updated and (not newest or updated > newest):
+            newest = updated
+        # >= rather than >: the watermark has second precision only
+        if not watermark or not updated or updated >= watermark:
+            changed.append(task)
+    return changed, newest
+
+
+def normalize_lark_task(task, tasklist_guid):
+    """Flatten a raw Lark task into the dict consumed by ``_process_task_data``.
+
+    Pure function (no ORM access) so it can run in the fetch threads.
+
+    :return: the normalized task, or None if it carries no id
+    """
+    task_id = task.get('id') or task.get('guid')
+    if not task_id:
+        _logger.warning("Skipping task with no ID or GUID: %s", task)
+        return None
+
+    # Get assignee if exists
+    assignee_id = None
+    if isinstance(task.get('assignee'), dict):
+        assignee_id = task['assignee'].get('id')
+    else:
+        # v2 tasks list their assignees among the members
+        for member in task.get('members') or []:
+            if member.get('role') == 'assignee' and member.get('id'):
+                assignee_id = member['id']
+                break
+
+    # Get due date if exists
+    due = None
+    if isinstance(task.get('due'), dict):
+        due = task['due']
+
+    processed_task = {
+        'id': task_id,
+        'guid': task.get('guid'),
+        'summary': task.get('summary', 'Unnamed Task'),
+        'description': task.get('description', ''),
+        'due': due,
+        'completed': task.get('completed', False),
+        'status': task.get('status', 'todo'),
+        'assignee_id': assignee_id,
+        # v2 tasks reference their parent by GUID
+        'parent_id': task.get('parent_task_guid') or task.get('parent_id'),
+        'etag': task.get('etag'),
+        'custom_fields': task.get('custom_fields', []),
+        'tasklist_guid': tasklist_guid,
+        'created_at': task.get('created_at'),
+        'updated_at': task.get('updated_at'),
+        'start': task.get('start'),
+        'source': task.get('source'),
+        'subtask_count': task.get('subtask_count', 0),
+        'is_milestone': task.get('is_milestone', False),
+        'origin': task.get('origin', {})
+    }
+
+    # Add custom fields if they exist
+    for field in task.get('custom_fields') or []:
+        field_name = field.get('name', '').lower().replace(' ', '_')
+        if field_name:
+            processed_task[f'custom_{field_name}'] = field.get('value')
+
+    return processed_task
+
+
+def normalize_lark_tasks(tasks, tasklist_guid):
+    """Normalize a list of raw Lark tasks, skipping the ones that fail"""
+    processed_tasks = []
+    for task in tasks or []:
+        try:
+            processed_task = normalize_lark_task(task, tasklist_guid)
+        except Exception as e:
+            _logger.error("Error processing task data: %s. Task: %s", str(e), task, exc_info=True)
+            continue
+        if processed_task:
+            processed_tasks.append(processed_task)
+    return processed_tasks
+
+
 class LarkAPI(models.Model):
     _name = "lark.api"
     _description = "Lark API Integration"
@@ -37,6 +182,44 @@ class LarkAPI(models.Model):
     default_project_id = fields.Many2one('project.project', string='Default Project', required=True,
         help='Default project to assign to tasks that are not associated with any tasklist')
 
+    # HTTP transport tuning
+    http_pool_size = fields.Integer(string="HTTP Pool Size", default=lark_client.DEFAULT_POOL_SIZE,
+        help='Maximum number of keep-alive connections kept open to Lark per worker process')
+    http_connect_timeout = fields.Float(string="Connect Timeout (s)", default=lark_client.DEFAULT_CONNECT_TIMEOUT)
+    http_read_timeout = fields.Float(string="Read Timeout (s)", default=lark_client.DEFAULT_READ_TIMEOUT)
+    http_max_retries = fields.Integer(string="Max Retries", default=lark_client.DEFAULT_MAX_RETRIES,
+        help='Retries of an idempotent call after a timeout, connection error or 5xx answer')
+    sync_concurrency = fields.Integer(string="Sync Concurrency", default=8,
+        help='Number of tasklists/sections fetched from Lark in parallel during a task sync')
+    full_sync_interval_hours = fields.Integer(string="Full Sync Every (hours)", default=24,
+        help='Task syncs only process tasks updated since the previous successful run; '
+             'a listing is fully reconciled again once this many hours have passed. 0 always runs a full sync.')
+    sync_cursor_ids = fields.One2many('lark.sync.cursor', 'lark_api_id', string="Sync Cursors", readonly=True)
+    mirror_project_tasks = fields.Boolean(string="Mirror to Project Tasks", default=False,
+        help='Create/update the linked project.task of every Lark task created or changed by a task sync')
+    commit_every = fields.Integer(string="Commit Every (tasks)", default=500,
+        help='Commit the task sync and save a resumable checkpoint every this many tasks; 0 keeps the whole sync in one transaction')
+    bulk_sync_mode = fields.Boolean(string="Bulk Sync Mode", default=True,
+        help='Disable mail tracking and follower subscription on synced tasks; '
+             'each project gets a single digest message per sync instead')
+    profile_next_sync = fields.Boolean(string="Profile Next Sync", default=False, copy=False,
+        help='Run the next task sync under cProfile with SQL query timings and attach the profile '
+             'and a summary of the slowest functions and queries to its sync run; cleared once used')
+    outbox_delay_seconds = fields.Integer(string="Push Delay (s)", default=10,
+        help='Odoo task changes are pushed to Lark this long after the last edit, '
+             'successive edits of a task being merged into one call')
+    webhook_coalesce_seconds = fields.Integer(string="Webhook Coalescing (s)", default=5,
+        help='Webhook events of a task are applied once the task has been quiet for this many seconds, '
+             'so a burst of edits costs a single fetch')
+    webhook_pending_count = fields.Integer(string="Pending Events", compute='_compute_webhook_stats')
+    webhook_lag = fields.Float(string="Inbox Lag (s)", compute='_compute_webhook_stats',
+        help='Age of the oldest pending webhook event')
+    webhook_events_hour = fields.Integer(string="Events (last hour)", compute='_compute_webhook_stats')
+    webhook_fetches_hour = fields.Integer(string="Task Fetches (last hour)", compute='_compute_webhook_stats',
+        help='Tasks fetched from Lark for the events of the last hour; the difference with the events is what coalescing saved')
+    webhook_avg_lag_hour = fields.Float(string="Average Lag (s)", compute='_compute_webhook_stats',
+        help='Average seconds between reception and application of the events of the last hour')
+
     @api.depends('token_expire')
     def _compute_token_remaining_time(self):
         for rec in self:
@@ -56,6 +239,35 @@ class LarkAPI(models.Model):
         for record in self:
             record.is_token_valid = bool(record.user_access_token and record.token_expire and record.token_expire > fields.Datetime.now())
 
+    def _compute_webhook_stats(self):
+        Event = self.env['lark.webhook.event']
+        now = fields.Datetime.now()
+        pending = {
+            lark_api.id: (count, oldest)
+            for lark_api, count, oldest in Event._read_group(
+                [('lark_api_id', 'in', self.ids), ('state', '=', 'pending')],
+                ['lark_api_id'], ['__count', 'received_date:min'])
+        }
+        processed = {
+            (lark_api.id, state): (count, lag)
+            for lark_api, state, count, lag in Event._read_group(
+                [('lark_api_id', 'in', self.ids), ('state', 'in', ('done', 'merged')),
+                 ('processed_date', '>=', now - timedelta(hours=1))],
+                ['lark_api_id', 'state'], ['__count', 'lag:avg'])
+        }
+        for record in self:
+            count, oldest = pending.get(record.id, (0, None))
+            done, done_lag = processed.get((record.id, 'done'), (0, 0.0))
+            merged, merged_lag = processed.get((record.id, 'merged'), (0, 0.0))
+            record.webhook_pending_count = count
+            record.webhook_lag = (now - oldest).total_seconds() if oldest else 0.0
+            record.webhook_events_hour = done + merged
+            record.webhook_fetches_hour = done
+            record.webhook_avg_lag_hour = (
+                (done * (done_lag or 0.0) + merged * (merged_lag or 0.0)) / (done + merged)
+                if done + merged else 0.0
+            )
+
     def get_access_token(self):
         """Return the user access token from the record"""
         self.ensure_one()
@@ -63,6 +275,61 @@ class LarkAPI(models.Model):
             raise UserError(_("Please provide a valid User Access Token."))
         return self.user_access_token
 
+    def _get_lark_client(self):
+        """Return a client bound to this connection's pooled keep-alive session"""
+        self.ensure_one()
+        self._configure_rate_limits()
+        session = lark_client.get_session(
+            ('lark.api', self.env.cr.dbname, self.id),
+            pool_size=self.http_pool_size,
+        )
+        return lark_client.LarkClient(
+            session,
+            access_token=self.user_access_token,
+            connect_timeout=self.http_connect_timeout,
+            read_timeout=self.http_read_timeout,
+            max_retries=self.http_max_retries,
+            dbname=self.env.cr.dbname,
+            app_id=self.app_id,
+        )
+
+    @api.model
+    def _configure_rate_limits(self):
+        """Apply the per-endpoint budgets stored in ``xcd_lark_project_sync.rate_limits``.
+
+        The parameter holds a JSON object such as
+        ``{"GET /open-apis/task/v2/tasklists/:id/tasks": {"rate": 20, "burst": 40}}``;
+        endpoints not listed fall back to the ``"*"`` entry.
+        """
+        raw = self.env['ir.config_parameter'].sudo().get_param('xcd_lark_project_sync.rate_limits')
+        limits = {}
+        if raw:
+            try:
+                limits = json.loads(raw)
+            except ValueError:
+                _logger.warning("Ignoring invalid xcd_lark_project_sync.rate_limits parameter: %s", raw)
+        lark_client.rate_limiter.configure(limits)
+
+    def _lark_request(self, method, url, **kwargs):
+        """Call the Lark Open API and return the ``data`` part of the response.
+
+        :param str method: HTTP method
+        :param str url: full URL or path relative to the Open API host
+        :raise UserError: on transport errors or a non-zero Lark error code
+        """
+        self.ensure_one()
+        try:
+            response = self._get_lark_client().request(method, url, **kwargs)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            raise UserError(_("Error connecting to Lark API: %s") % str(e)) from e
+        if data.get('code') != 0:
+            error_msg = f"API Error: {data.get('msg', 'Unknown error')} (Code: {data.get('code')})"
+            _logger.error(error_msg)
+            raise UserError(_(error_msg))
+        return data.get('data', {})
+
     def action_get_access_token(self):
         """Button action to manually get access token"""
         self.ensure_one()
@@ -160,83 +427,41 @@ class LarkAPI(models.Model):
                 
         return results
         
-    def _get_paginated_results(self, url, params=None):
-        """Handle paginated API responses"""
-        results = []
-        page_token = None
-        
+    def _iter_paginated_results(self, url, params=None):
+        """Yield the items of a paginated listing one page at a time"""
         try:
-            while True:
-                request_params = params.copy() if params else {}
-                if page_token:
-                    request_params['page_token'] = page_token
-                
-                _logger.info("Making request to %s with params: %s", url, request_params)
-                headers = {
-                    "Authorization": f"Bearer {self.user_access_token}",
-                    "Content-Type": "application/json; charset=utf-8"
-                }
-                _logger.debug("Request headers: %s", headers)
-                
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    params=request_params,
-                    timeout=30
-                )
-                
-                # import pdb; pdb.set_trace()
-                
-                # Log the raw response for debugging
-                _logger.debug("Response status: %s", response.status_code)
-                _logger.debug("Response headers: %s", response.headers)
-                _logger.debug("Response content: %s", response.text)
-                
-                response.raise_for_status()
-                
-                # Add PDB debugger for tasklist responses
-                data = response.json()
-                
-                if 'task/v2/tasklists' in url:
-                    # import pdb; pdb.set_trace()
-                    _logger.info("PDB: Debugging tasklist response. Type 'p data' to see the response data")
-                    _logger.info("Available variables: response, data, results, page_token")
-                    _logger.info("Tasklist items: %s", data.get('data', {}).get('items', []))
-                
-                if data.get('code') != 0:
-                    error_msg = f"API Error: {data.get('msg', 'Unknown error')} (Code: {data.get('code')})"
-                    _logger.error(error_msg)
-                    raise UserError(_(error_msg))
-                    
-                items = data.get('data', {}).get('items', [])
-                _logger.info("Retrieved %d items", len(items))
-                results.extend(items)
-                
-                # Check if there are more pages
-                if not data.get('data', {}).get('has_more'):
-                    _logger.info("No more pages to fetch")
-                    break
-                    
-                page_token = data.get('data', {}).get('page_token')
-                if not page_token:
-                    _logger.info("No page token in response")
-                    break
-                    
+            for items, _next_token in self._get_lark_client().iter_pages(url, params):
+                yield items
+        except lark_client.LarkAPIError as e:
+            _logger.error(str(e))
+            raise UserError(_(str(e))) from e
         except requests.exceptions.RequestException as e:
-            error_msg = f"Error making request to {url}"
-            if hasattr(e, 'response') and e.response is not None:
-                error_msg += f"\nStatus Code: {e.response.status_code}"
-                try:
-                    error_data = e.response.json()
-                    error_msg += f"\nError Code: {error_data.get('code')}"
-                    error_msg += f"\nError Message: {error_data.get('msg')}"
-                except ValueError:
-                    error_msg += f"\nResponse: {e.response.text}"
+            error_msg = self._format_request_error(url, e)
             _logger.error(error_msg, exc_info=True)
             raise UserError(_(error_msg)) from e
-                
+
+    def _get_paginated_results(self, url, params=None):
+        """Handle paginated API responses"""
+        results = []
+        for items in self._iter_paginated_results(url, params):
+            results.extend(items)
         return results
 
+    @api.model
+    def _format_request_error(self, url, error):
+        """Build a readable message out of a failed ``requests`` call"""
+        error_msg = f"Error making request to {url}"
+        response = getattr(error, 'response', None)
+        if response is not None:
+            error_msg += f"\nStatus Code: {response.status_code}"
+            try:
+                error_data = response.json()
+                error_msg += f"\nError Code: {error_data.get('code')}"
+                error_msg += f"\nError Message: {error_data.get('msg')}"
+            except ValueError:
+                error_msg += f"\nResponse: {response.text}"
+        return error_msg
+
     def sync_projects_from_lark(self):
         self.ensure_one()
         request_params = {}
@@ -320,7 +545,7 @@ class LarkAPI(models.Model):
                     continue
                     
             # Log the API call
-            self.env['lark.api.log'].create({
+            self.env['lark.api.log']._buffer({
                 'name': 'Sync Tasklists',
                 'api_link': tasklists_url,
                 'related_model': 'lark.api',
@@ -395,9 +620,97 @@ class LarkAPI(models.Model):
                 }
             }
 
-    def sync_tasks_from_lark(self):
-        """Sync tasks from Lark to Odoo for all linked projects."""
+    def action_full_sync_tasks(self):
+        """Button action: sync every task, ignoring the incremental watermarks"""
+        return self.sync_tasks_from_lark(full_sync=True)
+
+    def sync_tasks_from_lark(self, full_sync=False):
+        """Sync tasks from Lark to Odoo for all linked projects.
+
+        Each tasklist/section only processes the tasks updated since its last
+        successful sync, unless ``full_sync`` is set or its periodic full
+        reconciliation is due.
+        """
+        self.ensure_one()
+        result = self._run_task_sync(full_sync=full_sync)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Success'),
+                'message': _('Synchronized %(count)d tasks across %(projects)d projects: '
+                             '%(created)d created, %(updated)d updated, %(unchanged)d unchanged.') % {
+                    'count': result['tasks_synced'],
+                    'projects': result['projects_processed'],
+                    'created': result['tasks_created'],
+                    'updated': result['tasks_updated'],
+                    'unchanged': result['tasks_unchanged'],
+                },
+                'type': 'success',
+                'sticky': True,
+            }
+        }
+
+    def action_enqueue_task_sync(self):
+        """Button action: queue the task sync as per-listing jobs for the cron workers"""
+        self.ensure_one()
+        jobs = self._enqueue_task_sync()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Sync Queued'),
+                'message': _('%s sync jobs queued.') % len(jobs),
+                'type': 'info',
+                'sticky': False,
+            }
+        }
+
+    def _enqueue_task_sync(self, full_sync=False, projects=None):
+        """Split a task sync into one ``lark.sync.job`` per tasklist/section.
+
+        Returns:
+            recordset: the queued jobs (listings already queued are skipped)
+        """
+        self.ensure_one()
+        if projects is None:
+            projects = self._get_task_sync_projects()
+        specs = self._prepare_task_fetch_specs(projects, full_sync=full_sync)
+        return self.env['lark.sync.job']._enqueue(self, specs)
+
+    @api.model
+    def _cron_enqueue_task_sync(self):
+        """Cron entry point: queue a task sync for every Lark connection"""
+        for lark_api in self.search([]):
+            jobs = lark_api._enqueue_task_sync()
+            _logger.info("Queued %d Lark sync jobs for connection '%s'", len(jobs), lark_api.name)
+
+    def _get_task_sync_projects(self):
+        """Return the projects a task sync covers: every Lark-linked project plus the default one"""
+        self.ensure_one()
+        domain = [('lark_id', '!=', False)]
+        if self.default_project_id:
+            # Include the default project in the sync even if it's not linked to a Lark tasklist
+            domain = ['|', ('id', '=', self.default_project_id.id)] + domain
+        return self.env['project.project'].search(domain)
+
+    def _run_task_sync(self, full_sync=False, projects=None, kinds=None):
+        """Run a task sync and log it.
+
+        Args:
+            full_sync (bool): ignore the incremental watermarks
+            projects (recordset): projects to sync, all of them by default
+            kinds (set): only sync these listing kinds (see ``lark.sync.cursor``)
+
+        Returns:
+            dict: run summary, as stored on the main log
+        """
         self.ensure_one()
+        if self.bulk_sync_mode and not self.env.context.get('lark_bulk_sync'):
+            return self.with_context(**BULK_SYNC_CONTEXT)._run_task_sync(
+                full_sync=full_sync, projects=projects, kinds=kinds)
+        if self.profile_next_sync and not self.env.context.get('lark_profile_checked'):
+            return self._run_profiled_task_sync(full_sync=full_sync, projects=projects, kinds=kinds)
         _logger.info("\n=== STARTING FULL TASK SYNC FROM LARK ===\n")
         start_time = fields.Datetime.now()
         
@@ -410,144 +723,189 @@ class LarkAPI(models.Model):
             'response_type': 'success',
         }
         
+        # Only a run over the same projects and listings can be resumed
+        scope = 'all'
+        if projects is not None or kinds:
+            scope = json.dumps([sorted(projects.ids) if projects is not None else 'all', sorted(kinds or [])])
+        run = self.env['lark.sync.run']
+        
         try:
             # Get all projects, including the default one if specified
-            domain = [('lark_id', '!=', False)]
-            if self.default_project_id and self.default_project_id.id not in [p.id for p in self.env['project.project'].search(domain)]:
-                # Include the default project in the sync even if it's not linked to a Lark tasklist
-                domain = ['|', ('id', '=', self.default_project_id.id)] + domain
-                _logger.info("Including default project in sync: %s", self.default_project_id.name)
-                
-            projects = self.env['project.project'].search(domain)
+            if projects is None:
+                projects = self._get_task_sync_projects()
             if not projects:
                 error_msg = "No Lark-linked projects found in Odoo. Please sync projects or sections first."
                 _logger.warning("\n=== %s ===\n", error_msg)
                 main_log_vals.update({
                     'name': f"Failed: {error_msg}",
                     'response_type': 'fail',
-                    'response_data': json.dumps({'error': error_msg}, indent=2)
+                    'response_data': json.dumps({'error': error_msg})
                 })
                 self.env['lark.api.log'].create(main_log_vals)
                 raise UserError(_(error_msg))
                 
             # Create the main log entry for the sync operation
             main_log = self.env['lark.api.log'].create(main_log_vals)
+            
+            # Resume the last interrupted run of the same scope, if any
+            run = self.env['lark.sync.run']._start(self, full_sync=full_sync, scope=scope)
+            profiler = self.env.context.get('lark_profiler')
+            if profiler:
+                profiler.run_id = run.id
+            commit_every = self.commit_every if not self.env.registry.in_test_mode() else 0
+            if commit_every:
+                # Make the run (and its log) visible before any chunk is committed
+                self.env.cr.commit()
                 
             _logger.info("Found %d Lark-linked projects to process.", len(projects))
             tasks_synced_total = 0
             tasks_processed_total = 0
+            sync_totals = dict.fromkeys(SYNC_COUNTERS, 0)
             project_errors = []
+            client_stats = dict.fromkeys(lark_client.LarkClient.STAT_KEYS, 0)
+            # Run-wide Lark id -> lark.task id map and pending parent links,
+            # resolved once every page is upserted (see _link_lark_subtasks)
+            lark_task_ids = {}
+            parent_links = dict(run._pending_links())
+            subtasks_linked = 0
+            # Per-project counters for the bulk sync digest
+            project_digests = {}
+            
+            fetch_specs = self._prepare_task_fetch_specs(projects, full_sync=full_sync)
+            if kinds:
+                fetch_specs = [spec for spec in fetch_specs if spec['kind'] in kinds]
+            fetch_specs, done_specs = run._restore_specs(fetch_specs)
+            for spec in done_specs:
+                # Listings finished before the run was interrupted
+                for key in SYNC_COUNTERS:
+                    sync_totals[key] += spec['counts'][key]
+                tasks_synced_total += spec['counts']['created'] + spec['counts']['updated'] + spec['counts']['unchanged']
+                tasks_processed_total += spec['tasks_found']
+            all_specs = done_specs + fetch_specs
+            tasks_since_commit = 0
             
-            for project in projects:
-                project_start_time = fields.Datetime.now()
+            # Fetch stage: every tasklist/section is listed concurrently and
+            # streamed page by page; each page is transformed and upserted
+            # here as soon as it arrives, while the next ones are in flight
+            for event, spec, payload in self._stream_task_pages(fetch_specs):
+                project = self.env['project.project'].browse(spec['project_id'])
+                if event == 'page':
+                    if spec.get('error'):
+                        continue
+                    items, next_page_token = payload
+                    if not items:
+                        # Every task of the page is older than the watermark
+                        spec['page_token'] = next_page_token
+                        self.env['lark.sync.job']._heartbeat()
+                        continue
+                    try:
+                        process_start = time.monotonic()
+                        page_stats = self._process_task_data(
+                            items, project.id, id_map=lark_task_ids, parent_links=parent_links,
+                            metrics=spec['metrics'])
+                        for key in SYNC_COUNTERS:
+                            spec['counts'][key] += page_stats[key]
+                        spec['tasks_found'] += len(items)
+                        spec['process_seconds'] += time.monotonic() - process_start
+                        spec['page_token'] = next_page_token
+                    except Exception as e:
+                        # Stop fetching a project we can no longer write
+                        spec['error'] = e
+                        spec['cancelled'] = True
+                        continue
+                    tasks_since_commit += len(items)
+                    if commit_every and tasks_since_commit >= commit_every:
+                        subtasks_linked += self._commit_sync_chunk(run, all_specs, parent_links, lark_task_ids, spec)
+                        tasks_since_commit = 0
+                    self.env['lark.metric']._flush(force=False)
+                    self.env['lark.sync.job']._heartbeat()
+                    continue
+
+                # event == 'done': the listing is exhausted, payload is the fetch error if any
                 project_log_vals = {
                     'name': f"Sync tasks for project: {project.name}",
-                    'api_link': '#',
+                    'api_link': spec['url'],
                     'related_model': 'project.task',  # Using project.task for individual task syncs
                     'request_method': 'sync_project_tasks',
+                    'request_param': json.dumps(spec['request_param']),
                     'response_type': 'success',
                     'parent_id': main_log.id,  # Link to the main sync log
                 }
+                project_log_vals.update(self._get_client_log_counters(spec['client']))
+                for key, value in spec['client'].stats.items():
+                    client_stats[key] += value
+                counts = spec['counts']
+                digest = project_digests.setdefault(project.id, dict.fromkeys(SYNC_COUNTERS + ('errors',), 0))
+                for key in SYNC_COUNTERS:
+                    sync_totals[key] += counts[key]
+                    digest[key] += counts[key]
+                tasks_processed = counts['created'] + counts['updated'] + counts['unchanged']
+                tasks_synced_total += tasks_processed
+                tasks_processed_total += spec['tasks_found']
                 
-                try:
-                    _logger.info("\n=== PROCESSING PROJECT: %s (Lark ID: %s) ===", 
-                               project.name, project.lark_id)
-                    tasks_data = []
-                    
-                    if hasattr(project, 'lark_parent_tasklist_guid') and project.lark_parent_tasklist_guid:
-                        # Project is a Lark Section
-                        _logger.info("Project is a Lark Section")
-                        url = f"https://open.larksuite.com/open-apis/task/v2/sections/{project.lark_id}/tasks"
-                        _logger.info("Fetching tasks from section URL: %s", url)
-                        project_log_vals.update({
-                            'request_param': json.dumps({
-                                'section_id': project.lark_id,
-                                'project_id': project.id,
-                                'project_name': project.name
-                            }, indent=2)
-                        })
-                        tasks_data = self._get_paginated_results(url, {'page_size': 100})
-                    else:
-                        # Project is a Lark Tasklist
-                        _logger.info("Project is a Lark Tasklist")
-                        project_log_vals.update({
-                            'request_param': json.dumps({
-                                'tasklist_id': project.lark_id,
-                                'project_id': project.id,
-                                'project_name': project.name
-                            }, indent=2)
-                        })
-                        tasks_data = self._get_all_tasks_for_project(project.lark_id)
-                    
-                    _logger.info("Found %d tasks for project '%s'", 
-                               len(tasks_data) if tasks_data else 0, project.name)
-                    
-                    tasks_processed = self._process_task_data(tasks_data, project.id)
-                    tasks_synced_total += tasks_processed
-                    tasks_processed_total += len(tasks_data) if tasks_data else 0
-                    
-                    project_duration = (fields.Datetime.now() - project_start_time).total_seconds()
-                    _logger.info("Successfully processed %d/%d tasks for project '%s' in %.2f seconds\n", 
-                               tasks_processed, len(tasks_data) if tasks_data else 0, 
-                               project.name, project_duration)
-                    
-                    # Handle tasks without a tasklist if this is the default project
-                    if self.default_project_id and project.id == self.default_project_id.id:
-                        _logger.info("Checking for tasks without a tasklist...")
-                        try:
-                            # Get all tasks without a tasklist
-                            url = "https://open.larksuite.com/open-apis/task/v2/tasks"
-                            params = {
-                                'page_size': 100,
-                                'completed': False,  # Only get active tasks
-                                'tasklist_guid': 'none'  # Get tasks without a tasklist
-                            }
-                            tasks_without_tasklist = self._get_paginated_results(url, params)
-                            
-                            if tasks_without_tasklist:
-                                _logger.info("Found %d tasks without a tasklist", len(tasks_without_tasklist))
-                                tasks_processed += self._process_task_data(tasks_without_tasklist, project.id)
-                                tasks_processed_total += len(tasks_without_tasklist)
-                                _logger.info("Processed %d tasks without a tasklist", len(tasks_without_tasklist))
-                        except Exception as e:
-                            _logger.error("Error processing tasks without tasklist: %s", str(e), exc_info=True)
+                error = spec.get('error') or payload
+                run._record_listing(spec, error)
+                if not error:
+                    self._advance_sync_cursor(spec)
+                    spec['done'] = True
+                    _logger.info("Processed %d/%d tasks for project '%s' (%s) in %.2f seconds: "
+                                 "%d created, %d updated, %d unchanged\n",
+                               tasks_processed, spec['tasks_found'], project.name, spec['kind'],
+                               spec['process_seconds'], counts['created'], counts['updated'], counts['unchanged'])
                     
                     # Log successful project sync
                     project_log_vals.update({
                         'response_data': json.dumps({
-                            'tasks_found': len(tasks_data) if tasks_data else 0,
+                            'full_sync': spec['full_sync'],
+                            'watermark': str(spec['watermark'] or ''),
+                            'tasks_found': spec['tasks_found'],
+                            'tasks_unchanged_since_watermark': spec['tasks_skipped'],
                             'tasks_processed': tasks_processed,
-                            'duration_seconds': project_duration,
+                            'tasks_created': counts['created'],
+                            'tasks_updated': counts['updated'],
+                            'tasks_unchanged': counts['unchanged'],
+                            'tasks_failed': counts['failed'],
+                            'fetch_seconds': spec['fetch_seconds'],
+                            'process_seconds': spec['process_seconds'],
                             'status': 'success'
-                        }, indent=2)
+                        })
                     })
-                    
-                except Exception as e:
+                else:
+                    if isinstance(error, requests.exceptions.RequestException):
+                        error_text = self._format_request_error(spec['url'], error)
+                    else:
+                        error_text = str(error)
                     error_msg = f"Failed to sync tasks for project '{project.name}' (Lark ID: {project.lark_id})"
-                    _logger.error("\n=== %s ===\nError: %s\n", error_msg, str(e), exc_info=True)
+                    _logger.error("\n=== %s ===\nError: %s\n", error_msg, error_text, exc_info=error)
                     project_errors.append({
                         'project': project.name,
-                        'error': str(e)
+                        'error': error_text
                     })
+                    digest['errors'] += 1
                     
                     # Log failed project sync
                     project_log_vals.update({
                         'name': f"Failed: Sync tasks for project {project.name}",
                         'response_type': 'fail',
                         'response_data': json.dumps({
-                            'error': str(e),
+                            'error': error_text,
                             'project': project.name,
                             'lark_id': project.lark_id,
+                            'tasks_found': spec['tasks_found'],
+                            'tasks_processed': tasks_processed,
                             'status': 'failed',
-                            'traceback': traceback.format_exc()
-                        }, indent=2)
+                            'traceback': ''.join(traceback.format_exception(error)),
+                        })
                     })
                 
-                # Create log entry for this project sync
-                self.env['lark.api.log'].create(project_log_vals)
-                
-                # Small delay between project syncs to avoid rate limiting
-                time.sleep(1)
+                # Log entries of the projects are inserted together at commit
+                self.env['lark.api.log']._buffer(project_log_vals)
+
+            # Linkage stage: subtasks may arrive before their parent, so
+            # parents are only resolved once the whole run is upserted
+            subtasks_linked += self._link_lark_subtasks(parent_links, lark_task_ids)
+            if self.env.context.get('lark_bulk_sync'):
+                self._post_sync_digests(project_digests)
 
             # Calculate sync duration
             end_time = fields.Datetime.now()
@@ -561,17 +919,34 @@ class LarkAPI(models.Model):
                 'projects_processed': len(projects),
                 'tasks_processed': tasks_processed_total,
                 'tasks_synced': tasks_synced_total,
+                'tasks_created': sync_totals['created'],
+                'tasks_updated': sync_totals['updated'],
+                'tasks_unchanged': sync_totals['unchanged'],
+                'subtasks_linked': subtasks_linked,
                 'success_rate': (tasks_synced_total / tasks_processed_total * 100) if tasks_processed_total > 0 else 0,
                 'failed': tasks_processed_total - tasks_synced_total,
-                'project_errors': project_errors
+                'project_errors': project_errors,
+                'http': client_stats,
+                'run_id': run.id,
+                'resumed': run.resume_count,
+                'commits': run.commit_count,
             }
             
             # Update main log entry with final results
-            main_log.write({
-                'name': f"Completed: Sync Tasks from Lark - {tasks_synced_total} tasks synced",
-                'response_data': json.dumps(response_data, indent=2),
-                'response_type': 'success' if not project_errors else 'fail'
-            })
+            main_log.write(dict(
+                self._get_client_log_counters(client_stats),
+                name=f"Completed: Sync Tasks from Lark - {sync_totals['created']} created, "
+                     f"{sync_totals['updated']} updated, {sync_totals['unchanged']} unchanged",
+                response_data=json.dumps(response_data),
+                response_type='success' if not project_errors else 'fail',
+            ))
+            # Failed listings kept their watermark, the next run fetches them
+            # again: one failing tasklist must not pin the run for the others
+            run._finish(main_log, errors=project_errors)
+            lark_metrics.metrics.observe(
+                self.env.cr.dbname, 'lark_sync_duration_seconds', duration, lark_metrics.SYNC_DURATION_BUCKETS,
+                outcome='failed' if project_errors else 'success')
+            self.env['lark.metric']._flush()
             
             # Log final summary
             _logger.info("\n=== TASK SYNC COMPLETED ===")
@@ -583,43 +958,22 @@ class LarkAPI(models.Model):
             _logger.info("Total Tasks Synced:    %d (%.1f%%)", 
                         tasks_synced_total, 
                         (tasks_synced_total / tasks_processed_total * 100) if tasks_processed_total > 0 else 0)
+            _logger.info("Created / Updated / Unchanged: %d / %d / %d",
+                        sync_totals['created'], sync_totals['updated'], sync_totals['unchanged'])
             _logger.info("Failed:               %d\n", tasks_processed_total - tasks_synced_total)
             
-            # Update the main log entry with final status
-            if 'main_log' in locals() and main_log:
-                main_log.write({
-                    'name': f"Completed: Sync Tasks from Lark - {tasks_synced_total} tasks synced",
-                    'response_data': json.dumps({
-                        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'end_time': fields.Datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'duration_seconds': (fields.Datetime.now() - start_time).total_seconds(),
-                        'projects_processed': len(projects),
-                        'tasks_processed': tasks_processed_total,
-                        'tasks_synced': tasks_synced_total,
-                        'success_rate': (tasks_synced_total / tasks_processed_total * 100) if tasks_processed_total > 0 else 0,
-                        'failed': tasks_processed_total - tasks_synced_total,
-                        'project_errors': project_errors
-                    }, indent=2),
-                    'response_type': 'success' if not project_errors else 'fail'
-                })
-            
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('Success'),
-                    'message': _('Successfully synchronized %(count)d tasks across %(projects)d projects.') % {
-                        'count': tasks_synced_total,
-                        'projects': len(projects)
-                    },
-                    'type': 'success',
-                    'sticky': True,
-                }
-            }
+            return response_data
             
         except Exception as e:
             error_msg = f"General error in sync_tasks_from_lark: {str(e)}"
             _logger.error("\n=== %s ===\n", error_msg, exc_info=True)
+            # Whatever was committed so far is resumed by the next run
+            run._mark_interrupted(e)
+            lark_metrics.metrics.observe(
+                self.env.cr.dbname, 'lark_sync_duration_seconds',
+                (fields.Datetime.now() - start_time).total_seconds(), lark_metrics.SYNC_DURATION_BUCKETS,
+                outcome='interrupted')
+            self.env['lark.metric']._flush()
             
             # Update log entry with error details if main_log exists
             if 'main_log' in locals() and main_log:
@@ -632,182 +986,761 @@ class LarkAPI(models.Model):
                         'projects_processed': len(projects) if 'projects' in locals() else 0,
                         'tasks_processed': tasks_processed_total if 'tasks_processed_total' in locals() else 0,
                         'tasks_synced': tasks_synced_total if 'tasks_synced_total' in locals() else 0
-                    }, indent=2)
+                    })
                 })
             
             raise UserError(_("Error during task sync: %s") % str(e))
             
     
+    def _claim_profile_request(self):
+        """Clear the "Profile Next Sync" flag if it is still set and tell whether it was.
+
+        Test-and-clear on a cursor of its own: only one of concurrent syncs
+        gets the profile, and the flag stays cleared whatever the outcome of
+        the sync transaction.
+        """
+        self.ensure_one()
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("SET LOCAL lock_timeout = '5s'")
+                cr.execute("""
+                    UPDATE lark_api SET profile_next_sync = false
+                     WHERE id = %s AND profile_next_sync
+                 RETURNING id
+                """, [self.id])
+                claimed = bool(cr.fetchone())
+        except Exception as e:
+            _logger.warning("Could not claim the profiling of the next Lark sync: %s", str(e))
+            return False
+        self.invalidate_recordset(['profile_next_sync'])
+        return claimed
+
+    def _run_profiled_task_sync(self, **kwargs):
+        """Run a task sync under the profiler and attach the profile to its run"""
+        self.ensure_one()
+        checked = self.with_context(lark_profile_checked=True)
+        if not self._claim_profile_request():
+            # Another sync took the profile
+            return checked._run_task_sync(**kwargs)
+        profiler = SyncProfiler()
+        try:
+            with profiler:
+                result = checked.with_context(lark_profiler=profiler)._run_task_sync(**kwargs)
+        except Exception:
+            # The run was flagged as interrupted outside the transaction, keep its profile alike
+            self.env['lark.sync.run'].browse(profiler.run_id)._attach_profile(profiler, own_cursor=True)
+            raise
+        run = self.env['lark.sync.run'].browse(result['run_id'])
+        run._attach_profile(profiler)
+        _logger.info("Profiled Lark sync run %s: %s", run.id, run.profile_summary.split('\n', 1)[0])
+        return result
+
+    @api.model
+    def _get_client_log_counters(self, stats):
+        """Map LarkClient counters (a client or its stats dict) to lark.api.log fields"""
+        if isinstance(stats, lark_client.LarkClient):
+            stats = stats.stats
+        return {
+            'api_call_count': stats['api_calls'],
+            'retry_count': stats['retries'],
+            'rate_limited_count': stats['rate_limited'],
+            'breaker_trip_count': stats['breaker_trips'],
+            'breaker_rejected_count': stats['breaker_rejections'],
+        }
+
+    def _prepare_task_fetch_specs(self, projects, full_sync=False):
+        """Describe the Lark listing calls needed to sync ``projects``.
+
+        Specs are plain dicts so they can be handed to the fetch threads.
+        Each one carries the incremental watermark of its listing, or False
+        when a full reconciliation is requested or due.
+        """
+        self.ensure_one()
+        specs = []
+        for project in projects:
+            if project.lark_parent_tasklist_guid:
+                # Project is a Lark Section
+                specs.append({
+                    'project_id': project.id,
+                    'kind': 'section',
+                    'url': f"https://open.larksuite.com/open-apis/task/v2/sections/{project.lark_id}/tasks",
+                    'params': {'page_size': 100},
+                    'tasklist_guid': None,
+                    'request_param': {
+                        'section_id': project.lark_id,
+                        'project_id': project.id,
+                        'project_name': project.name
+                    },
+                })
+            elif project.lark_id:
+                # Project is a Lark Tasklist
+                url, params = self._get_tasklist_tasks_request(project.lark_id)
+                specs.append({
+                    'project_id': project.id,
+                    'kind': 'tasklist',
+                    'url': url,
+                    'params': params,
+                    'tasklist_guid': project.lark_id,
+                    'request_param': {
+                        'tasklist_id': project.lark_id,
+                        'project_id': project.id,
+                        'project_name': project.name
+                    },
+                })
+
+            # Tasks without a tasklist land in the default project
+            if self.default_project_id and project.id == self.default_project_id.id:
+                url, params = self._get_tasklist_tasks_request('none')
+                specs.append({
+                    'project_id': project.id,
+                    'kind': 'no_tasklist',
+                    'url': url,
+                    'params': params,
+                    'tasklist_guid': None,
+                    'request_param': {
+                        'tasklist_guid': 'none',
+                        'project_id': project.id,
+                        'project_name': project.name
+                    },
+                })
+
+        cursors = self.env['lark.sync.cursor']._get_cursor_map(self, projects)
+        now = fields.Datetime.now()
+        full_sync_interval = timedelta(hours=self.full_sync_interval_hours or 0)
+        for spec in specs:
+            cursor = cursors.get((spec['project_id'], spec['kind']))
+            full_due = (
+                full_sync
+                or not cursor
+                or not cursor.watermark
+                or not cursor.last_full_sync_date
+                or cursor.last_full_sync_date + full_sync_interval <= now
+            )
+            spec.update({
+                'cursor_id': cursor.id if cursor else False,
+                'full_sync': full_due,
+                'watermark': False if full_due else cursor.watermark,
+            })
+        return specs
+
+    def _advance_sync_cursor(self, spec):
+        """Move the watermark of a successfully synced listing forward.
+
+        A listing where some tasks failed to upsert keeps its watermark (and
+        its full sync stays due): the failed tasks are older than the newest
+        task of the listing and would be skipped until the next full sync.
+        """
+        self.ensure_one()
+        Cursor = self.env['lark.sync.cursor']
+        cursor = Cursor.browse(spec['cursor_id'])
+        now = fields.Datetime.now()
+        vals = {'last_success_date': now}
+        complete = not (spec.get('counts') or {}).get('failed')
+        if not complete:
+            _logger.warning("Listing %s of project %s had %d failed tasks, its watermark is not advanced",
+                            spec['kind'], spec['project_id'], spec['counts']['failed'])
+        elif spec['newest_updated_at'] and (not cursor or not cursor.watermark
+                                            or spec['newest_updated_at'] > cursor.watermark):
+            vals['watermark'] = spec['newest_updated_at']
+        if spec['full_sync'] and complete:
+            vals['last_full_sync_date'] = now
+        if cursor:
+            cursor.write(vals)
+        else:
+            vals.update({
+                'lark_api_id': self.id,
+                'project_id': spec['project_id'],
+                'kind': spec['kind'],
+                'lark_guid': spec['request_param'].get('tasklist_id') or spec['request_param'].get('section_id'),
+            })
+            spec['cursor_id'] = Cursor.create(vals).id
+
+    def _stream_task_pages(self, specs):
+        """Fetch the listings described by ``specs`` concurrently, page by page.
+
+        Worker threads only do HTTP and JSON decoding through the pooled
+        client; they never touch the ORM. Pages are handed back to the
+        caller's thread through a bounded queue, so all database writes stay
+        on the current cursor, wall-clock time is bounded by the slowest
+        tasklist, and memory by a few pages per worker rather than by the
+        size of the largest tasklist.
+
+        Yields ``('page', spec, (tasks, next_page_token))`` for every page and
+        finally ``('done', spec, error)`` once per spec, ``error`` being None
+        on success. Setting ``spec['cancelled']`` stops fetching that spec;
+        a spec restored from a checkpoint resumes at its ``page_token``.
+
+        Lark listings cannot be filtered on the update time, so incremental
+        syncs still list every page; the tasks older than the watermark are
+        dropped here and a page left empty is yielded without tasks, so that
+        the checkpoint still moves past it.
+        """
+        self.ensure_one()
+        if not specs:
+            return
+        max_workers = max(1, min(self.sync_concurrency or 1, len(specs)))
+        for spec in specs:
+            # One client per spec so retry/breaker counters can be reported per project
+            spec['client'] = self._get_lark_client()
+            spec['metrics'] = SyncMetrics(self.env.cr)
+            spec.update({'fetch_seconds': 0.0, 'process_seconds': 0.0})
+            # Progress counters may come from a checkpoint
+            spec.setdefault('tasks_found', 0)
+            spec.setdefault('tasks_skipped', 0)
+            spec.setdefault('counts', dict.fromkeys(SYNC_COUNTERS, 0))
+            spec.setdefault('newest_updated_at', False)
+            spec.setdefault('page_token', None)
+
+        pages = queue.Queue(maxsize=max_workers * 2)
+        stop = threading.Event()
+
+        def put(event):
+            while not stop.is_set():
+                try:
+                    pages.put(event, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(spec):
+            error = None
+            try:
+                page_iter = spec['client'].iter_pages(spec['url'], spec['params'], page_token=spec['page_token'])
+                while not (stop.is_set() or spec.get('cancelled')):
+                    start = time.monotonic()
+                    try:
+                        items, next_token = next(page_iter)
+                    except StopIteration:
+                        break
+                    finally:
+                        spec['fetch_seconds'] += time.monotonic() - start
+                    page_size = len(items)
+                    items, newest = filter_tasks_updated_since(items, spec['watermark'])
+                    spec['tasks_skipped'] += page_size - len(items)
+                    if newest and (not spec['newest_updated_at'] or newest > spec['newest_updated_at']):
+                        spec['newest_updated_at'] = newest
+                    if items and spec['tasklist_guid']:
+                        items = normalize_lark_tasks(items, spec['tasklist_guid'])
+                    if not put(('page', spec, (items, next_token))):
+                        return
+            except Exception as e:
+                error = e
+            put(('done', spec, error))
+
+        _logger.info("Fetching %d tasklists/sections with %d concurrent workers", len(specs), max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lark_fetch') as executor:
+            for spec in specs:
+                executor.submit(fetch, spec)
+            try:
+                remaining = len(specs)
+                while remaining:
+                    event = pages.get()
+                    if event[0] == 'done':
+                        remaining -= 1
+                    yield event
+            finally:
+                # Unblock workers if the consumer stopped early
+                stop.set()
+
+    @api.model
+    def _get_task_trace_rate(self):
+        """Share of the synced tasks whose detail is logged, 0 when per-task logging is off.
+
+        Every task is traced in debug mode or when the trace logger is set
+        to DEBUG; otherwise a random sample of ``trace_sample_rate`` tasks.
+        """
+        if not _trace_logger.isEnabledFor(logging.INFO):
+            return 0.0
+        if _trace_logger.isEnabledFor(logging.DEBUG):
+            return 1.0
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        if (get_param(DEBUG_MODE_PARAM) or 'False').lower() == 'true':
+            return 1.0
+        try:
+            return min(max(float(get_param(TRACE_SAMPLE_PARAM) or 0), 0.0), 1.0)
+        except ValueError:
+            return 0.0
+
     def _log_task_data(self, task_data, index=None):
-        """Safely log task data for debugging"""
+        """Log the main fields of one synced task as a single compact JSON line"""
         try:
-            import json
-            from datetime import datetime
-            
             log_data = {}
-            if index is not None:
-                _logger.info("\n=== Processing Task %s ===", index)
-                
-            # Safely extract and log task data
-            for field in ['id', 'summary', 'description', 'due', 'completed', 'assignee_id', 'parent_id']:
+            for field in TASK_TRACE_FIELDS:
                 value = task_data.get(field)
                 if isinstance(value, dict):
                     log_data[field] = {k: v for k, v in value.items() if not k.startswith('_')}
                 else:
                     log_data[field] = value
-            
-            _logger.info("Task data: %s", json.dumps(log_data, indent=2, default=str))
-            
+            _trace_logger.info("Task #%s: %s", index, json.dumps(log_data, default=str, separators=(',', ':')))
         except Exception as e:
-            _logger.error("Error logging task data: %s", str(e), exc_info=True)
+            _trace_logger.warning("Error logging task data: %s", str(e))
     
-    def _process_task_data(self, tasks_data, project_id):
+    def _process_task_data(self, tasks_data, project_id, id_map=None, parent_links=None, metrics=None):
         """Helper to process a list of Lark task data and sync them to lark.task model.
         
+        The page is mapped to lark.task values first, then upserted as one
+        batch (see ``_upsert_lark_tasks``) so the number of queries does not
+        grow with the page size.
+        
         Args:
             tasks_data (list): List of task dictionaries from Lark API
             project_id (int): ID of the Odoo project to sync tasks to
+            id_map (dict): optional run-wide ``{lark_id: lark.task id}``, filled
+                with every task of the page
+            parent_links (dict): optional run-wide ``{lark_id: parent lark_id}``,
+                filled for ``_link_lark_subtasks``
+            metrics (SyncMetrics): optional, timed ``transform``, ``upsert``
+                and ``mirror`` phases of the listing
             
         Returns:
-            int: Number of tasks successfully processed
+            dict: Number of tasks ``created``, ``updated``, ``unchanged`` and ``failed``
         """
-        _logger.info("=== PROCESSING %d TASKS FOR PROJECT %s ===", 
-                    len(tasks_data) if tasks_data else 0, project_id)
+        _logger.debug("Processing %d tasks for project %s", len(tasks_data or []), project_id)
         
-        LarkTask = self.env['lark.task']
         Project = self.env['project.project']
-        tasks_synced = 0
+        stats = dict.fromkeys(SYNC_COUNTERS, 0)
         
         # Get the project to check if it's linked to Lark
         project = Project.browse(project_id)
         if not project.exists():
             _logger.error("Project with ID %s not found", project_id)
-            return 0
+            stats['failed'] = len(tasks_data or [])
+            return stats
             
         if not project.lark_id:
             _logger.warning("Project %s is not linked to a Lark tasklist. Syncing to default project.", project.name)
             if not self.default_project_id:
                 _logger.error("No default project set. Cannot sync tasks without a project.")
-                return 0
+                stats['failed'] = len(tasks_data or [])
+                return stats
             project = self.default_project_id
             
-        _logger.info("Syncing tasks to project '%s' (ID: %s)", project.name, project.id)
-            
-        for idx, task_data in enumerate(tasks_data or [], 1):
-            # Use ID if available, otherwise use GUID
-            task_id = task_data.get('id') or task_data.get('guid')
-            if not task_id:
-                _logger.warning("Skipping task at index %d with no ID or GUID. Data: %s", idx, task_data)
-                continue
-                
-            try:
-                _logger.debug("\n=== Processing task %d/%d (ID: %s) ===", 
-                            idx, len(tasks_data), task_id)
-                
-                # Log task data structure for debugging
-                self._log_task_data(task_data, idx)
-                
-                # Try to find existing lark.task by lark_id
-                lark_task = LarkTask.search([('lark_id', '=', task_id)], limit=1)
-                _logger.debug("Found existing lark.task: %s", lark_task.id if lark_task else 'None')
+        # Per-task detail is only serialized for the traced tasks
+        trace_rate = self._get_task_trace_rate()
+
+        with sync_phase(metrics, 'transform'):
+            # Resolve every assignee of the page at once
+            user_map = self.env['lark.user.map']._resolve_users(
+                (task_data.get('assignee_id') for task_data in tasks_data or []), lark_api=self)
+        
+            # Map the whole page before touching the database
+            task_batch = {}
+            for idx, task_data in enumerate(tasks_data or [], 1):
+                # Use ID if available, otherwise use GUID
+                task_id = task_data.get('id') or task_data.get('guid')
+                if not task_id:
+                    _logger.warning("Skipping task at index %d with no ID or GUID. Data: %s", idx, task_data)
+                    stats['failed'] += 1
+                    continue
+                if task_id in task_batch:
+                    # Same task listed twice in a page: merged, the last version wins
+                    _logger.debug("Task %s listed twice in the page, keeping its last version", task_id)
                 
-                # Prepare task values with error handling
-                due_date = None
                 try:
-                    if isinstance(task_data.get('due'), dict):
-                        due_date = task_data.get('due', {}).get('date')
-                        if due_date:
-                            due_date = fields.Datetime.to_datetime(due_date)
-                            _logger.debug("Parsed due date: %s", due_date)
+                    if trace_rate and (trace_rate >= 1.0 or random.random() < trace_rate):
+                        self._log_task_data(task_data, idx)
+                    task_batch[task_id] = (task_data, self._prepare_lark_task_values(task_data, project_id, user_map))
                 except Exception as e:
-                    _logger.warning("Error parsing due date for task %s: %s", task_id, str(e))
-                
-                is_completed = task_data.get('completed', False)
-                task_name = task_data.get('summary', 'Unnamed Task')
-                
-                # Get the Odoo user ID if assignee exists
-                odoo_user_id = self._find_odoo_user_id(task_data.get('assignee_id'))
-                
-                # Map Lark status to lark.task status
-                status_map = {
-                    'completed': 'done',
-                    'in_progress': 'in_progress',
-                    'archived': 'archived'
-                }
-                status = status_map.get(task_data.get('status', 'todo').lower(), 'todo')
-                
-                values = {
-                    'project_id': project_id,
-                    'name': task_name,
-                    'description': task_data.get('description', ''),
-                    'lark_id': task_id,
-                    'lark_guid': task_data.get('guid'),
-                    'lark_etag': task_data.get('etag'),
-                    'due_date': due_date or False,
-                    'assignee_id': odoo_user_id or False,
-                    'status': status,
-                    'json_data': json.dumps(task_data, indent=2) if task_data else '{}',
-                }
-                
-                # Log values except description to keep logs clean
-                log_values = {k: v for k, v in values.items() 
-                             if not k.startswith(('description', 'json_data'))}
-                _logger.debug("Task values: %s", log_values)
-                
-                # Handle parent task if exists
-                parent_id = task_data.get('parent_id')
-                if parent_id:
-                    parent_task = LarkTask.search([('lark_id', '=', parent_id)], limit=1)
-                    if parent_task:
-                        values['parent_id'] = parent_task.id
-                        _logger.debug("Linked to parent task ID: %s", parent_task.id)
+                    _logger.error("Error mapping lark.task %s: %s", task_id, str(e), exc_info=True)
+                    stats['failed'] += 1
+        
+        if parent_links is not None:
+            for task_id, (task_data, values) in task_batch.items():
+                parent_links[task_id] = task_data.get('parent_id') or False
+        
+        upsert_stats = self._upsert_lark_tasks(task_batch, id_map=id_map, metrics=metrics)
+        for key in SYNC_COUNTERS:
+            stats[key] += upsert_stats[key]
+        for key in SYNC_COUNTERS:
+            if stats[key]:
+                lark_metrics.metrics.inc(self.env.cr.dbname, 'lark_sync_tasks_total', stats[key], result=key)
                 
+        # A single line per page, whatever its size
+        _logger.info("Project '%s' (ID: %s): page of %d tasks, %d created, %d updated, %d unchanged, %d failed",
+                     project.name, project.id, len(tasks_data or []),
+                     stats['created'], stats['updated'], stats['unchanged'], stats['failed'])
+        
+        return stats
+
+    def _prepare_lark_task_values(self, task_data, project_id, user_map=None):
+        """Map one normalized Lark task to ``lark.task`` values.
+        
+        Args:
+            user_map (dict): optional ``{lark user id: res.users id}`` already
+                resolved for the page
+        
+        Returns:
+            dict: values for ``create``/``write``, including ``lark_payload_hash``
+        """
+        task_id = task_data.get('id') or task_data.get('guid')
+        
+        # Prepare task values with error handling
+        due_date = None
+        try:
+            if isinstance(task_data.get('due'), dict):
+                due_date = task_data.get('due', {}).get('date')
+                if due_date:
+                    due_date = fields.Datetime.to_datetime(due_date)
+        except Exception as e:
+            _logger.warning("Error parsing due date for task %s: %s", task_id, str(e))
+            due_date = None
+        
+        # Get the Odoo user ID if assignee exists
+        odoo_user_id = self._find_odoo_user_id(task_data.get('assignee_id'), user_map)
+        
+        # Map Lark status to lark.task status
+        status_map = {
+            'completed': 'done',
+            'in_progress': 'in_progress',
+            'archived': 'archived'
+        }
+        status = status_map.get(task_data.get('status', 'todo').lower(), 'todo')
+        
+        return {
+            'project_id': project_id,
+            'name': task_data.get('summary', 'Unnamed Task'),
+            'description': task_data.get('description', ''),
+            'lark_id': task_id,
+            'lark_guid': task_data.get('guid'),
+            'lark_etag': task_data.get('etag'),
+            'due_date': due_date or False,
+            'assignee_id': odoo_user_id or False,
+            'status': status,
+            'json_data': json.dumps(task_data, indent=2) if task_data else '{}',
+            'lark_payload_hash': lark_payload_hash(task_data),
+        }
+
+    def _upsert_lark_tasks(self, task_batch, id_map=None, metrics=None):
+        """Create or update a batch of lark.task records.
+        
+        One query resolves every existing ``lark_id`` of the batch and new
+        tasks are inserted with a single multi-create. In bulk sync mode
+        (no tracking), the per-task values of the updates are set with one
+        ``UPDATE ... FROM unnest(...)`` (see ``_write_lark_task_rows``) and
+        the shared ones (project, assignee, status) with one ``write`` per
+        distinct combination, only for the tasks where they changed; so the
+        number of queries does not grow with the page size. Outside of a
+        bulk sync every task is written on its own, through ``write``, to
+        keep its tracking values. Should a
+        batch statement fail, it is replayed record by record so that one
+        bad task does not lose the whole page.
+        
+        Args:
+            task_batch (dict): ``{lark_id: (task_data, values)}``
+            id_map (dict): optional ``{lark_id: lark.task id}`` to fill with
+                the records of the batch
+            metrics (SyncMetrics): optional, timed ``upsert`` and ``mirror`` phases
+            
+        Returns:
+            dict: Number of tasks ``created``, ``updated``, ``unchanged`` and ``failed``
+        """
+        LarkTask = self.env['lark.task']
+        stats = dict.fromkeys(SYNC_COUNTERS, 0)
+        if not task_batch:
+            return stats
+        
+        with sync_phase(metrics, 'upsert'):
+            existing = LarkTask.with_context(active_test=False).search_fetch(
+                [('lark_id', 'in', list(task_batch))],
+                ['lark_id', 'lark_etag', 'lark_payload_hash', 'project_id', 'assignee_id', 'status'],
+            )
+            existing_by_lark_id = {task.lark_id: task for task in existing}
+            if id_map is not None:
+                id_map.update((lark_id, task.id) for lark_id, task in existing_by_lark_id.items())
+        
+            to_create = []
+            to_write = []
+            changed = LarkTask
+            for lark_id, (task_data, values) in task_batch.items():
+                lark_task = existing_by_lark_id.get(lark_id)
+                if not lark_task:
+                    to_create.append(values)
+                # Nothing changed in Lark nor in its Odoo mapping since the last sync: skip the write
+                # (and the tracking, recomputes and json_data rewrite it costs)
+                elif lark_task._is_unchanged_from_lark(task_data.get('etag'), values):
+                    stats['unchanged'] += 1
+                else:
+                    to_write.append((lark_task, values))
+        
+            if to_create:
                 try:
-                    if lark_task:
-                        # Update existing lark.task
+                    with self.env.cr.savepoint():
+                        created = LarkTask.create(to_create)
+                    stats['created'] += len(to_create)
+                    changed |= created
+                    if id_map is not None:
+                        id_map.update(zip((values['lark_id'] for values in to_create), created.ids))
+                except Exception as e:
+                    _logger.warning("Batch create of %d lark.task failed, retrying one by one: %s",
+                                    len(to_create), str(e))
+                    for values in to_create:
+                        try:
+                            with self.env.cr.savepoint():
+                                created = LarkTask.create(values)
+                            stats['created'] += 1
+                            changed |= created
+                            if id_map is not None:
+                                id_map[values['lark_id']] = created.id
+                        except Exception as e:
+                            _logger.error("Error creating lark.task %s (%s): %s",
+                                         values.get('name'), values.get('lark_id'), str(e), exc_info=True)
+                            stats['failed'] += 1
+        
+            if to_write and self.env.context.get('lark_bulk_sync'):
+                try:
+                    with self.env.cr.savepoint():
+                        self._write_lark_task_rows(to_write)
+                    stats['updated'] += len(to_write)
+                    changed |= LarkTask.union(*(lark_task for lark_task, values in to_write))
+                    to_write = []
+                except Exception as e:
+                    _logger.warning("Batch update of %d lark.task failed, retrying one by one: %s",
+                                    len(to_write), str(e))
+            for lark_task, values in to_write:
+                try:
+                    with self.env.cr.savepoint():
                         lark_task.write(values)
-                        _logger.info("Updated lark.task '%s' (Lark ID: %s) in project '%s'", 
-                                   task_name, task_id, project.name)
-                    else:
-                        # Create new lark.task
-                        lark_task = LarkTask.create(values)
-                        _logger.info("Created new lark.task '%s' (Lark ID: %s) in project '%s' (Odoo ID: %s)", 
-                                   task_name, task_id, project.name, lark_task.id)
-                    
-                    tasks_synced += 1
-                    
+                    stats['updated'] += 1
+                    changed |= lark_task
                 except Exception as e:
-                    _logger.error("Error saving lark.task %s (%s): %s", 
-                                 task_name, task_id, str(e), exc_info=True)
-                    continue
-                
+                    _logger.error("Error saving lark.task %s (%s): %s",
+                                 values.get('name'), lark_task.lark_id, str(e), exc_info=True)
+                    stats['failed'] += 1
+        
+            _logger.debug("Upserted %d lark.task: %d created, %d updated, %d unchanged, %d failed",
+                         len(task_batch), stats['created'], stats['updated'], stats['unchanged'], stats['failed'])
+        
+
+        if metrics:
+            metrics.rows += stats['created'] + stats['updated']
+        # Mirroring stage: only the rows that changed in this batch
+        if changed and self.mirror_project_tasks:
+            try:
+                with sync_phase(metrics, 'mirror'), self.env.cr.savepoint():
+                    mirror_stats = changed._sync_odoo_tasks()
+                if metrics:
+                    metrics.rows += mirror_stats['created'] + mirror_stats['updated']
             except Exception as e:
-                task_id_str = str(task_id) if 'task_id' in locals() else 'unknown'
-                _logger.error("Error syncing lark.task %s: %s", task_id_str, str(e), exc_info=True)
+                _logger.error("Error mirroring %d lark.task to project.task: %s", len(changed), str(e), exc_info=True)
+        return stats
+
+    @api.model
+    def _write_lark_task_rows(self, updates):
+        """Write ``[(lark_task, values)]`` with a constant number of queries.
+
+        The per-task fields (``LARK_TASK_ROW_FIELDS``) are set by one UPDATE
+        joined to the unnested new values, the computed fields depending on
+        them are then recomputed by the ORM, as after a ``write``. The
+        remaining values are only written where they differ, with one
+        ``write`` per distinct set.
+
+        Only meant for bulk syncs (``lark_bulk_sync`` in the context): the
+        UPDATE writes no tracking values and skips ``lark.task.write``.
+        """
+        LarkTask = self.env['lark.task']
+        task_fields = LarkTask._fields
+        tasks = LarkTask.union(*(lark_task for lark_task, values in updates))
+        tasks.check_access('write')
+        LarkTask.flush_model(LARK_TASK_ROW_FIELDS)
+        columns = [('id', 'int4', [lark_task.id for lark_task, values in updates])]
+        for fname in LARK_TASK_ROW_FIELDS:
+            field = task_fields[fname]
+            columns.append((fname, field.column_type[1], [
+                field.convert_to_column(values.get(fname), lark_task) for lark_task, values in updates
+            ]))
+        self.env.cr.execute("""
+            UPDATE lark_task AS t
+               SET %s, write_date = (now() at time zone 'UTC'), write_uid = %%s
+              FROM (SELECT %s) AS v
+             WHERE t.id = v.id
+        """ % (
+            ', '.join(f'{fname} = v.{fname}' for fname in LARK_TASK_ROW_FIELDS),
+            ', '.join(f'unnest(%s::{column_type}[]) AS {name}' for name, column_type, values in columns),
+        ), [self.env.uid] + [values for name, column_type, values in columns])
+        tasks.invalidate_recordset(list(LARK_TASK_ROW_FIELDS) + ['write_date', 'write_uid'])
+        tasks.modified(LARK_TASK_ROW_FIELDS)
+
+        groups = {}
+        for lark_task, values in updates:
+            shared = {
+                fname: value for fname, value in values.items()
+                if fname not in LARK_TASK_ROW_FIELDS and fname != 'lark_id'
+                and task_fields[fname].convert_to_write(lark_task[fname], lark_task) != value
+            }
+            if shared:
+                key = tuple(sorted(shared.items()))
+                groups[key] = groups.get(key, LarkTask) | lark_task
+        for key, lark_tasks in groups.items():
+            lark_tasks.write(dict(key))
+
+    def _fetch_lark_tasks(self, task_guids):
+        """Fetch single tasks from Lark, for push updates (webhook events).
+
+        Each task lands in the project of its section or tasklist, or in the
+        default project. A task that cannot be fetched does not stop the
+        others.
+
+        Returns:
+            tuple: ``({task_guid: (project_id, normalized task)}, {task_guid: error})``;
+                tasks with no project to land in are in neither
+        """
+        self.ensure_one()
+        guid_map = self.env['project.project']._get_lark_guid_project_map()
+        fetched, errors = {}, {}
+        for task_guid in task_guids:
+            try:
+                data = self._lark_request('GET', f"https://open.larksuite.com/open-apis/task/v2/tasks/{task_guid}")
+            except Exception as e:
+                errors[task_guid] = str(e)
                 continue
-                
-        success_rate = (tasks_synced / len(tasks_data) * 100) if tasks_data else 0
-        _logger.info("=== TASK SYNC COMPLETE ===")
-        _logger.info("Project: %s (ID: %s)", project.name, project_id)
-        _logger.info("Tasks processed: %d", len(tasks_data) if tasks_data else 0)
-        _logger.info("Tasks synced: %d (%.1f%%)", tasks_synced, success_rate)
-        _logger.info("Failed: %d", (len(tasks_data) if tasks_data else 0) - tasks_synced)
+            task = data.get('task') or {}
+            project_id, tasklist_guid = False, None
+            for tasklist in task.get('tasklists') or []:
+                project_id = guid_map.get(tasklist.get('section_guid')) or guid_map.get(tasklist.get('tasklist_guid'))
+                if project_id:
+                    tasklist_guid = tasklist.get('tasklist_guid')
+                    break
+            project_id = project_id or self.default_project_id.id
+            normalized = normalize_lark_task(task, tasklist_guid)
+            if normalized and project_id:
+                fetched[task_guid] = (project_id, normalized)
+        return fetched, errors
+
+    def _apply_lark_tasks(self, fetched):
+        """Upsert tasks fetched by ``_fetch_lark_tasks`` like a sync would.
+
+        Args:
+            fetched (dict): ``{task_guid: (project_id, normalized task)}``
+
+        Returns:
+            dict: Number of tasks ``created``, ``updated``, ``unchanged`` and ``failed``
+        """
+        self.ensure_one()
+        if self.bulk_sync_mode and not self.env.context.get('lark_bulk_sync'):
+            return self.with_context(**BULK_SYNC_CONTEXT)._apply_lark_tasks(fetched)
+        tasks_by_project = {}
+        for project_id, normalized in fetched.values():
+            tasks_by_project.setdefault(project_id, []).append(normalized)
         
-        return tasks_synced
+        stats = dict.fromkeys(SYNC_COUNTERS, 0)
+        id_map, parent_links = {}, {}
+        for project_id, tasks in tasks_by_project.items():
+            page_stats = self._process_task_data(tasks, project_id, id_map=id_map, parent_links=parent_links)
+            for key in SYNC_COUNTERS:
+                stats[key] += page_stats[key]
+        self._link_lark_subtasks(parent_links, id_map)
+        return stats
+
+    def _archive_lark_tasks(self, task_guids):
+        """Archive the lark.task records of tasks deleted in Lark"""
+        tasks = self.env['lark.task'].search([('lark_id', 'in', list(task_guids))])
+        tasks.write({'active': False})
+        return tasks
+
+    def _commit_sync_chunk(self, run, specs, parent_links, id_map, current_spec=None):
+        """Commit the work done so far together with the run checkpoint.
 
-    def _get_all_tasks_for_project(self, tasklist_guid):
-        """Get all tasks for a given tasklist using the Lark API.
+        Subtask links that can already be resolved are applied first, so
+        only links waiting for their parent are carried in the checkpoint.
+
+        Returns:
+            int: number of subtasks linked
+        """
+        with sync_phase(current_spec and current_spec.get('metrics'), 'commit'):
+            linked = self._link_lark_subtasks(parent_links, id_map)
+            run._save_checkpoint(specs, parent_links, current_spec)
+            self.env.cr.commit()
+        _logger.info("Sync run %s: committed chunk %d", run.id, run.commit_count)
+        return linked
+
+    def _post_sync_digests(self, project_digests):
+        """Post one condensed sync summary on each project touched by a bulk sync.
+
+        Stands in for the per-task tracking messages disabled by
+        ``BULK_SYNC_CONTEXT``; projects where nothing changed get no message.
+        """
+        projects = self.env['project.project'].browse(list(project_digests))
+        for project in projects:
+            digest = project_digests[project.id]
+            if not (digest['created'] or digest['updated'] or digest['failed'] or digest['errors']):
+                continue
+            body = Markup(
+                "<b>Lark sync</b><br/>"
+                "• Created: <b>%(created)s</b><br/>"
+                "• Updated: <b>%(updated)s</b><br/>"
+                "• Unchanged: <b>%(unchanged)s</b><br/>"
+                "• Failed: <b>%(failed)s</b>"
+            ) % digest
+            if digest['errors']:
+                body += Markup("<br/>• Listing errors: <b>%s</b>, see the Lark API log") % digest['errors']
+            project.message_post(body=body, message_type='comment', subtype_xmlid='mail.mt_note')
+
+    def _link_lark_subtasks(self, parent_links, id_map):
+        """Apply the parent/subtask links collected during a sync run.
+        
+        Parents are looked up in ``id_map`` first; only the ones that were
+        not part of the run (e.g. unchanged since the watermark) cost one
+        extra query for all of them. Links are then applied with a single
+        ``UPDATE``, touching only the rows whose parent actually changed.
+        
+        Applied links are removed from ``parent_links``; the ones whose
+        parent is not synced yet are left in it.
         
         Args:
-            tasklist_guid (str): The GUID of the tasklist to fetch tasks from.
-                             Use 'none' to get tasks not in any tasklist.
+            parent_links (dict): ``{lark_id: parent lark_id or False}``
+            id_map (dict): ``{lark_id: lark.task id}`` of the tasks of the run
             
         Returns:
-            list: List of task dictionaries with required fields for lark.task model
+            int: number of lark.task whose parent was changed
         """
-        _logger.info("=== FETCHING TASKS FOR TASKLIST: %s ===", tasklist_guid)
+        if not parent_links:
+            return 0
+        LarkTask = self.env['lark.task']
         
-        # If tasklist_guid is 'none', fetch tasks without a tasklist
+        missing = {parent for parent in parent_links.values() if parent and parent not in id_map}
+        if missing:
+            parents = LarkTask.with_context(active_test=False).search_fetch(
+                [('lark_id', 'in', list(missing))], ['lark_id'])
+            id_map.update((parent.lark_id, parent.id) for parent in parents)
+        
+        task_ids, parent_ids = [], []
+        for lark_id, parent_lark_id in list(parent_links.items()):
+            task_id = id_map.get(lark_id)
+            parent_id = id_map.get(parent_lark_id) if parent_lark_id else None
+            if parent_lark_id and not parent_id:
+                # Kept for a later pass, the parent may come in a later page
+                _logger.debug("Parent task %s of Lark task %s is not synced yet", parent_lark_id, lark_id)
+                continue
+            del parent_links[lark_id]
+            if not task_id or parent_id == task_id:
+                continue
+            task_ids.append(task_id)
+            parent_ids.append(parent_id)
+        if not task_ids:
+            return 0
+        
+        LarkTask.flush_model(['parent_id'])
+        self.env.cr.execute("""
+            UPDATE lark_task AS t
+               SET parent_id = v.parent_id,
+                   write_uid = %s,
+                   write_date = (now() at time zone 'UTC')
+              FROM (SELECT unnest(%s::int[]) AS id, unnest(%s::int[]) AS parent_id) AS v
+             WHERE t.id = v.id
+               AND t.parent_id IS DISTINCT FROM v.parent_id
+        """, [self.env.uid, task_ids, parent_ids])
+        linked = self.env.cr.rowcount
+        LarkTask.invalidate_model(['parent_id', 'child_ids', 'write_uid', 'write_date'])
+        _logger.info("Linked %d Lark subtasks to their parent (%d links checked)", linked, len(task_ids))
+        return linked
+
+    @api.model
+    def _get_tasklist_tasks_request(self, tasklist_guid):
+        """Return the ``(url, params)`` listing the tasks of a tasklist.
+
+        A ``tasklist_guid`` of ``'none'`` lists the tasks not in any tasklist.
+        """
         if tasklist_guid == 'none':
             url = "https://open.larksuite.com/open-apis/task/v2/tasks"
             params = {
@@ -818,95 +1751,15 @@ class LarkAPI(models.Model):
         else:
             url = f"https://open.larksuite.com/open-apis/task/v2/tasklists/{tasklist_guid}/tasks"
             params = {'page_size': 100}
-            
-        _logger.info("Requesting tasks from URL: %s with params: %s", url, params)
-        
-        try:
-            # Get paginated results
-            tasks = self._get_paginated_results(url, params)
-            _logger.info("Retrieved %d tasks from API", len(tasks) if tasks else 0)
-            
-            if not tasks:
-                _logger.warning("No tasks returned from API for tasklist %s", tasklist_guid)
-                return []
-                
-            # Process tasks to include all required fields for lark.task model
-            processed_tasks = []
-            for task in tasks:
-                try:
-                    # Extract task data
-                    task_id = task.get('id') or task.get('guid')
-                    if not task_id:
-                        _logger.warning("Skipping task with no ID or GUID: %s", task)
-                        continue
-                        
-                    # Get assignee if exists
-                    assignee_id = None
-                    if isinstance(task.get('assignee'), dict):
-                        assignee_id = task['assignee'].get('id')
-                    
-                    # Get due date if exists
-                    due = None
-                    if isinstance(task.get('due'), dict):
-                        due = task['due']
-                    
-                    processed_task = {
-                        'id': task_id,
-                        'guid': task.get('guid'),
-                        'summary': task.get('summary', 'Unnamed Task'),
-                        'description': task.get('description', ''),
-                        'due': due,
-                        'completed': task.get('completed', False),
-                        'status': task.get('status', 'todo'),
-                        'assignee_id': assignee_id,
-                        'parent_id': task.get('parent_id'),
-                        'etag': task.get('etag'),
-                        'custom_fields': task.get('custom_fields', []),
-                        'tasklist_guid': tasklist_guid,
-                        'created_at': task.get('created_at'),
-                        'updated_at': task.get('updated_at'),
-                        'start': task.get('start'),
-                        'source': task.get('source'),
-                        'subtask_count': task.get('subtask_count', 0),
-                        'is_milestone': task.get('is_milestone', False),
-                        'origin': task.get('origin', {})
-                    }
-                    
-                    # Add custom fields if they exist
-                    if task.get('custom_fields'):
-                        for field in task['custom_fields']:
-                            field_name = field.get('name', '').lower().replace(' ', '_')
-                            if field_name:
-                                processed_task[f'custom_{field_name}'] = field.get('value')
-                    
-                    processed_tasks.append(processed_task)
-                    
-                except Exception as e:
-                    _logger.error("Error processing task data: %s. Task: %s", str(e), task, exc_info=True)
-                    continue
-            
-            _logger.info("Successfully processed %d tasks for tasklist %s", 
-                        len(processed_tasks), tasklist_guid)
-            
-            # Log first task as sample
-            if processed_tasks:
-                _logger.info("Sample processed task data (first task): %s", 
-                            json.dumps(processed_tasks[0], indent=2, default=str))
-            
-            return processed_tasks
-            
-        except Exception as e:
-            _logger.error("Error fetching tasks for tasklist %s: %s", tasklist_guid, str(e), exc_info=True)
-            return []
+        return url, params
 
-    def _find_odoo_user_id(self, lark_user_id):
-        """Find Odoo user ID from Lark user ID"""
+    def _find_odoo_user_id(self, lark_user_id, user_map=None):
+        """Find Odoo user ID from Lark user ID, through the lark.user.map directory"""
         if not lark_user_id:
             return False
-            
-        # You might need to implement a mapping between Lark and Odoo users
-        # For now, return the current user or False
-        return self.env.user.id or False
+        if user_map is None:
+            user_map = self.env['lark.user.map']._resolve_users([lark_user_id], lark_api=self[:1] or None)
+        return user_map.get(lark_user_id) or False
     
     def _get_task_stage_id(self, project_id, is_completed):
         """Get the appropriate stage ID for a task based on completion status.
@@ -918,86 +1771,18 @@ class LarkAPI(models.Model):
         Returns:
             int: ID of the stage, or False if no stages found
         """
-        _logger.debug("Getting stage for project %s (completed=%s)", project_id, is_completed)
-        
-        # Get the project and verify it exists
-        project = self.env['project.project'].browse(project_id)
-        if not project.exists():
-            _logger.error("Project with ID %s not found", project_id)
-            return False
-        
-        # Get all stages for the project
-        stages = self.env['project.task.type'].search([('project_ids', 'in', [project_id])])
-        
-        if not stages:
-            _logger.warning("No stages found for project '%s' (ID: %s)", project.name, project_id)
-            return False
-            
-        _logger.debug("Available stages for project '%s': %s", 
-                     project.name, 
-                     [(s.id, s.name, s.sequence) for s in stages])
-        
-        if is_completed:
-            # Look for completed stages in order of preference
-            for stage_name in ['Done', 'Completed', 'Closed']:
-                done_stage = stages.filtered(
-                    lambda s: stage_name.lower() in s.name.lower()
-                )
-                if done_stage:
-                    stage = min(done_stage, key=lambda x: x.sequence)  # Get the first in sequence if multiple
-                    _logger.debug("Using '%s' stage (ID: %s) for completed task", 
-                                 stage.name, stage.id)
-                    return stage.id
-            
-            # If no specific done stage found, use the last stage in the sequence
-            last_stage = max(stages, key=lambda x: x.sequence)
-            _logger.debug("Using last stage '%s' (ID: %s) for completed task", 
-                         last_stage.name, last_stage.id)
-            return last_stage.id
-        else:
-            # For incomplete tasks, use the first stage in the sequence
-            first_stage = min(stages, key=lambda x: x.sequence)
-            _logger.debug("Using first stage '%s' (ID: %s) for new task", 
-                         first_stage.name, first_stage.id)
-            return first_stage.id
-
+        return self.env['project.project']._get_lark_stage_id(project_id, bool(is_completed))
 
     def push_task_to_lark(self, task):
-        if not task.project_id.lark_id:
-            raise UserError(_("Cannot push task to Lark: related project is not linked to Lark."))
-        if not self.user_access_token:
-            raise UserError(_("User access token is required to push tasks to Lark."))
+        """Queue the creation (or update, if already linked) of ``task`` in Lark.
 
-        headers = {"Authorization": f"Bearer {self.user_access_token}"}
-        url = "https://open.larksuite.com/open-apis/project/v1/tasks" # Check if this is the correct URL for user-initiated task creation
-        data = {
-            "summary": task.name,
-            "project_id": task.project_id.lark_id
-        }
-        
-        try:
-            response = requests.post(url, headers=headers, json=data, timeout=10).json()
-            if response.get("code") == 0:
-                task.lark_id = response["data"]["task_id"]
-                _logger.info(f"Task '{task.name}' pushed to Lark with ID: {task.lark_id}")
-            else:
-                error_msg = f"Failed to push task to Lark: {response.get('msg', 'Unknown error')} (Code: {response.get('code')})"
-                _logger.error(error_msg)
-                raise UserError(_(error_msg))
-        except requests.exceptions.RequestException as e:
-            raise UserError(_("Error connecting to Lark API: %s") % str(e))
+        The change is recorded in the outbox within the current transaction
+        and sent by the outbox dispatcher, so the caller never waits on Lark.
+        """
         if not task.project_id.lark_id:
-            return
-        token = self.get_access_token()
-        headers = {"Authorization": f"Bearer {token}"}
-        url = "https://open.larksuite.com/open-apis/project/v1/tasks"
-        data = {
-            "summary": task.name,
-            "project_id": task.project_id.lark_id
-        }
-        response = requests.post(url, headers=headers, json=data).json()
-        if response.get("code") == 0:
-            task.lark_id = response["data"]["task_id"]
+            raise UserError(_("Cannot push task to Lark: related project is not linked to Lark."))
+        operation = 'update' if task.lark_guid else 'create'
+        return self.env['lark.outbox']._enqueue(task, operation, LARK_PUSH_FIELDS)
 
     def fetch_and_map_tasklists(self):
         """Fetch Lark tasklists and map them to Odoo projects by name. If a project with the same name exists, update its lark_id. If not, create a new project."""
@@ -1178,31 +1963,7 @@ class LarkAPI(models.Model):
             if project:
                 tasklist.project_id = project.id
 
+
 class ResCompany(models.Model):
     _inherit = 'res.company'
     lark_api_id = fields.Many2one('lark.api', string='Lark API')
-    
-
-class LarkOAuthController(http.Controller):
-    @http.route('/lark/oauth/callback', type='http', auth='public')
-    def lark_oauth_callback(self, **kwargs):
-        code = kwargs.get('code')
-        if not code:
-            return "No code provided"
-        # Exchange code for token
-        payload = {
-            "grant_type": "authorization_code",
-            "code": code,
-            "app_id": self.app_id,
-            "app_secret": self.app_secret
-        }
-        response = requests.post(
-            "https://accounts.larksuite.com/open-apis/authen/v1/authorize",
-            json=payload
-        )
-        data = response.json()
-        # Save access_token to your model (implement as needed)
-        # ...
-        return "Token received. You can close this window."
-    
-
@@ -1,9 +1,27 @@
+import base64
+import gzip
+import json
+import logging
+from datetime import timedelta
+
 from odoo import models, fields, api
 
+_logger = logging.getLogger(__name__)
+
+# Payloads above this size are kept gzipped, with a short preview in the text column
+MAX_LOG_PAYLOAD = 16 * 1024
+LOG_PREVIEW_SIZE = 2 * 1024
+# Buffered entries are inserted at commit time, or as soon as this many are waiting
+LOG_BUFFER_SIZE = 200
+LOG_BUFFER_KEY = 'lark.api.log.buffer'
+LOG_RETENTION_PARAM = 'xcd_lark_project_sync.log_retention_days'
+DEFAULT_LOG_RETENTION_DAYS = 30
+LOG_PURGE_BATCH = 5000
+
+
 class LarkAPILog(models.Model):
     _name = 'lark.api.log'
     _description = 'Lark API Log'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
 
     name = fields.Char(string="Lark Log", required=True, readonly=True)
     api_link = fields.Char(string="API Link", readonly=True)
@@ -12,21 +30,121 @@ class LarkAPILog(models.Model):
     response_type = fields.Selection([
         ('success', 'Success'),
         ('fail', 'Fail')
-    ], string="Status", readonly=True, tracking=True)
+    ], string="Status", readonly=True)
     request_method = fields.Char(string="Request Method", readonly=True)
     request_param = fields.Text(string="Request Param", readonly=True)
     response_data = fields.Text(string="Response Data", readonly=True)
-    
+    response_archive = fields.Binary(string="Full Response", attachment=False, readonly=True,
+        help="Gzipped response of the entries too large to be stored as text")
+    response_archive_name = fields.Char(string="Full Response Filename", readonly=True)
+
+    # HTTP resilience counters
+    api_call_count = fields.Integer(string="API Calls", readonly=True)
+    retry_count = fields.Integer(string="Retries", readonly=True)
+    rate_limited_count = fields.Integer(string="Rate Limited (429)", readonly=True)
+    breaker_trip_count = fields.Integer(string="Circuit Breaker Trips", readonly=True)
+    breaker_rejected_count = fields.Integer(string="Rejected by Circuit Breaker", readonly=True)
+
     # Parent-Child relationship for hierarchical logging
-    parent_id = fields.Many2one('lark.api.log', string='Parent Log', readonly=True, ondelete='cascade')
+    parent_id = fields.Many2one('lark.api.log', string='Parent Log', readonly=True, ondelete='cascade', index=True)
     child_ids = fields.One2many('lark.api.log', 'parent_id', string='Child Logs', readonly=True)
-    has_children = fields.Boolean(compute='_compute_has_children', store=True)
-    
-    @api.depends('child_ids')
+    has_children = fields.Boolean(compute='_compute_has_children', search='_search_has_children')
+
+    def init(self):
+        # Append-only and time ordered: a BRIN index keeps retention purges cheap
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS lark_api_log_create_date_brin
+                ON lark_api_log USING brin (create_date)
+        """)
+
     def _compute_has_children(self):
+        parents = set(self.search([('parent_id', 'in', self.ids)]).mapped('parent_id').ids)
         for log in self:
-            log.has_children = bool(log.child_ids)
-            
+            log.has_children = log.id in parents
+
+    def _search_has_children(self, operator, value):
+        if operator not in ('=', '!='):
+            return NotImplemented
+        positive = (operator == '=') == bool(value)
+        return [('child_ids', '!=' if positive else '=', False)]
+
+    @api.model
+    def _compact_vals(self, vals):
+        """Truncate oversized payloads; the full response is kept gzipped"""
+        response_data = vals.get('response_data')
+        if response_data and len(response_data) > MAX_LOG_PAYLOAD:
+            raw = response_data.encode('utf-8')
+            vals = dict(vals,
+                response_data=json.dumps({
+                    'truncated': True,
+                    'size': len(raw),
+                    'preview': response_data[:LOG_PREVIEW_SIZE],
+                }),
+                response_archive=base64.b64encode(gzip.compress(raw)),
+                response_archive_name='response.json.gz',
+            )
+        request_param = vals.get('request_param')
+        if request_param and len(request_param) > MAX_LOG_PAYLOAD:
+            vals = dict(vals, request_param=request_param[:MAX_LOG_PAYLOAD])
+        return vals
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        return super().create([self._compact_vals(vals) for vals in vals_list])
+
+    def write(self, vals):
+        return super().write(self._compact_vals(vals))
+
+    @api.model
+    def _buffer(self, vals):
+        """Queue a log entry instead of inserting it right away.
+
+        Buffered entries are inserted together with one multi-create when
+        the buffer is full or right before the transaction commits; they are
+        dropped with it on rollback, like a regular create would be.
+        """
+        precommit = self.env.cr.precommit
+        buffer = precommit.data.get(LOG_BUFFER_KEY)
+        if buffer is None:
+            buffer = precommit.data[LOG_BUFFER_KEY] = []
+            precommit.add(self._flush_buffer)
+        buffer.append(vals)
+        if len(buffer) >= LOG_BUFFER_SIZE:
+            self._flush_buffer()
+
+    @api.model
+    def _flush_buffer(self):
+        buffer = self.env.cr.precommit.data.get(LOG_BUFFER_KEY)
+        if not buffer:
+            return self.browse()
+        vals_list = buffer[:]
+        buffer.clear()
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def _cron_purge_logs(self):
+        """Delete the logs older than the retention period, oldest first, in batches"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            LOG_RETENTION_PARAM, DEFAULT_LOG_RETENTION_DAYS) or 0)
+        if days <= 0:
+            return 0
+        limit = fields.Datetime.now() - timedelta(days=days)
+        purged = 0
+        while True:
+            self.env.cr.execute("""
+                DELETE FROM lark_api_log
+                 WHERE id IN (SELECT id FROM lark_api_log WHERE create_date < %s ORDER BY id LIMIT %s)
+            """, [limit, LOG_PURGE_BATCH])
+            purged += self.env.cr.rowcount
+            if self.env.cr.rowcount < LOG_PURGE_BATCH:
+                break
+            if not self.env.registry.in_test_mode():
+                self.env.cr.commit()
+        self.invalidate_model()
+        if purged:
+            _logger.info("Purged %d Lark API logs older than %d days", purged, days)
+        return purged
+
     def action_view_logs(self):
         """Action to view all logs"""
         self.ensure_one()
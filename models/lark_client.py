@@ -0,0 +1,518 @@
+"""HTTP transport shared by every call this module makes to Lark.
+
+Plain Python on purpose: nothing in here touches the ORM, so a client can be
+handed to worker threads without dragging an Odoo cursor along with it.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .lark_metrics import LATENCY_BUCKETS, metrics
+
+_logger = logging.getLogger(__name__)
+
+LARK_OPEN_API_BASE = "https://open.larksuite.com"
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+# Requests per second allowed for each endpoint, ``'*'`` being the fallback.
+# Overridable through the ``xcd_lark_project_sync.rate_limits`` parameter.
+DEFAULT_RATE_LIMITS = {
+    '*': {'rate': 50.0, 'burst': 50},
+}
+# Lark body code for "request trigger frequency limit"
+LARK_RATE_LIMIT_CODE = 99991400
+MAX_RATE_LIMIT_RETRIES = 5
+
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_CAP = 8.0
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_ENDPOINT_ID_RE = re.compile(r'/(?!v\d+(?:/|$))[^/]*\d[^/]*')
+
+
+def get_session(key='default', pool_size=DEFAULT_POOL_SIZE):
+    """Return the keep-alive session registered under ``key``.
+
+    Sessions live for the whole worker process so that consecutive calls reuse
+    the same TCP/TLS connections. The pid is part of the cache key because
+    Odoo's prefork server forks workers after the code is imported, and a
+    pooled socket must never be shared between two processes.
+    """
+    pool_size = max(int(pool_size or DEFAULT_POOL_SIZE), 1)
+    cache_key = (os.getpid(), key)
+    session = _sessions.get(cache_key)
+    if session is not None and session.lark_pool_size == pool_size:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(cache_key)
+        if session is not None and session.lark_pool_size == pool_size:
+            return session
+        if session is not None:
+            # Pool size was tuned on the connection: rebuild with the new size
+            session.close()
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.lark_pool_size = pool_size
+        _sessions[cache_key] = session
+        _logger.debug("Opened Lark HTTP pool %s (size=%d, pid=%d)", key, pool_size, os.getpid())
+        return session
+
+
+def close_session(key='default'):
+    """Drop the pooled session registered under ``key`` for this process."""
+    with _sessions_lock:
+        session = _sessions.pop((os.getpid(), key), None)
+    if session is not None:
+        session.close()
+
+
+def endpoint_key(method, url):
+    """Collapse a concrete URL into its endpoint, e.g. ``GET /open-apis/task/v2/tasklists/:id/tasks``."""
+    path = re.sub(r'^https?://[^/]+', '', url).split('?', 1)[0]
+    return f"{method.upper()} {_ENDPOINT_ID_RE.sub('/:id', path)}"
+
+
+class TokenBucket:
+    """Token bucket with AIMD rate adaptation.
+
+    While Lark accepts every call the bucket refills at ``max_rate`` and a
+    caller never waits as long as tokens are left. When Lark answers 429 the
+    refill rate is halved and the bucket is frozen for the advertised reset
+    delay; every later success then gives back a twentieth of ``max_rate``
+    until the ceiling is reached again.
+    """
+
+    MIN_RATE_RATIO = 0.05
+    RECOVERY_RATIO = 0.05
+
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Take one token, sleeping only when the bucket is empty or frozen.
+
+        :return: seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                else:
+                    delay = (1.0 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def throttle(self, retry_after=None):
+        """Lark pushed back: halve the rate and pause for ``retry_after`` seconds."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.max_rate * self.MIN_RATE_RATIO, self.rate / 2.0)
+            self.tokens = 0.0
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.blocked_until = max(self.blocked_until, now + pause)
+
+    def pause(self, seconds):
+        """Freeze the bucket without lowering the rate (quota exhausted for the window)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def recover(self):
+        """One call went through: creep the rate back up towards the ceiling."""
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.RECOVERY_RATIO)
+
+
+class RateLimiter:
+    """Per-endpoint token buckets shared by every connection of the process."""
+
+    def __init__(self, limits=None):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.limits = dict(DEFAULT_RATE_LIMITS)
+        if limits:
+            self.limits.update(limits)
+
+    def configure(self, limits):
+        """Replace the per-endpoint budgets; buckets are rebuilt lazily."""
+        new_limits = dict(DEFAULT_RATE_LIMITS)
+        new_limits.update(limits or {})
+        with self.lock:
+            if new_limits != self.limits:
+                self.limits = new_limits
+                self.buckets = {}
+
+    def bucket(self, endpoint):
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(endpoint)
+                if bucket is None:
+                    limit = self.limits.get(endpoint) or self.limits['*']
+                    bucket = self.buckets[endpoint] = TokenBucket(limit['rate'], limit.get('burst', limit['rate']))
+        return bucket
+
+
+rate_limiter = RateLimiter()
+
+
+def _header_seconds(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            return max(float(value), 0.0)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_rate_limited(response):
+    """Tell whether Lark rejected ``response`` for exceeding the frequency limit."""
+    if response.status_code == 429:
+        return True
+    if response.status_code == 400 and 'json' in response.headers.get('Content-Type', ''):
+        try:
+            body = response.json()
+        except ValueError:
+            return False
+        return isinstance(body, dict) and body.get('code') == LARK_RATE_LIMIT_CODE
+    return False
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The endpoint's circuit breaker is open: the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open breaker guarding one endpoint.
+
+    After ``failure_threshold`` consecutive transport errors or 5xx the
+    breaker opens and calls fail immediately with CircuitOpenError. Once
+    ``reset_timeout`` has elapsed a single probe call is let through; its
+    outcome closes the breaker again or re-opens it for another period.
+    4xx answers are Lark rejecting that one call, not Lark failing, so
+    they never count.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, endpoint, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probing = False
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+            raise CircuitOpenError(f"Circuit breaker open for {self.endpoint}: Lark is failing, not calling it")
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        """Count one failure.
+
+        :return: True if this failure tripped the breaker open
+        """
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                _logger.warning("Circuit breaker opened for %s after %d failures", self.endpoint, self.failures)
+                return True
+            return False
+
+    def release(self):
+        """The call ended without telling anything about Lark: free the probe slot."""
+        with self.lock:
+            self.probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint, scope=None):
+    """Return the breaker of ``endpoint`` for ``scope``.
+
+    ``scope`` is the ``(dbname, app_id)`` of the calling connection: one
+    database or Lark app failing must not cut the others off in the same
+    worker.
+    """
+    key = (scope, endpoint)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            name = f"{endpoint} ({'/'.join(map(str, scope))})" if scope else endpoint
+            breaker = _breakers.setdefault(key, CircuitBreaker(name))
+    return breaker
+
+
+def backoff_delay(attempt, base=RETRY_BACKOFF_BASE, cap=RETRY_BACKOFF_CAP):
+    """Full-jitter exponential backoff for the ``attempt``-th retry (1-based)."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class LarkAPIError(Exception):
+    """Lark answered the call but reported a non-zero error ``code``."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class LarkClient:
+    """Thin wrapper around a pooled session bound to one Lark connection."""
+
+    STAT_KEYS = ('api_calls', 'retries', 'rate_limited', 'breaker_trips', 'breaker_rejections',
+                 'http_seconds', 'throttle_seconds', 'parse_seconds', 'bytes_sent', 'bytes_received')
+
+    def __init__(self, session, access_token=None,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, dbname=None, app_id=None):
+        self.session = session
+        self.access_token = access_token
+        # Database the process-wide metrics of the calls are reported to
+        self.dbname = dbname
+        # Circuit breakers are shared by the clients of the same database and app only
+        self.breaker_scope = (dbname, app_id)
+        self.timeout = (connect_timeout or DEFAULT_CONNECT_TIMEOUT, read_timeout or DEFAULT_READ_TIMEOUT)
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max(int(max_retries), 0)
+        self.stats = dict.fromkeys(self.STAT_KEYS, 0)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def build_url(self, url):
+        """Accept either a full URL or a path such as ``/open-apis/task/v2/tasks``."""
+        if url.startswith('http://') or url.startswith('https://'):
+            return url
+        return LARK_OPEN_API_BASE + ('' if url.startswith('/') else '/') + url
+
+    def request(self, method, url, headers=None, authenticate=True, **kwargs):
+        """Send one request through the pool and return the raw response.
+
+        The call goes through the endpoint's circuit breaker and token bucket.
+        Idempotent methods are retried with jittered exponential backoff on
+        timeouts, connection errors and 5xx answers; other methods are sent
+        once (apart from 429 replays, which Lark never processed).
+        """
+        request_headers = {"Content-Type": "application/json; charset=utf-8"}
+        if authenticate and self.access_token:
+            request_headers["Authorization"] = f"Bearer {self.access_token}"
+        if headers:
+            request_headers.update(headers)
+        kwargs.setdefault('timeout', self.timeout)
+        full_url = self.build_url(url)
+        endpoint = endpoint_key(method, full_url)
+        breaker = get_circuit_breaker(endpoint, self.breaker_scope)
+        retryable = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self._count('breaker_rejections')
+                raise
+
+            try:
+                response = self._send_throttled(method, full_url, endpoint, request_headers, kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if breaker.record_failure():
+                    self._count('breaker_trips')
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = backoff_delay(attempt)
+                self._count('retries')
+                metrics.inc(self.dbname, 'lark_http_retries_total', endpoint=endpoint)
+                _logger.warning("Transient error on %s (%s), retry %d/%d in %.2fs",
+                                endpoint, e, attempt, self.max_retries, delay)
+                time.sleep(delay)
+                continue
+            except Exception:
+                # Any other error (invalid URL, body read...) is not Lark
+                # failing, but it still ends the call: a half-open breaker
+                # must not wait for its probe forever
+                breaker.release()
+                raise
+
+            if response.status_code >= 500:
+                if breaker.record_failure():
+                    self._count('breaker_trips')
+                if retryable and attempt < self.max_retries:
+                    attempt += 1
+                    delay = backoff_delay(attempt)
+                    self._count('retries')
+                    metrics.inc(self.dbname, 'lark_http_retries_total', endpoint=endpoint)
+                    _logger.warning("Lark answered %s on %s, retry %d/%d in %.2fs",
+                                    response.status_code, endpoint, attempt, self.max_retries, delay)
+                    time.sleep(delay)
+                    continue
+            else:
+                # Lark answered, even if it rejected this call (4xx)
+                breaker.record_success()
+            return response
+
+    def _send_throttled(self, method, full_url, endpoint, request_headers, kwargs):
+        """Send one call through the endpoint's token bucket, replaying it on 429."""
+        bucket = rate_limiter.bucket(endpoint)
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            bucket.acquire()
+            sent = time.monotonic()
+            self._count('api_calls')
+            response = self.session.request(method, full_url, headers=request_headers, **kwargs)
+            elapsed = time.monotonic() - sent
+            self._count('throttle_seconds', sent - start)
+            self._count('http_seconds', elapsed)
+            metrics.inc(self.dbname, 'lark_http_requests_total', endpoint=endpoint, status=response.status_code)
+            metrics.observe(self.dbname, 'lark_http_request_duration_seconds', elapsed, LATENCY_BUCKETS,
+                            endpoint=endpoint)
+            self._count('bytes_sent', len(response.request.body or b''))
+            self._count('bytes_received', len(response.content))
+            if not is_rate_limited(response):
+                bucket.recover()
+                break
+            # A throttled call was never processed, so replaying it is safe
+            self._count('rate_limited')
+            metrics.inc(self.dbname, 'lark_http_rate_limited_total', endpoint=endpoint)
+            retry_after = _header_seconds(response.headers, 'Retry-After', 'x-ogw-ratelimit-reset')
+            bucket.throttle(retry_after)
+            attempt += 1
+            _logger.warning("Lark rate limit hit on %s (attempt %d), retrying after %s s",
+                            endpoint, attempt, retry_after)
+            if attempt >= MAX_RATE_LIMIT_RETRIES:
+                break
+
+        # Quota for the current window used up: wait for the reset up front
+        # rather than collecting a 429 on the next call
+        if (response.headers.get('x-ogw-ratelimit-remaining') or '').strip() == '0':
+            reset = _header_seconds(response.headers, 'x-ogw-ratelimit-reset')
+            if reset:
+                bucket.pause(reset)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def iter_pages(self, url, params=None, page_token=None):
+        """Yield ``(items, next_page_token)`` for each page, following ``page_token``.
+
+        Only one page is held at a time, so memory stays bounded by the page
+        size whatever the size of the listing. ``next_page_token`` is None on
+        the last page; passing a token back in resumes the listing there.
+
+        :raise requests.exceptions.RequestException: on transport/HTTP errors
+        :raise LarkAPIError: when Lark answers with a non-zero code
+        """
+        while True:
+            request_params = dict(params or {})
+            if page_token:
+                request_params['page_token'] = page_token
+
+            _logger.debug("Making request to %s with params: %s", url, request_params)
+            response = self.get(url, params=request_params)
+
+            # Decoding the whole body is only worth it when it is logged
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("Response status: %s, headers: %s, content: %s",
+                              response.status_code, response.headers, response.text)
+
+            response.raise_for_status()
+            start = time.monotonic()
+            data = response.json()
+            self._count('parse_seconds', time.monotonic() - start)
+
+            if data.get('code') != 0:
+                raise LarkAPIError(
+                    f"API Error: {data.get('msg', 'Unknown error')} (Code: {data.get('code')})",
+                    code=data.get('code'),
+                )
+
+            payload = data.get('data') or {}
+            items = payload.get('items') or []
+            page_token = payload.get('page_token') if payload.get('has_more') else None
+            if payload.get('has_more') and not page_token:
+                _logger.warning("Lark announced more pages of %s but sent no page token", url)
+            _logger.debug("Retrieved %d items from %s%s", len(items), url, '' if page_token else ' (last page)')
+            yield items, page_token
+            if not page_token:
+                return
+
+    def fetch_all(self, url, params=None):
+        """Return every item of every page, in page order."""
+        results = []
+        for items, _next_token in self.iter_pages(url, params):
+            results.extend(items)
+        return results
@@ -0,0 +1,175 @@
+"""In-process metrics of the Lark integration, exposed in Prometheus text format.
+
+Counters and histograms are incremented in memory (a dict update under a
+lock) on the hot paths. Syncs run in cron workers while scrapes are served
+by HTTP workers, so every process periodically adds its deltas to the
+``lark_metric`` table, one row per series, in a single statement; a scrape
+reads that small table and never scans synced data.
+"""
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SYNC_DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+LAG_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0)
+# Long syncs publish their deltas at most this often; crons and scrapes flush on exit
+FLUSH_INTERVAL = 30.0
+_LE_RE = re.compile(r'(?:^|,)le="([^"]*)"')
+
+METRICS = {
+    'lark_http_requests_total': ('counter', 'Lark API calls by endpoint and HTTP status'),
+    'lark_http_request_duration_seconds': ('histogram', 'Lark API call latency by endpoint'),
+    'lark_http_rate_limited_total': ('counter', 'Calls answered with a rate limit (429) by endpoint'),
+    'lark_http_retries_total': ('counter', 'Calls retried after a transient error by endpoint'),
+    'lark_sync_tasks_total': ('counter', 'Tasks upserted from Lark by result'),
+    'lark_sync_duration_seconds': ('histogram', 'Duration of task syncs by outcome'),
+    'lark_webhook_events_total': ('counter', 'Webhook events handled by state'),
+    'lark_webhook_lag_seconds': ('histogram', 'Seconds between reception and application of webhook events'),
+    'lark_outbox_pushes_total': ('counter', 'Task pushes to Lark by result'),
+    'lark_webhook_inbox_pending': ('gauge', 'Webhook events waiting to be applied'),
+    'lark_webhook_inbox_oldest_seconds': ('gauge', 'Age of the oldest pending webhook event'),
+    'lark_outbox_backlog': ('gauge', 'Task changes waiting to be pushed to Lark'),
+}
+
+
+def _bucket_sort_key(labels):
+    """Order histogram buckets by series, then by increasing upper bound"""
+    match = _LE_RE.search(labels)
+    return _LE_RE.sub('', labels), float(match.group(1)) if match else 0.0
+
+
+def _format_labels(labels):
+    return ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+
+
+class MetricsRegistry:
+    """Thread-safe per-process deltas, keyed by database, series name and labels"""
+
+    def __init__(self):
+        self._deltas = defaultdict(float)
+        self._lock = threading.Lock()
+        self._last_flush = defaultdict(float)
+
+    def inc(self, dbname, name, value=1, **labels):
+        if not dbname:
+            return
+        key = (dbname, name, _format_labels(labels))
+        with self._lock:
+            self._deltas[key] += value
+
+    def observe(self, dbname, name, value, buckets, **labels):
+        """Record ``value`` in a histogram: cumulative buckets, sum and count"""
+        if not dbname:
+            return
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._deltas[(dbname, f'{name}_bucket', _format_labels(dict(labels, le=bound)))] += 1
+            self._deltas[(dbname, f'{name}_bucket', _format_labels(dict(labels, le='+Inf')))] += 1
+            self._deltas[(dbname, f'{name}_sum', _format_labels(labels))] += value
+            self._deltas[(dbname, f'{name}_count', _format_labels(labels))] += 1
+
+    def drain(self, dbname):
+        with self._lock:
+            keys = [key for key in self._deltas if key[0] == dbname]
+            self._last_flush[dbname] = time.monotonic()
+            return [(name, labels, self._deltas.pop((db, name, labels))) for db, name, labels in keys]
+
+    def restore(self, dbname, rows):
+        with self._lock:
+            for name, labels, value in rows:
+                self._deltas[(dbname, name, labels)] += value
+
+    def flush_due(self, dbname):
+        return time.monotonic() - self._last_flush[dbname] > FLUSH_INTERVAL
+
+
+metrics = MetricsRegistry()
+
+
+class LarkMetric(models.Model):
+    _name = 'lark.metric'
+    _description = 'Lark Metric'
+    _log_access = False
+
+    name = fields.Char(string='Series', required=True, readonly=True)
+    labels = fields.Char(string='Labels', required=True, readonly=True, default='')
+    value = fields.Float(string='Value', readonly=True)
+
+    _sql_constraints = [
+        ('name_labels_uniq', 'unique (name, labels)', 'A metric series can only be stored once!'),
+    ]
+
+    @api.model
+    def _flush(self, force=True):
+        """Add this process' deltas to the shared series, on a cursor of its own.
+
+        :param force: write even if the last flush is more recent than ``FLUSH_INTERVAL``
+        """
+        dbname = self.env.cr.dbname
+        if not force and not metrics.flush_due(dbname):
+            return
+        rows = metrics.drain(dbname)
+        if not rows:
+            return
+        names, labels, values = zip(*rows)
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO lark_metric (name, labels, value)
+                    SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::float8[])
+                    ON CONFLICT (name, labels) DO UPDATE SET value = lark_metric.value + EXCLUDED.value
+                """, [list(names), list(labels), list(values)])
+        except Exception as e:
+            metrics.restore(dbname, rows)
+            _logger.warning("Could not store %d Lark metric series: %s", len(rows), str(e))
+
+    @api.model
+    def _render_prometheus(self):
+        """Return every series and the current queue gauges in Prometheus text format"""
+        self._flush()
+        cr = self.env.cr
+        cr.execute("SELECT name, labels, value FROM lark_metric ORDER BY name, labels")
+        series = defaultdict(list)
+        for name, labels, value in cr.fetchall():
+            series[name].append((labels, value))
+
+        # Queue gauges only read the pending rows, through their partial indexes
+        cr.execute("""
+            SELECT count(*), extract(epoch FROM (now() at time zone 'UTC') - min(received_date))
+              FROM lark_webhook_event WHERE state = 'pending'
+        """)
+        pending, oldest = cr.fetchone()
+        cr.execute("SELECT count(*) FROM lark_outbox WHERE state = 'pending'")
+        backlog = cr.fetchone()[0]
+        series['lark_webhook_inbox_pending'].append(('', pending))
+        series['lark_webhook_inbox_oldest_seconds'].append(('', oldest or 0))
+        series['lark_outbox_backlog'].append(('', backlog))
+
+        lines = []
+        for metric, (metric_type, help_text) in METRICS.items():
+            names = [metric] if metric_type != 'histogram' else [
+                f'{metric}_bucket', f'{metric}_sum', f'{metric}_count']
+            if not any(series.get(name) for name in names):
+                continue
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {metric_type}')
+            for name in names:
+                samples = series.get(name, [])
+                if name.endswith('_bucket'):
+                    samples = sorted(samples, key=lambda sample: _bucket_sort_key(sample[0]))
+                for labels, value in samples:
+                    value = repr(float(value))
+                    lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
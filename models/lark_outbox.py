@@ -0,0 +1,212 @@
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+from .lark_metrics import metrics
+
+_logger = logging.getLogger(__name__)
+
+# project.task fields pushed to Lark and the Lark task field they update
+LARK_PUSH_FIELDS = {
+    'name': 'summary',
+    'description': 'description',
+    'date_deadline': 'due',
+    'state': 'completed_at',
+}
+
+# Context key of writes that come from Lark (syncs, webhook events, push
+# responses): they already are the Lark state and must never be pushed back
+LARK_ORIGIN_CONTEXT_KEY = 'lark_origin'
+
+# Time a dispatcher run keeps sending before handing back to the scheduler
+DISPATCH_TIME_BUDGET = 120.0
+MAX_OUTBOX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY_MINUTES = 2
+OUTBOX_RETENTION_DAYS = 7
+# Earliest planned date of the changes queued in the transaction
+OUTBOX_TRIGGER_KEY = 'lark_outbox_trigger'
+
+
+class LarkOutbox(models.Model):
+    _name = 'lark.outbox'
+    _description = 'Lark Outbox'
+    _order = 'id'
+
+    lark_api_id = fields.Many2one('lark.api', string='Lark Connection', required=True, ondelete='cascade', index=True)
+    task_id = fields.Many2one('project.task', string='Task', required=True, ondelete='cascade', index=True)
+    operation = fields.Selection([
+        ('create', 'Create'),
+        ('update', 'Update'),
+    ], string='Operation', required=True, default='update')
+    field_names = fields.Char(string='Changed Fields', help='Comma-separated project.task fields to push')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Sent'),
+        ('merged', 'Merged'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ], string='State', required=True, default='pending', index=True,
+        help='Merged: sent together with a later change of the same task')
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    date_planned = fields.Datetime(string='Planned', readonly=True, default=fields.Datetime.now,
+        help='Change is not sent before this date, so quick successive edits are merged')
+    date_sent = fields.Datetime(string='Sent', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+    lark_guid = fields.Char(string='Created Lark Task', readonly=True, copy=False,
+        help='GUID of the task created in Lark, kept so a retry links it instead of creating it again')
+    lark_task_data = fields.Text(string='Created Lark Task Data', readonly=True, copy=False)
+
+    def init(self):
+        # The dispatcher scans pending changes only
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS lark_outbox_pending_idx
+                ON lark_outbox (task_id, id) WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _enqueue(self, tasks, operation='update', field_names=()):
+        """Record changes of ``tasks`` to push to Lark.
+
+        Runs in the transaction of the edit itself, so a rolled back edit
+        leaves no change behind and a committed one is always pushed, even
+        if Lark is down at that moment.
+
+        :return: the created outbox records
+        """
+        lark_api = self.env['lark.api'].sudo().search([], limit=1, order='id desc')
+        if not tasks or not lark_api:
+            return self.browse()
+        date_planned = fields.Datetime.now() + timedelta(seconds=lark_api.outbox_delay_seconds)
+        records = self.sudo().create([{
+            'lark_api_id': lark_api.id,
+            'task_id': task.id,
+            'operation': operation,
+            'field_names': ','.join(sorted(field_names)),
+            'date_planned': date_planned,
+        } for task in tasks])
+        # A single cron trigger per transaction, whatever the number of edits
+        precommit = self.env.cr.precommit
+        trigger_at = precommit.data.get(OUTBOX_TRIGGER_KEY)
+        if trigger_at is None:
+            precommit.add(self._trigger_dispatch)
+        precommit.data[OUTBOX_TRIGGER_KEY] = min(trigger_at, date_planned) if trigger_at else date_planned
+        return records
+
+    @api.model
+    def _trigger_dispatch(self):
+        """Wake the dispatcher up when the earliest change queued in the transaction is due"""
+        date_planned = self.env.cr.precommit.data.pop(OUTBOX_TRIGGER_KEY, None)
+        cron = self.env.ref('xcd_lark_project_sync.ir_cron_dispatch_lark_outbox', raise_if_not_found=False)
+        if date_planned and cron:
+            cron.sudo()._trigger(at=date_planned)
+            self.env['ir.cron.trigger'].flush_model()
+
+    @api.model
+    def _cron_dispatch(self, time_budget=DISPATCH_TIME_BUDGET):
+        """Send the pending changes, one Lark call per task.
+
+        A task is sent once its last change is due: all its pending changes
+        are merged into a single create or field-level PATCH built from the
+        current task values. Calls go through the connection's rate limiter
+        and every task is committed on its own, so a failing task does not
+        hold back the others.
+
+        :return: number of tasks sent
+        """
+        self._purge_sent()
+        deadline = time.monotonic() + time_budget
+        now = fields.Datetime.now()
+        pending = self.search([('state', '=', 'pending')])
+        changes_by_task = defaultdict(self.browse)
+        for change in pending:
+            changes_by_task[change.task_id] |= change
+
+        sent = 0
+        next_check = None
+        for task, changes in changes_by_task.items():
+            due = max(changes.mapped('date_planned'))
+            if due > now:
+                next_check = min(next_check, due) if next_check else due
+                continue
+            if time.monotonic() > deadline:
+                next_check = now
+                break
+            sent += changes._dispatch_task()
+            if not self.env.registry.in_test_mode():
+                self.env.cr.commit()
+        self.env['lark.metric']._flush()
+
+        if next_check:
+            self.env.ref('xcd_lark_project_sync.ir_cron_dispatch_lark_outbox')._trigger(at=next_check)
+        if sent:
+            _logger.info("Pushed %d tasks to Lark (%d changes)", sent, len(pending))
+        return sent
+
+    def _dispatch_task(self):
+        """Send the merged pending changes of a single task"""
+        task = self.task_id
+        changes = self.sorted('id')
+        creating = not task.lark_guid and 'create' in changes.mapped('operation')
+        if not task.lark_guid and not creating:
+            changes.write({'state': 'ignored', 'date_sent': fields.Datetime.now(),
+                           'error': _("Task is not linked to Lark")})
+            metrics.inc(self.env.cr.dbname, 'lark_outbox_pushes_total', result='ignored')
+            return 0
+        field_names = set()
+        for change in changes:
+            field_names.update(filter(None, (change.field_names or '').split(',')))
+
+        lark_api = changes[-1].lark_api_id
+        try:
+            if creating:
+                created = changes.filtered('lark_guid')[-1:]
+                if created:
+                    # Created in Lark by a previous attempt, only the linking failed
+                    lark_task = json.loads(created.lark_task_data or '{}') or {'guid': created.lark_guid}
+                else:
+                    with self.env.cr.savepoint():
+                        lark_task = task._post_lark_task(lark_api)
+                    # Kept on its own, before the linking: a retry must never create it twice
+                    changes.write({'lark_guid': lark_task.get('guid'), 'lark_task_data': json.dumps(lark_task)})
+                    if not self.env.registry.in_test_mode():
+                        self.env.cr.commit()
+                with self.env.cr.savepoint():
+                    task._write_lark_reference(lark_api, lark_task)
+            else:
+                with self.env.cr.savepoint():
+                    task._patch_lark_task(lark_api, field_names)
+        except Exception as e:
+            changes._mark_failed(e)
+            metrics.inc(self.env.cr.dbname, 'lark_outbox_pushes_total', result='failed')
+            return 0
+        now = fields.Datetime.now()
+        changes[-1].write({'state': 'done', 'date_sent': now, 'error': False})
+        changes[:-1].write({'state': 'merged', 'date_sent': now, 'error': False})
+        metrics.inc(self.env.cr.dbname, 'lark_outbox_pushes_total', result='created' if creating else 'updated')
+        return 1
+
+    def _mark_failed(self, error):
+        """Retry the changes later with a growing delay, or fail them for good"""
+        _logger.warning("Could not push task %s to Lark: %s", self.task_id.ids, str(error))
+        for change in self:
+            vals = {'attempts': change.attempts + 1, 'error': str(error)}
+            if change.attempts + 1 < MAX_OUTBOX_ATTEMPTS:
+                vals['date_planned'] = fields.Datetime.now() + timedelta(
+                    minutes=OUTBOX_RETRY_DELAY_MINUTES * (change.attempts + 1))
+            else:
+                vals['state'] = 'failed'
+            change.write(vals)
+
+    @api.model
+    def _purge_sent(self):
+        limit = fields.Datetime.now() - timedelta(days=OUTBOX_RETENTION_DAYS)
+        self.search([('state', 'in', ('done', 'merged', 'ignored')), ('date_sent', '<', limit)]).unlink()
+
+    def action_retry(self):
+        self.write({'state': 'pending', 'attempts': 0, 'date_planned': fields.Datetime.now(), 'error': False})
+        self.env.ref('xcd_lark_project_sync.ir_cron_dispatch_lark_outbox')._trigger()
+
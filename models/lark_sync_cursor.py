@@ -0,0 +1,38 @@
+from odoo import models, fields, api
+
+
+class LarkSyncCursor(models.Model):
+    _name = 'lark.sync.cursor'
+    _description = 'Lark Sync Cursor'
+    _order = 'lark_api_id, project_id, kind'
+
+    lark_api_id = fields.Many2one('lark.api', string='Lark Connection', required=True, ondelete='cascade', index=True)
+    project_id = fields.Many2one('project.project', string='Project', required=True, ondelete='cascade', index=True)
+    kind = fields.Selection([
+        ('tasklist', 'Tasklist'),
+        ('section', 'Section'),
+        ('no_tasklist', 'Tasks Without Tasklist'),
+    ], string='Listing', required=True, default='tasklist')
+    lark_guid = fields.Char(string='Lark GUID', readonly=True)
+    watermark = fields.Datetime(string='Watermark', readonly=True,
+        help='Highest Lark updated_at (UTC) seen by the last successful sync of this listing')
+    last_success_date = fields.Datetime(string='Last Successful Sync', readonly=True)
+    last_full_sync_date = fields.Datetime(string='Last Full Sync', readonly=True)
+
+    _sql_constraints = [
+        ('listing_uniq', 'unique (lark_api_id, project_id, kind)',
+         'There can only be one sync cursor per connection, project and listing!'),
+    ]
+
+    @api.model
+    def _get_cursor_map(self, lark_api, projects):
+        """Return ``{(project_id, kind): cursor}`` for ``projects`` in one query"""
+        cursors = self.search([
+            ('lark_api_id', '=', lark_api.id),
+            ('project_id', 'in', projects.ids),
+        ])
+        return {(cursor.project_id.id, cursor.kind): cursor for cursor in cursors}
+
+    def action_reset(self):
+        """Forget the watermark so that the next sync refetches everything"""
+        self.write({'watermark': False, 'last_full_sync_date': False})
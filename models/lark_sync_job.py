@@ -0,0 +1,289 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+# Time a cron worker keeps claiming jobs before handing back to the scheduler
+JOB_TIME_BUDGET = 240.0
+# A running job without heartbeat for this long is considered dead
+JOB_TIMEOUT_MINUTES = 10
+# Running jobs refresh their heartbeat at most this often
+JOB_HEARTBEAT_SECONDS = 60
+MAX_JOB_ATTEMPTS = 3
+JOB_RETRY_DELAY_MINUTES = 5
+# A job whose tasklist is being synced by another job waits this long
+JOB_LOCK_RETRY_SECONDS = 30
+
+# Last heartbeat of the jobs running in this process, by job id
+_heartbeats = {}
+
+
+class LarkSyncJob(models.Model):
+    _name = 'lark.sync.job'
+    _description = 'Lark Sync Job'
+    _order = 'priority, id'
+
+    name = fields.Char(string='Job', required=True)
+    lark_api_id = fields.Many2one('lark.api', string='Lark Connection', required=True, ondelete='cascade', index=True)
+    project_id = fields.Many2one('project.project', string='Project', required=True, ondelete='cascade', index=True)
+    kind = fields.Selection([
+        ('tasklist', 'Tasklist'),
+        ('section', 'Section'),
+        ('no_tasklist', 'Tasks Without Tasklist'),
+    ], string='Listing', required=True, default='tasklist')
+    full_sync = fields.Boolean(string='Full Sync')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', required=True, default='pending', index=True)
+    priority = fields.Integer(string='Priority', default=10)
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    date_planned = fields.Datetime(string='Planned', readonly=True,
+        help='Job is not claimed before this date (retry backoff)')
+    date_started = fields.Datetime(string='Started', readonly=True)
+    date_heartbeat = fields.Datetime(string='Last Heartbeat', readonly=True,
+        help='Refreshed while the job runs; a job without heartbeat for too long is requeued')
+    date_done = fields.Datetime(string='Finished', readonly=True)
+    worker = fields.Char(string='Worker', readonly=True, help='host:pid of the worker that ran the job last')
+    tasks_created = fields.Integer(string='Created', readonly=True)
+    tasks_updated = fields.Integer(string='Updated', readonly=True)
+    tasks_unchanged = fields.Integer(string='Unchanged', readonly=True)
+    tasks_failed = fields.Integer(string='Failed', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+
+    def init(self):
+        # Claiming scans pending jobs only
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS lark_sync_job_pending_idx
+                ON lark_sync_job (priority, id) WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _enqueue(self, lark_api, specs):
+        """Queue one job per fetch spec, skipping listings already queued or running.
+
+        :param specs: fetch specs from ``lark.api._prepare_task_fetch_specs``
+        :return: the created jobs
+        """
+        active = self.search([
+            ('lark_api_id', '=', lark_api.id),
+            ('state', 'in', ('pending', 'running')),
+        ])
+        queued = {(job.project_id.id, job.kind) for job in active}
+        projects = self.env['project.project'].browse({spec['project_id'] for spec in specs})
+        names = dict(zip(projects.ids, projects.mapped('name')))
+        vals_list = []
+        for spec in specs:
+            key = (spec['project_id'], spec['kind'])
+            if key in queued:
+                continue
+            queued.add(key)
+            vals_list.append({
+                'name': f"{names.get(spec['project_id'], spec['project_id'])} ({spec['kind']})",
+                'lark_api_id': lark_api.id,
+                'project_id': spec['project_id'],
+                'kind': spec['kind'],
+                'full_sync': spec['full_sync'],
+            })
+        return self.create(vals_list)
+
+    @api.model
+    def _cron_process_jobs(self, time_budget=JOB_TIME_BUDGET):
+        """Claim and run queued jobs until the queue is empty or the time budget is spent.
+
+        Several cron records call this concurrently: each job is claimed
+        with ``FOR UPDATE SKIP LOCKED`` and run and committed on its own
+        cursor, so workers never wait on each other and a failing job does
+        not roll back the others.
+        """
+        self._requeue_stale_jobs()
+        deadline = time.monotonic() + time_budget
+        processed = 0
+        while time.monotonic() < deadline:
+            job_id = self._claim_next_job()
+            if not job_id:
+                break
+            if self._run_job(job_id):
+                processed += 1
+        if processed:
+            _logger.info("Processed %d Lark sync jobs", processed)
+        return processed
+
+    @api.model
+    def _claim_next_job(self):
+        """Atomically mark the next runnable job as running and return its id"""
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                UPDATE lark_sync_job
+                   SET state = 'running',
+                       attempts = attempts + 1,
+                       worker = %s,
+                       date_started = (now() at time zone 'UTC'),
+                       date_heartbeat = (now() at time zone 'UTC'),
+                       error = NULL
+                 WHERE id = (
+                    SELECT id
+                      FROM lark_sync_job
+                     WHERE state = 'pending'
+                       AND (date_planned IS NULL OR date_planned <= (now() at time zone 'UTC'))
+                  ORDER BY priority, id
+                     LIMIT 1
+                       FOR UPDATE SKIP LOCKED
+                 )
+             RETURNING id
+            """, [worker])
+            row = cr.fetchone()
+        return row[0] if row else None
+
+    @api.model
+    def _run_job(self, job_id):
+        """Run one claimed job in its own transaction.
+
+        Jobs listing the same Lark tasklist (a tasklist and its sections)
+        upsert the same tasks, so they never run concurrently: the job holds
+        an advisory lock on its tasklist, or is postponed if another job
+        holds it. The lock is taken at session level on a cursor of its own
+        because the sync commits its chunks along the way.
+
+        The job row itself is only written on short cursors of their own
+        (claim, heartbeat, result), never by the sync transaction.
+
+        :return: whether the job was run
+        """
+        with self.env.registry.cursor() as lock_cr:
+            job = self.with_env(self.env(cr=lock_cr)).browse(job_id)
+            lock_key = job._get_listing_lock_key()
+            lock_cr.execute("SELECT pg_try_advisory_lock(hashtext(%s))", [lock_key])
+            if not lock_cr.fetchone()[0]:
+                _logger.info("Lark sync job %s postponed: its tasklist is being synced by another job", job_id)
+                job._postpone()
+                return False
+            # The session lock outlives the commit, which ends the idle transaction
+            lock_cr.commit()
+            try:
+                vals = None
+                try:
+                    with self.env.registry.cursor() as cr:
+                        job = self.with_env(self.env(cr=cr)).browse(job_id)
+                        vals = job.with_context(lark_sync_job_id=job_id)._execute()
+                except Exception as e:
+                    vals = None
+                    _logger.error("Lark sync job %s failed: %s", job_id, str(e), exc_info=True)
+                    with self.env.registry.cursor() as cr:
+                        self.with_env(self.env(cr=cr)).browse(job_id)._mark_failed(e)
+                if vals:
+                    with self.env.registry.cursor() as cr:
+                        job = self.with_env(self.env(cr=cr)).browse(job_id)
+                        error = vals.pop('error', None)
+                        job.write(vals)
+                        if error:
+                            job._mark_failed(error)
+            finally:
+                _heartbeats.pop(job_id, None)
+                lock_cr.execute("SELECT pg_advisory_unlock(hashtext(%s))", [lock_key])
+                lock_cr.commit()
+        return True
+
+    def _get_listing_lock_key(self):
+        """Advisory lock key of the Lark tasklist listed by the job"""
+        self.ensure_one()
+        project = self.project_id
+        if self.kind == 'no_tasklist':
+            guid = 'none'
+        else:
+            guid = project.lark_parent_tasklist_guid or project.lark_id or str(project.id)
+        return f'lark.sync.tasklist:{self.lark_api_id.id}:{guid}'
+
+    def _postpone(self):
+        """Give a claimed job back to the queue without counting an attempt"""
+        for job in self:
+            job.write({
+                'state': 'pending',
+                'attempts': max(job.attempts - 1, 0),
+                'date_planned': fields.Datetime.now() + timedelta(seconds=JOB_LOCK_RETRY_SECONDS),
+            })
+
+    @api.model
+    def _heartbeat(self):
+        """Show that the job of the current sync is still alive, outside the sync transaction"""
+        job_id = self.env.context.get('lark_sync_job_id')
+        if not job_id:
+            return
+        now = time.monotonic()
+        if now - _heartbeats.get(job_id, 0.0) < JOB_HEARTBEAT_SECONDS:
+            return
+        _heartbeats[job_id] = now
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    UPDATE lark_sync_job SET date_heartbeat = (now() at time zone 'UTC')
+                     WHERE id = %s AND state = 'running'
+                """, [job_id])
+        except Exception as e:
+            _logger.warning("Could not refresh the heartbeat of Lark sync job %s: %s", job_id, str(e))
+
+    def _execute(self):
+        """Run the sync of the job and return the values of its result.
+
+        Listing errors (a Lark 5xx, an open circuit breaker) are returned as
+        ``error``, for the job to be retried like any failed job.
+        """
+        self.ensure_one()
+        self._heartbeat()
+        result = self.lark_api_id._run_task_sync(
+            full_sync=self.full_sync,
+            projects=self.project_id,
+            kinds={self.kind},
+        )
+        vals = {
+            'tasks_created': result['tasks_created'],
+            'tasks_updated': result['tasks_updated'],
+            'tasks_unchanged': result['tasks_unchanged'],
+            'tasks_failed': result['failed'],
+        }
+        if result['project_errors']:
+            vals['error'] = '\n'.join(error['error'] for error in result['project_errors'])
+        else:
+            vals.update(state='done', date_done=fields.Datetime.now())
+        return vals
+
+    def _mark_failed(self, error):
+        """Put a failed job back in the queue with a delay, or fail it for good.
+
+        :param error: the exception raised by the job, or an error message
+        """
+        if isinstance(error, BaseException):
+            error = ''.join(traceback.format_exception(error))
+        for job in self:
+            vals = {'error': error}
+            if job.attempts < MAX_JOB_ATTEMPTS:
+                vals.update(state='pending', date_planned=fields.Datetime.now() + timedelta(
+                    minutes=JOB_RETRY_DELAY_MINUTES * job.attempts))
+            else:
+                vals.update(state='failed', date_done=fields.Datetime.now())
+            job.write(vals)
+
+    @api.model
+    def _requeue_stale_jobs(self):
+        """Release jobs left running by a worker that died: their heartbeat stopped"""
+        limit = fields.Datetime.now() - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+        stale = self.search([
+            ('state', '=', 'running'),
+            '|', ('date_heartbeat', '<', limit),
+                 '&', ('date_heartbeat', '=', False), ('date_started', '<', limit),
+        ])
+        if stale:
+            _logger.warning("Requeuing %d stale Lark sync jobs: %s", len(stale), stale.ids)
+            stale._mark_failed(TimeoutError(_("Job sent no heartbeat for %s minutes") % JOB_TIMEOUT_MINUTES))
+
+    def action_requeue(self):
+        self.write({'state': 'pending', 'attempts': 0, 'date_planned': False, 'error': False})
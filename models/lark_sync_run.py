@@ -0,0 +1,421 @@
+import base64
+import cProfile
+import io
+import json
+import logging
+import marshal
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# A running run without checkpoint for that long is considered dead
+RUN_STALE_MINUTES = 10
+# Interrupted runs older than this are not resumed anymore
+RUN_RESUME_MAX_HOURS = 24
+
+# Per-listing state saved in the checkpoint
+CHECKPOINT_SPEC_KEYS = ('page_token', 'done', 'counts', 'tasks_found', 'tasks_skipped', 'full_sync')
+CHECKPOINT_DATETIME_KEYS = ('newest_updated_at', 'watermark')
+
+
+# Database side phases of a listing, timed by SyncMetrics
+DB_PHASES = ('transform', 'upsert', 'mirror', 'commit')
+
+# Functions and queries listed in the summary of a profiled run
+PROFILE_TOP_N = 30
+PROFILE_QUERY_WIDTH = 300
+
+
+def listing_key(spec):
+    return f"{spec['project_id']}:{spec['kind']}"
+
+
+class SyncMetrics:
+    """Wall time and SQL queries spent in each database phase of a listing.
+
+    Phases are measured on the sync cursor, so only work done on the
+    caller's thread is counted; HTTP time comes from the client counters.
+    """
+
+    def __init__(self, cr):
+        self.cr = cr
+        self.seconds = defaultdict(float)
+        self.queries = defaultdict(int)
+        self.rows = 0
+
+    @contextmanager
+    def phase(self, name):
+        start, queries = time.monotonic(), self.cr.sql_log_count
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.monotonic() - start
+            self.queries[name] += self.cr.sql_log_count - queries
+
+
+def sync_phase(metrics, name):
+    """``metrics.phase(name)``, or a no-op when the caller collects no metrics"""
+    return metrics.phase(name) if metrics else nullcontext()
+
+
+class SyncProfiler:
+    """cProfile and SQL query timings of the current thread, for one sync run.
+
+    Queries are collected through the query hooks of the Odoo cursors,
+    grouped by their text; fetch threads are not profiled, their HTTP time
+    shows as waits of the sync thread.
+    """
+
+    def __init__(self, top=PROFILE_TOP_N):
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.queries = defaultdict(lambda: [0, 0.0])
+        self.wall_seconds = 0.0
+        # Set by the sync once its run is started
+        self.run_id = None
+        self._thread = None
+
+    def _query_hook(self, cr, query, params, query_start, query_time):
+        stat = self.queries[' '.join(str(query).split())[:PROFILE_QUERY_WIDTH]]
+        stat[0] += 1
+        stat[1] += query_time
+
+    def __enter__(self):
+        self._thread = threading.current_thread()
+        if not hasattr(self._thread, 'query_hooks'):
+            self._thread.query_hooks = []
+        self._thread.query_hooks.append(self._query_hook)
+        self._start = time.monotonic()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.profile.disable()
+        self.wall_seconds = time.monotonic() - self._start
+        self._thread.query_hooks.remove(self._query_hook)
+
+    def summary(self):
+        """Top queries by total time and top functions by cumulative time, as text"""
+        query_count = sum(count for count, _seconds in self.queries.values())
+        query_seconds = sum(seconds for _count, seconds in self.queries.values())
+        lines = [
+            "Wall time: %.2fs, %d SQL queries in %.2fs" % (self.wall_seconds, query_count, query_seconds),
+            "",
+            "Top %d SQL queries by total time" % self.top,
+            "%8s %10s %9s  %s" % ('calls', 'total(s)', 'avg(ms)', 'query'),
+        ]
+        top_queries = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)[:self.top]
+        for query, (count, seconds) in top_queries:
+            lines.append("%8d %10.3f %9.2f  %s" % (count, seconds, seconds / count * 1000, query))
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.top)
+        lines += ["", "Top %d functions by cumulative time" % self.top, stream.getvalue().strip()]
+        return '\n'.join(lines)
+
+    def dump(self):
+        """The profile in the ``pstats`` file format (snakeviz, ``python -m pstats``)"""
+        return marshal.dumps(pstats.Stats(self.profile).stats)
+
+
+class LarkSyncRun(models.Model):
+    _name = 'lark.sync.run'
+    _description = 'Lark Sync Run'
+    _order = 'date_start desc, id desc'
+
+    name = fields.Char(string='Run', required=True)
+    lark_api_id = fields.Many2one('lark.api', string='Lark Connection', required=True, ondelete='cascade', index=True)
+    scope = fields.Char(string='Scope', required=True, default='all',
+        help='Projects and listings covered by the run; only a run of the same scope is resumed')
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('partial', 'Done with Errors'),
+        ('failed', 'Interrupted'),
+    ], string='State', required=True, default='running', index=True)
+    full_sync = fields.Boolean(string='Full Sync', readonly=True)
+    date_start = fields.Datetime(string='Started', readonly=True, default=fields.Datetime.now)
+    date_end = fields.Datetime(string='Finished', readonly=True)
+    date_checkpoint = fields.Datetime(string='Last Checkpoint', readonly=True)
+    resume_count = fields.Integer(string='Resumed', readonly=True)
+    commit_count = fields.Integer(string='Commits', readonly=True)
+    log_id = fields.Many2one('lark.api.log', string='Log', ondelete='set null', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+
+    # Checkpoint
+    current_project_id = fields.Many2one('project.project', string='Current Project', ondelete='set null', readonly=True)
+    page_token = fields.Char(string='Page Token', readonly=True,
+        help='Token of the next page of the current listing')
+    tasks_created = fields.Integer(string='Created', readonly=True)
+    tasks_updated = fields.Integer(string='Updated', readonly=True)
+    tasks_unchanged = fields.Integer(string='Unchanged', readonly=True)
+    tasks_failed = fields.Integer(string='Failed', readonly=True)
+    checkpoint = fields.Text(string='Checkpoint', readonly=True,
+        help='JSON state of every listing of the run: page token, counts and completion')
+
+    # Performance, per listing
+    project_line_ids = fields.One2many('lark.sync.run.project', 'run_id', string='Projects', readonly=True)
+    http_seconds = fields.Float(string='HTTP Wait (s)', compute='_compute_performance')
+    db_seconds = fields.Float(string='Database (s)', compute='_compute_performance',
+        help='Transform, upsert, mirror and commit time')
+    sql_queries = fields.Integer(string='SQL Queries', compute='_compute_performance')
+    api_calls = fields.Integer(string='API Calls', compute='_compute_performance')
+
+    # Profile, when the run was started with "Profile Next Sync"
+    profile_summary = fields.Text(string='Profile Summary', readonly=True)
+    profile_file = fields.Binary(string='Profile', readonly=True,
+        help='cProfile statistics of the run, readable with pstats or snakeviz')
+    profile_file_name = fields.Char(string='Profile Filename', readonly=True)
+
+    @api.depends('project_line_ids')
+    def _compute_performance(self):
+        for run in self:
+            lines = run.project_line_ids
+            run.http_seconds = sum(lines.mapped('http_seconds'))
+            run.db_seconds = sum(lines.mapped('db_seconds'))
+            run.sql_queries = sum(lines.mapped('sql_queries'))
+            run.api_calls = sum(lines.mapped('api_calls'))
+
+    @api.model
+    def _start(self, lark_api, full_sync=False, scope='all'):
+        """Return the run to execute: the last interrupted run of the same scope, or a new one.
+
+        Only runs that raised or died mid-way are resumed; a run that reached
+        its end is closed, even if some of its listings failed. An
+        incremental run is not resumed by a full sync, which supersedes it.
+
+        :raise UserError: if a run of the same scope is still in progress
+        """
+        now = fields.Datetime.now()
+        run = self.search([
+            ('lark_api_id', '=', lark_api.id),
+            ('scope', '=', scope),
+            ('state', 'in', ('running', 'failed')),
+            ('date_start', '>=', now - timedelta(hours=RUN_RESUME_MAX_HOURS)),
+        ], limit=1)
+        if run and run.state == 'running':
+            last_seen = run.date_checkpoint or run.date_start
+            if last_seen > now - timedelta(minutes=RUN_STALE_MINUTES):
+                raise UserError(_("A task sync of this connection is already running since %s.") % run.date_start)
+        if run and full_sync and not run.full_sync:
+            _logger.info("Not resuming incremental sync run %s: superseded by a full sync", run.id)
+            run.write({'state': 'partial', 'date_end': now, 'error': _("Superseded by a full sync")})
+            run = self.browse()
+        if run:
+            _logger.info("Resuming sync run %s from its checkpoint (project %s)", run.id, run.current_project_id.name)
+            run.write({'state': 'running', 'error': False, 'resume_count': run.resume_count + 1})
+            return run
+        return self.create({
+            'name': _('Task sync %s') % fields.Datetime.to_string(now),
+            'lark_api_id': lark_api.id,
+            'scope': scope,
+            'full_sync': full_sync,
+        })
+
+    def _restore_specs(self, specs):
+        """Apply the checkpoint to freshly prepared fetch specs.
+
+        :return: ``(specs_to_run, done_specs)``; finished listings are not
+                 fetched again but their counts are returned for the totals
+        """
+        self.ensure_one()
+        saved = json.loads(self.checkpoint or '{}').get('listings', {})
+        to_run, done = [], []
+        for spec in specs:
+            state = saved.get(listing_key(spec))
+            if not state:
+                to_run.append(spec)
+                continue
+            full_sync = spec.get('full_sync')
+            spec.update({key: state[key] for key in CHECKPOINT_SPEC_KEYS if key in state})
+            # A full sync requested now is never downgraded by the checkpoint
+            spec['full_sync'] = bool(full_sync or spec.get('full_sync'))
+            for key in CHECKPOINT_DATETIME_KEYS:
+                if key in state:
+                    spec[key] = fields.Datetime.to_datetime(state[key]) or False
+            (done if spec.get('done') else to_run).append(spec)
+        return to_run, done
+
+    def _pending_links(self):
+        """Parent links of the checkpoint whose parent was not synced yet"""
+        self.ensure_one()
+        return json.loads(self.checkpoint or '{}').get('pending_links', {})
+
+    def _save_checkpoint(self, specs, parent_links=None, current_spec=None):
+        """Persist the progress of every listing; committed by the caller"""
+        self.ensure_one()
+        listings = {}
+        totals = dict.fromkeys(('created', 'updated', 'unchanged', 'failed'), 0)
+        for spec in specs:
+            state = {key: spec.get(key) for key in CHECKPOINT_SPEC_KEYS}
+            for key in CHECKPOINT_DATETIME_KEYS:
+                state[key] = fields.Datetime.to_string(spec.get(key)) if spec.get(key) else False
+            listings[listing_key(spec)] = state
+            for key in totals:
+                totals[key] += (spec.get('counts') or {}).get(key, 0)
+        vals = {
+            'checkpoint': json.dumps({'listings': listings, 'pending_links': parent_links or {}}),
+            'date_checkpoint': fields.Datetime.now(),
+            'commit_count': self.commit_count + 1,
+            'tasks_created': totals['created'],
+            'tasks_updated': totals['updated'],
+            'tasks_unchanged': totals['unchanged'],
+            'tasks_failed': totals['failed'],
+        }
+        if current_spec:
+            vals.update({
+                'current_project_id': current_spec['project_id'],
+                'page_token': current_spec.get('page_token') or False,
+            })
+        self.write(vals)
+
+    def _record_listing(self, spec, error=None):
+        """Store the counters and phase timings of a finished listing"""
+        self.ensure_one()
+        metrics = spec.get('metrics')
+        client_stats = spec['client'].stats if spec.get('client') else {}
+        seconds = metrics.seconds if metrics else {}
+        counts = spec.get('counts') or {}
+        return self.env['lark.sync.run.project'].create({
+            'run_id': self.id,
+            'project_id': spec['project_id'],
+            'kind': spec['kind'],
+            'state': 'failed' if error else 'done',
+            'tasks_found': spec.get('tasks_found', 0),
+            'tasks_created': counts.get('created', 0),
+            'tasks_updated': counts.get('updated', 0),
+            'tasks_unchanged': counts.get('unchanged', 0),
+            'tasks_failed': counts.get('failed', 0),
+            'rows_written': metrics.rows if metrics else 0,
+            'fetch_seconds': spec.get('fetch_seconds', 0.0),
+            'http_seconds': client_stats.get('http_seconds', 0.0),
+            'throttle_seconds': client_stats.get('throttle_seconds', 0.0),
+            'parse_seconds': client_stats.get('parse_seconds', 0.0),
+            'transform_seconds': seconds.get('transform', 0.0),
+            'upsert_seconds': seconds.get('upsert', 0.0),
+            'mirror_seconds': seconds.get('mirror', 0.0),
+            'commit_seconds': seconds.get('commit', 0.0),
+            'sql_queries': sum(metrics.queries.values()) if metrics else 0,
+            'api_calls': client_stats.get('api_calls', 0),
+            'retries': client_stats.get('retries', 0),
+            'rate_limited': client_stats.get('rate_limited', 0),
+            'bytes_sent': client_stats.get('bytes_sent', 0),
+            'bytes_received': client_stats.get('bytes_received', 0),
+        })
+
+    def _finish(self, log=None, errors=None):
+        """Close the run; failed listings are fetched again by the next run, from their watermark"""
+        self.ensure_one()
+        self.write({
+            'state': 'partial' if errors else 'done',
+            'date_end': fields.Datetime.now(),
+            'page_token': False,
+            'log_id': log.id if log else False,
+            'error': json.dumps(errors, indent=2) if errors else False,
+        })
+
+    def _attach_profile(self, profiler, own_cursor=False):
+        """Store the profile of the run.
+
+        :param own_cursor: write outside the current transaction, for a run
+                           whose transaction is about to be rolled back; a
+                           run that was never committed only gets its
+                           summary in the server log
+        """
+        if not self:
+            _logger.warning("Profile of a Lark sync that failed before starting its run:\n%s", profiler.summary())
+            return
+        self.ensure_one()
+        vals = {
+            'profile_summary': profiler.summary(),
+            'profile_file': base64.b64encode(profiler.dump()),
+            'profile_file_name': f'lark_sync_run_{self.id}.prof',
+        }
+        if not own_cursor:
+            self.write(vals)
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("SET LOCAL lock_timeout = '5s'")
+                run = self.with_env(self.env(cr=cr)).exists()
+                if run:
+                    run.write(vals)
+                else:
+                    _logger.warning("Profile of uncommitted Lark sync run %s:\n%s", self.id, vals['profile_summary'])
+        except Exception as e:
+            _logger.warning("Could not store the profile of sync run %s: %s", self.id, str(e))
+
+    def _mark_interrupted(self, error):
+        """Flag the committed state of the run as resumable, outside the current transaction"""
+        if not self:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("SET LOCAL lock_timeout = '5s'")
+                cr.execute("""
+                    UPDATE lark_sync_run
+                       SET state = 'failed', error = %s
+                     WHERE id IN %s AND state = 'running'
+                """, [str(error), tuple(self.ids)])
+        except Exception as e:
+            _logger.warning("Could not flag sync run %s as interrupted: %s", self.ids, str(e))
+
+
+class LarkSyncRunProject(models.Model):
+    _name = 'lark.sync.run.project'
+    _description = 'Lark Sync Run Project'
+    _order = 'run_id desc, id'
+
+    run_id = fields.Many2one('lark.sync.run', string='Run', required=True, ondelete='cascade', index=True)
+    project_id = fields.Many2one('project.project', string='Project', ondelete='cascade', readonly=True)
+    kind = fields.Selection([
+        ('tasklist', 'Tasklist'),
+        ('section', 'Section'),
+        ('no_tasklist', 'Tasks Without Tasklist'),
+    ], string='Listing', readonly=True)
+    state = fields.Selection([
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', readonly=True)
+
+    tasks_found = fields.Integer(string='Found', readonly=True)
+    tasks_created = fields.Integer(string='Created', readonly=True)
+    tasks_updated = fields.Integer(string='Updated', readonly=True)
+    tasks_unchanged = fields.Integer(string='Unchanged', readonly=True)
+    tasks_failed = fields.Integer(string='Failed', readonly=True)
+    rows_written = fields.Integer(string='Rows Written', readonly=True,
+        help='lark.task and project.task rows created or updated')
+
+    # Lark side, measured in the fetch threads
+    fetch_seconds = fields.Float(string='Fetch (s)', readonly=True,
+        help='Time the fetch thread spent getting the pages, throttling included')
+    http_seconds = fields.Float(string='HTTP Wait (s)', readonly=True)
+    throttle_seconds = fields.Float(string='Throttled (s)', readonly=True,
+        help='Time spent waiting for the rate limiter before sending')
+    parse_seconds = fields.Float(string='JSON Parse (s)', readonly=True)
+    api_calls = fields.Integer(string='API Calls', readonly=True)
+    retries = fields.Integer(string='Retries', readonly=True)
+    rate_limited = fields.Integer(string='Rate Limited (429)', readonly=True)
+    bytes_sent = fields.Integer(string='Bytes Sent', readonly=True)
+    bytes_received = fields.Integer(string='Bytes Received', readonly=True)
+
+    # Odoo side, measured on the sync cursor
+    transform_seconds = fields.Float(string='Transform (s)', readonly=True)
+    upsert_seconds = fields.Float(string='Upsert (s)', readonly=True)
+    mirror_seconds = fields.Float(string='Mirror (s)', readonly=True)
+    commit_seconds = fields.Float(string='Commit (s)', readonly=True)
+    db_seconds = fields.Float(string='Database (s)', compute='_compute_db_seconds', store=True)
+    sql_queries = fields.Integer(string='SQL Queries', readonly=True)
+
+    @api.depends('transform_seconds', 'upsert_seconds', 'mirror_seconds', 'commit_seconds')
+    def _compute_db_seconds(self):
+        for line in self:
+            line.db_seconds = sum(line[f'{phase}_seconds'] for phase in DB_PHASES)
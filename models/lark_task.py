@@ -1,13 +1,21 @@
 # models/lark_task.py
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
-from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
+from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT, html2plaintext
 from datetime import datetime, timedelta
+import hashlib
 import logging
 import json
 
+from .lark_outbox import LARK_ORIGIN_CONTEXT_KEY
+
 _logger = logging.getLogger(__name__)
 
+def lark_payload_hash(task_data):
+    """Content hash of a normalized Lark task payload, stable across key order"""
+    payload = json.dumps(task_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
 class LarkTask(models.Model):
     _name = 'lark.task'
     _description = 'Lark Task'
@@ -61,6 +69,18 @@ class LarkTask(models.Model):
         tracking=True,
         check_company=True
     )
+    parent_id = fields.Many2one(
+        'lark.task',
+        string='Parent Task',
+        ondelete='set null',
+        index=True,
+        copy=False
+    )
+    child_ids = fields.One2many(
+        'lark.task',
+        'parent_id',
+        string='Subtasks'
+    )
     task_id = fields.Many2one(
         'project.task', 
         string='Odoo Task', 
@@ -117,29 +137,31 @@ class LarkTask(models.Model):
         string='Lark GUID',
         index=True,
         copy=False,
-        help='GUID of the task in Lark',
-        tracking=True
+        help='GUID of the task in Lark'
     )
     lark_etag = fields.Char(
         string='Lark ETag',
         readonly=True,
         copy=False,
-        help='ETag for change tracking from Lark',
-        tracking=True
+        help='ETag for change tracking from Lark'
     )
     lark_updated = fields.Datetime(
         string='Last Updated in Lark',
         readonly=True,
         copy=False,
-        help='Last update timestamp from Lark',
-        tracking=True
+        help='Last update timestamp from Lark'
+    )
+    lark_payload_hash = fields.Char(
+        string='Lark Payload Hash',
+        readonly=True,
+        copy=False,
+        help='Hash of the last payload received from Lark, used to skip no-op syncs'
     )
     last_sync_date = fields.Datetime(
         string='Last Sync Date',
         readonly=True,
         copy=False,
-        help='Last synchronization date with Lark',
-        tracking=True
+        help='Last synchronization date with Lark'
     )
     is_overdue = fields.Boolean(
         string='Is Overdue',
@@ -192,12 +214,8 @@ class LarkTask(models.Model):
         
         # Get or create project mapping using tasklist_guid if project_id not provided
         if not project_id and task_data.get('tasklist_guid'):
-            project = self.env['project.project'].search([
-                ('lark_tasklist_id.lark_guid', '=', task_data['tasklist_guid'])
-            ], limit=1)
-            if project:
-                project_id = project.id
-            else:
+            project_id = self.env['project.project']._get_lark_guid_project_map().get(task_data['tasklist_guid'])
+            if not project_id:
                 _logger.warning("No project found for tasklist_guid: %s", task_data['tasklist_guid'])
         
         # Prepare task values
@@ -220,9 +238,9 @@ class LarkTask(models.Model):
             
         # Handle assignee if available
         if task_data.get('assignee_id'):
-            user = self.env['res.users'].search([('lark_user_id', '=', task_data['assignee_id'])], limit=1)
-            if user:
-                vals['assignee_id'] = user.id
+            user_id = self.env['lark.user.map']._resolve_users([task_data['assignee_id']]).get(task_data['assignee_id'])
+            if user_id:
+                vals['assignee_id'] = user_id
         
         if task:
             task.write(vals)
@@ -236,6 +254,27 @@ class LarkTask(models.Model):
         
         return task
     
+    def _is_unchanged_from_lark(self, etag, values):
+        """Tell whether incoming Lark task values match what this task already holds.
+
+        Both sides must be unchanged: the Lark payload (same ETag when Lark
+        sends one, and same content hash of the normalized payload) and the
+        Odoo values resolved from it, i.e. the project and the assignee,
+        which move when a tasklist link or a user mapping changes in Odoo.
+
+        :param str etag: ETag sent by Lark, if any
+        :param dict values: lark.task values prepared for the payload
+        """
+        self.ensure_one()
+        if etag and self.lark_etag and etag != self.lark_etag:
+            return False
+        payload_hash = values.get('lark_payload_hash')
+        return (
+            bool(payload_hash) and payload_hash == self.lark_payload_hash
+            and self.project_id.id == values.get('project_id')
+            and self.assignee_id.id == (values.get('assignee_id') or False)
+        )
+    
     def _convert_lark_status(self, status_data):
         """Convert Lark status to Odoo status"""
         status_mapping = {
@@ -258,33 +297,131 @@ class LarkTask(models.Model):
     def _sync_odoo_task(self):
         """Create or update linked Odoo task"""
         self.ensure_one()
-        Task = self.env['project.task']
-        
-        # Prepare task values
-        task_vals = {
+        self._sync_odoo_tasks()
+        return self.task_id
+    
+    def _prepare_odoo_task_values(self):
+        """Values mirrored from this Lark task to its project.task"""
+        self.ensure_one()
+        return {
             'name': self.name,
             'description': self.description,
             'project_id': self.project_id.id,
             'date_deadline': self.due_date,
-            'user_ids': [(6, 0, [self.assignee_id.id])] if self.assignee_id else False,
-            'lark_task_id': self.id,
+            'user_ids': self.assignee_id.ids,
+            'lark_id': self.lark_id,
+            'lark_guid': self.lark_guid,
+            'lark_etag': self.lark_etag,
+            'lark_status': self.status,
         }
+    
+    @api.model
+    def _diff_odoo_task_values(self, odoo_task, values):
+        """Return the subset of ``values`` that differs from ``odoo_task``.
         
-        # Update last sync time
-        current_time = fields.Datetime.now()
+        Relational values are compared as ids; x2many values stay plain id
+        lists in the result. HTML values are compared as plain text, since
+        Lark descriptions are plain text and project.task stores sanitized
+        HTML.
+        """
+        diff = {}
+        for field_name, value in values.items():
+            field = odoo_task._fields[field_name]
+            current = odoo_task[field_name]
+            if field.type == 'many2one':
+                current = current.id
+            elif field.type in ('one2many', 'many2many'):
+                if set(current.ids) != set(value):
+                    diff[field_name] = value
+                continue
+            elif field.type == 'html':
+                if html2plaintext(current or '').strip() != html2plaintext(value or '').strip():
+                    diff[field_name] = value
+                continue
+            if (current or False) != (value or False):
+                diff[field_name] = value
+        return diff
+    
+    def _sync_odoo_tasks(self):
+        """Mirror a batch of Lark tasks to their project.task records.
         
-        if self.task_id:
-            self.task_id.write(task_vals)
-            _logger.info("Updated Odoo task %s for Lark task %s", self.task_id.id, self.id)
-        else:
-            task = Task.create(task_vals)
-            self.task_id = task.id
-            _logger.info("Created new Odoo task %s for Lark task %s", task.id, self.id)
+        Only the fields that actually differ are written, and tasks sharing
+        the same diff are written together; missing tasks are created with a
+        single multi-create. Unchanged project.task records are not touched
+        at all, so they get no tracking, follower or stage recompute.
+        
+        Writes are tagged with the Lark origin context so they are not pushed
+        back to Lark, and a project.task already carrying the etag of its
+        Lark task (mirrored before, or pushed from Odoo) is left alone.
+        
+        Returns:
+            dict: number of project.task ``created``, ``updated`` and ``unchanged``
+        """
+        if not self.env.context.get(LARK_ORIGIN_CONTEXT_KEY):
+            return self.with_context(**{LARK_ORIGIN_CONTEXT_KEY: True})._sync_odoo_tasks()
+        Task = self.env['project.task']
+        Project = self.env['project.project']
+        stats = {'created': 0, 'updated': 0, 'unchanged': 0}
+        if not self:
+            return stats
+        
+        generation = Project._get_lark_lookup_generation()
+
+        def stage_for(lark_task):
+            return Project._get_lark_stage_id(lark_task.project_id.id, lark_task.status == 'done', generation)
         
-        # Update last sync date
-        self.write({'last_sync_date': current_time})
+        to_create = self.browse()
+        create_vals = []
+        to_write = {}
+        for lark_task in self:
+            values = lark_task._prepare_odoo_task_values()
+            odoo_task = lark_task.task_id
+            if not odoo_task:
+                stage_id = stage_for(lark_task)
+                if stage_id:
+                    values['stage_id'] = stage_id
+                values['user_ids'] = [(6, 0, values['user_ids'])]
+                to_create |= lark_task
+                create_vals.append(values)
+                continue
             
-        return self.task_id
+            # Echo of a version Odoo already has, e.g. the answer to its own push
+            if lark_task.lark_etag and odoo_task.lark_etag == lark_task.lark_etag:
+                stats['unchanged'] += 1
+                continue
+            diff = self._diff_odoo_task_values(odoo_task, values)
+            # Only move the task between stages when it is completed or reopened in Lark
+            if 'lark_status' in diff and 'done' in (diff['lark_status'], odoo_task.lark_status):
+                stage_id = stage_for(lark_task)
+                if stage_id and stage_id != odoo_task.stage_id.id:
+                    diff['stage_id'] = stage_id
+            if not diff:
+                stats['unchanged'] += 1
+                continue
+            key = tuple(sorted((k, tuple(sorted(v)) if isinstance(v, list) else v) for k, v in diff.items()))
+            to_write[key] = to_write.get(key, Task) | odoo_task
+        
+        for key, odoo_tasks in to_write.items():
+            odoo_tasks.write({k: [(6, 0, list(v))] if isinstance(v, tuple) else v for k, v in key})
+            stats['updated'] += len(odoo_tasks)
+        
+        if create_vals:
+            created = Task.create(create_vals)
+            stats['created'] += len(created)
+            # Link the new tasks back with one UPDATE instead of one write each
+            self.flush_model(['task_id'])
+            self.env.cr.execute("""
+                UPDATE lark_task AS t
+                   SET task_id = v.task_id
+                  FROM (SELECT unnest(%s::int[]) AS id, unnest(%s::int[]) AS task_id) AS v
+                 WHERE t.id = v.id
+            """, [to_create.ids, created.ids])
+            to_create.invalidate_recordset(['task_id'])
+        
+        self.write({'last_sync_date': fields.Datetime.now()})
+        _logger.debug("Mirrored %d Lark tasks to project.task: %d created, %d updated, %d unchanged",
+                     len(self), stats['created'], stats['updated'], stats['unchanged'])
+        return stats
         
     # Computed Fields
     is_overdue = fields.Boolean(
@@ -309,57 +446,34 @@ class LarkTask(models.Model):
             else:
                 task.is_overdue = False
     
-    @api.model
-    def create(self, vals):
-        # Set default project from context if not provided
-        if 'project_id' not in vals and self._context.get('default_project_id'):
-            vals['project_id'] = self._context['default_project_id']
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            # Set default project from context if not provided
+            if 'project_id' not in vals and self._context.get('default_project_id'):
+                vals['project_id'] = self._context['default_project_id']
+            
+            # Set current user as assignee if not provided
+            if 'assignee_id' not in vals:
+                vals['assignee_id'] = self.env.uid
         
-        # Set current user as assignee if not provided
-        if 'assignee_id' not in vals:
-            vals['assignee_id'] = self.env.uid
+        # Number the tasks in the INSERT itself, grouped by name prefix
+        self.env['lark.task.sequence.allocator']._assign_task_sequences(
+            vals_list, 'lark.task', 'Lark Task')
         
-        # Generate task sequence if not provided
-        if not vals.get('task_sequence') and vals.get('name'):
-            # Get first 3 characters of the task name, convert to uppercase, and remove any non-alphabetic characters
-            import re
-            prefix = re.sub(r'[^a-zA-Z]', '', vals['name'])[:3].upper()
-            
-            # Ensure we have exactly 3 characters (pad with X if needed)
-            if len(prefix) < 3:
-                prefix = prefix.ljust(3, 'X')
-            
-            # Get or create the sequence
-            sequence_code = f'lark.task.{prefix.lower()}'
-            sequence = self.env['ir.sequence'].search([('code', '=', sequence_code)], limit=1)
-            
-            if not sequence:
-                sequence = self.env['ir.sequence'].create({
-                    'name': f'Lark Task {prefix} Sequence',
-                    'code': sequence_code,
-                    'prefix': f'{prefix}-',
-                    'padding': 4,
-                    'number_next_actual': 1,
-                    'number_increment': 1,
-                    'implementation': 'standard',
-                })
-            
-            # Generate the sequence number
-            vals['task_sequence'] = sequence.next_by_id()
-            
-        task = super(LarkTask, self).create(vals)
+        tasks = super(LarkTask, self).create(vals_list)
         
         # Log creation
-        _logger.info(f'Created new Lark Task: {task.name} (ID: {task.id}, Sequence: {task.task_sequence})')
+        _logger.debug('Created %d Lark Task(s): %s', len(tasks), tasks.ids)
         
-        return task
+        return tasks
     
     def write(self, vals):
         res = super(LarkTask, self).write(vals)
         
         # Log changes
         if 'status' in vals or 'assignee_id' in vals or 'due_date' in vals:
-            _logger.info(f'Updated Lark Task {self.id}: {dict(vals)}')
+            _logger.debug('Updated Lark Task(s) %s: %s', self.ids, vals)
         
         return res
     
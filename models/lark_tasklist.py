@@ -39,6 +39,13 @@ class LarkTasklist(models.Model):
         ('lark_guid_unique', 'UNIQUE(lark_guid)', 'Lark GUID must be unique!'),
     ]
     
+    def write(self, vals):
+        res = super().write(vals)
+        # Tasklist GUIDs are part of the cached GUID -> project map
+        if 'lark_guid' in vals and self.project_ids:
+            self.env['project.project']._invalidate_lark_lookups()
+        return res
+    
     @api.depends('name', 'lark_guid')
     def _compute_display_name(self):
         for record in self:
@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# PostgreSQL sequence advanced after every committed mapping change. Sequences
+# are not transactional: reading or advancing one takes no row lock and can
+# not fail with a serialization error, whatever transaction is running
+USER_MAP_GENERATION_SEQUENCE = 'lark_user_map_generation_seq'
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 600.0
+# Maximum number of ids per call of the contact batch API
+CONTACT_BATCH_SIZE = 50
+CONTACT_BATCH_URL = 'https://open.larksuite.com/open-apis/contact/v3/users/batch'
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds"""
+
+    _missing = object()
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generations = {}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_missing):
+        """Return the cached value, or ``default`` (``TTLCache._missing``) on a miss"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def sync_generation(self, dbname, generation):
+        """Drop the entries of ``dbname`` if its generation moved since the last call
+
+        Keys are ``(dbname, ...)`` tuples, so the other databases served by
+        the worker keep their entries.
+        """
+        with self._lock:
+            if self.generations.get(dbname) == generation:
+                return
+            self.generations[dbname] = generation
+            for key in [key for key in self._data if key[0] == dbname]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Per-process cache of ``(dbname, lark_id) -> res.users id or False``
+user_cache = TTLCache()
+
+
+class LarkUserMap(models.Model):
+    _name = 'lark.user.map'
+    _description = 'Lark User Mapping'
+    _order = 'name, id'
+
+    name = fields.Char(string='Name')
+    email = fields.Char(string='Email')
+    lark_open_id = fields.Char(string='Lark Open ID', required=True, index=True)
+    lark_user_id = fields.Char(string='Lark User ID', index=True)
+    lark_union_id = fields.Char(string='Lark Union ID')
+    user_id = fields.Many2one('res.users', string='Odoo User', ondelete='set null', index=True,
+        help='Odoo user assigned to the tasks of this Lark user')
+
+    _sql_constraints = [
+        ('lark_open_id_uniq', 'unique (lark_open_id)', 'A Lark user can only be mapped once!'),
+    ]
+
+    def init(self):
+        self.env.cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {USER_MAP_GENERATION_SEQUENCE}")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        maps = super().create(vals_list)
+        # Other workers may have cached these Lark users as unknown
+        self._bump_generation()
+        return maps
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'user_id', 'lark_open_id', 'lark_user_id'} & set(vals):
+            self._bump_generation()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._bump_generation()
+        return res
+
+    @api.model
+    def _get_generation(self):
+        # last_value is already 1 before the first nextval()
+        self.env.cr.execute(f"""
+            SELECT CASE WHEN is_called THEN last_value ELSE 0 END
+              FROM {USER_MAP_GENERATION_SEQUENCE}
+        """)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _bump_generation(self):
+        """Invalidate the user cache of every worker once the transaction commits.
+
+        Advancing the sequence before the commit would let another worker
+        reload the mappings before they are visible and cache the old ones.
+        """
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get(USER_MAP_GENERATION_SEQUENCE):
+            return
+        postcommit.data[USER_MAP_GENERATION_SEQUENCE] = True
+        registry = self.env.registry
+
+        @postcommit.add
+        def bump_generation():
+            try:
+                with registry.cursor() as cr:
+                    cr.execute("SELECT nextval(%s)", [USER_MAP_GENERATION_SEQUENCE])
+            except Exception as e:
+                _logger.warning("Could not invalidate the Lark user cache: %s", str(e))
+
+    @api.model
+    def _resolve_users(self, lark_ids, lark_api=None):
+        """Map Lark open_id/user_id values to ``res.users`` ids.
+
+        Cached ids cost nothing; the misses are looked up in the mapping
+        table with one query and, when ``lark_api`` is given, the ones still
+        unknown are fetched from the Lark contact API in batches of
+        ``CONTACT_BATCH_SIZE`` and stored.
+
+        :param lark_ids: iterable of Lark user ids
+        :param lark_api: optional ``lark.api`` record used to fetch unknown users
+        :return: ``{lark_id: user id or False}``
+        """
+        lark_ids = {lark_id for lark_id in lark_ids if lark_id}
+        if not lark_ids:
+            return {}
+        dbname = self.env.cr.dbname
+        user_cache.sync_generation(dbname, self._get_generation())
+
+        result = {}
+        misses = set()
+        for lark_id in lark_ids:
+            user_id = user_cache.get((dbname, lark_id))
+            if user_id is TTLCache._missing:
+                misses.add(lark_id)
+            else:
+                result[lark_id] = user_id
+        if not misses:
+            return result
+
+        mappings = self.sudo().search_fetch(
+            ['|', ('lark_open_id', 'in', list(misses)), ('lark_user_id', 'in', list(misses))],
+            ['lark_open_id', 'lark_user_id', 'user_id'],
+        )
+        for mapping in mappings:
+            for lark_id in (mapping.lark_open_id, mapping.lark_user_id):
+                if lark_id in misses:
+                    result[lark_id] = mapping.user_id.id
+                    misses.discard(lark_id)
+
+        if misses and lark_api:
+            result.update(self._fetch_lark_users(lark_api, misses))
+            misses.difference_update(result)
+
+        # Remember unknown users too, until the TTL or the next mapping change
+        for lark_id in misses:
+            result[lark_id] = False
+        for lark_id in lark_ids:
+            user_cache.set((dbname, lark_id), result[lark_id])
+        return result
+
+    @api.model
+    def _fetch_lark_users(self, lark_api, open_ids):
+        """Fetch users from the Lark contact API and store their mapping.
+
+        Lark users are matched to Odoo users by email (login or partner email).
+
+        :return: ``{open_id: user id or False}`` of the users Lark returned
+        """
+        open_ids = sorted(open_ids)
+        lark_users = []
+        for start in range(0, len(open_ids), CONTACT_BATCH_SIZE):
+            batch = open_ids[start:start + CONTACT_BATCH_SIZE]
+            try:
+                data = lark_api._lark_request('GET', CONTACT_BATCH_URL, params={
+                    'user_ids': batch,
+                    'user_id_type': 'open_id',
+                })
+            except Exception as e:
+                _logger.warning("Could not fetch %d Lark users from the contact API: %s", len(batch), str(e))
+                continue
+            lark_users.extend(data.get('items') or [])
+        if not lark_users:
+            return {}
+
+        emails = {
+            (user.get('enterprise_email') or user.get('email') or '').lower()
+            for user in lark_users
+        } - {''}
+        users_by_email = {}
+        if emails:
+            users = self.env['res.users'].sudo().search_fetch(
+                ['|', ('login', 'in', list(emails)), ('email', 'in', list(emails))],
+                ['login', 'email'],
+            )
+            for user in users:
+                for email in (user.login, user.email):
+                    if email:
+                        users_by_email.setdefault(email.lower(), user.id)
+
+        vals_list = []
+        result = {}
+        for lark_user in lark_users:
+            open_id = lark_user.get('open_id')
+            if not open_id:
+                continue
+            email = (lark_user.get('enterprise_email') or lark_user.get('email') or '').lower()
+            user_id = users_by_email.get(email, False)
+            vals_list.append({
+                'name': lark_user.get('name'),
+                'email': email or False,
+                'lark_open_id': open_id,
+                'lark_user_id': lark_user.get('user_id'),
+                'lark_union_id': lark_user.get('union_id'),
+                'user_id': user_id,
+            })
+            result[open_id] = user_id
+        if vals_list:
+            # Another worker may be mapping the same users concurrently
+            existing = set(self.sudo().search([
+                ('lark_open_id', 'in', [vals['lark_open_id'] for vals in vals_list]),
+            ]).mapped('lark_open_id'))
+            vals_list = [vals for vals in vals_list if vals['lark_open_id'] not in existing]
+            try:
+                with self.env.cr.savepoint():
+                    self.sudo().create(vals_list)
+            except Exception as e:
+                _logger.warning("Could not store %d Lark user mappings: %s", len(vals_list), str(e))
+                return result
+            _logger.info("Mapped %d Lark users (%d matched to Odoo users)",
+                         len(vals_list), len([v for v in vals_list if v['user_id']]))
+        return result
@@ -0,0 +1,274 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from odoo import models, fields, api
+
+from .lark_metrics import LAG_BUCKETS, metrics
+from .lark_outbox import OUTBOX_RETRY_DELAY_MINUTES
+
+_logger = logging.getLogger(__name__)
+
+WEBHOOK_VERIFY_TOKEN_PARAM = 'xcd_lark_project_sync.webhook_verify_token'
+WEBHOOK_ENCRYPT_KEY_PARAM = 'xcd_lark_project_sync.webhook_encrypt_key'
+MAX_EVENT_ATTEMPTS = 5
+# Events of a task that keeps changing are applied anyway after this many coalescing windows
+MAX_COALESCE_WINDOWS = 12
+EVENT_BATCH_LIMIT = 1000
+
+
+def _aes_key(encrypt_key):
+    # Lark derives the AES-256 key from the sha256 of the configured key
+    return hashlib.sha256(encrypt_key.encode('utf-8')).digest()
+
+
+def decrypt_lark_payload(encrypt_key, encrypted):
+    """Decrypt the ``encrypt`` field of a Lark event callback.
+
+    The payload is base64(iv + AES-256-CBC(PKCS7(json))), iv being 16 bytes.
+
+    :return: the decrypted event as a dict
+    :raise ValueError: if the payload cannot be decrypted or decoded
+    """
+    raw = base64.b64decode(encrypted)
+    if len(raw) < 32 or len(raw) % 16:
+        raise ValueError("Invalid encrypted Lark payload length")
+    decryptor = Cipher(algorithms.AES(_aes_key(encrypt_key)), modes.CBC(raw[:16])).decryptor()
+    padded = decryptor.update(raw[16:]) + decryptor.finalize()
+    unpadder = padding.PKCS7(128).unpadder()
+    plain = unpadder.update(padded) + unpadder.finalize()
+    return json.loads(plain.decode('utf-8'))
+
+
+def encrypt_lark_payload(encrypt_key, payload):
+    """Encrypt an event the way Lark does; used to build local sample callbacks"""
+    plain = json.dumps(payload).encode('utf-8')
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(plain) + padder.finalize()
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(_aes_key(encrypt_key)), modes.CBC(iv)).encryptor()
+    return base64.b64encode(iv + encryptor.update(padded) + encryptor.finalize()).decode('ascii')
+
+
+def lark_signature(timestamp, nonce, encrypt_key, body):
+    """Signature Lark sends in ``X-Lark-Signature``: sha256(timestamp + nonce + key + raw body)"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    content = (timestamp + nonce + encrypt_key).encode('utf-8') + body
+    return hashlib.sha256(content).hexdigest()
+
+
+def verify_lark_signature(timestamp, nonce, encrypt_key, body, signature):
+    if not (timestamp and nonce and signature):
+        return False
+    return hmac.compare_digest(lark_signature(timestamp, nonce, encrypt_key, body), signature)
+
+
+def event_task_guid(event):
+    """GUID of the task an event is about, whatever the event version"""
+    body = event.get('event') or {}
+    task = body.get('task') if isinstance(body.get('task'), dict) else {}
+    return body.get('task_guid') or task.get('guid') or body.get('task_id') or task.get('id')
+
+
+class LarkWebhookEvent(models.Model):
+    _name = 'lark.webhook.event'
+    _description = 'Lark Webhook Event'
+    _order = 'id'
+
+    event_id = fields.Char(string='Event ID', required=True, readonly=True)
+    event_type = fields.Char(string='Event Type', readonly=True, index=True)
+    lark_api_id = fields.Many2one('lark.api', string='Lark Connection', ondelete='cascade', readonly=True, index=True)
+    task_guid = fields.Char(string='Task GUID', readonly=True, index=True)
+    payload = fields.Text(string='Payload', readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('merged', 'Merged'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ], string='State', required=True, default='pending', index=True,
+        help='Merged: superseded by a later event of the same task, applied together with it')
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    date_planned = fields.Datetime(string='Planned', readonly=True,
+        help='A failed event is not applied again before this date (retry backoff)')
+    received_date = fields.Datetime(string='Received', readonly=True, default=fields.Datetime.now, index=True)
+    processed_date = fields.Datetime(string='Processed', readonly=True)
+    lag = fields.Float(string='Lag (s)', compute='_compute_lag', store=True, aggregator='avg',
+        help='Seconds between the reception of the event and its application')
+    error = fields.Text(string='Error', readonly=True)
+
+    _sql_constraints = [
+        ('event_id_uniq', 'unique (event_id)', 'A Lark event can only be stored once!'),
+    ]
+
+    @api.depends('received_date', 'processed_date')
+    def _compute_lag(self):
+        for event in self:
+            if event.received_date and event.processed_date:
+                event.lag = (event.processed_date - event.received_date).total_seconds()
+            else:
+                event.lag = 0.0
+
+    @api.model
+    def _ingest(self, event):
+        """Store a verified, decrypted Lark event in the inbox.
+
+        Lark redelivers events it did not get a timely answer for, so events
+        already stored are ignored.
+
+        :return: the stored event, or an empty recordset for a duplicate
+        """
+        header = event.get('header') or {}
+        event_id = header.get('event_id') or event.get('uuid')
+        if not event_id:
+            raise ValueError("Lark event without event_id")
+        if self.search_count([('event_id', '=', event_id)], limit=1):
+            return self.browse()
+        lark_api = self.env['lark.api']
+        if header.get('app_id'):
+            lark_api = lark_api.search([('app_id', '=', header['app_id'])], limit=1)
+        try:
+            with self.env.cr.savepoint():
+                return self.create({
+                    'event_id': event_id,
+                    'event_type': header.get('event_type') or (event.get('event') or {}).get('type'),
+                    'lark_api_id': lark_api.id,
+                    'task_guid': event_task_guid(event),
+                    'payload': json.dumps(event),
+                })
+        except Exception:
+            # Concurrent delivery of the same event
+            _logger.info("Lark event %s already stored", event_id)
+            return self.browse()
+
+    @api.model
+    def _cron_process_events(self, limit=EVENT_BATCH_LIMIT):
+        """Apply the pending inbox events, coalesced per task.
+
+        Bulk edits in Lark send bursts of events for the same tasks. Events
+        of a task are held until the task has been quiet for the coalescing
+        window of its connection (``webhook_coalesce_seconds``), then the
+        whole burst costs one fetch: the last event decides between update
+        and delete, the earlier ones are marked as merged. Tasks changing
+        non-stop are applied anyway after ``MAX_COALESCE_WINDOWS`` windows.
+
+        :return: number of events handled
+        """
+        now = fields.Datetime.now()
+        events = self.search([
+            ('state', '=', 'pending'),
+            '|', ('date_planned', '=', False), ('date_planned', '<=', now),
+        ], limit=limit)
+        bursts = defaultdict(self.browse)
+        for event in events:
+            bursts[(event.lark_api_id, event.task_guid)] |= event
+
+        ready = self.browse()
+        next_check = None
+        for (lark_api, task_guid), burst in bursts.items():
+            window = timedelta(seconds=lark_api.webhook_coalesce_seconds if lark_api else 0)
+            last_received = max(burst.mapped('received_date'))
+            first_received = min(burst.mapped('received_date'))
+            if last_received + window <= now or first_received + window * MAX_COALESCE_WINDOWS <= now:
+                ready |= burst
+            else:
+                due = min(last_received + window, first_received + window * MAX_COALESCE_WINDOWS)
+                next_check = min(next_check, due) if next_check else due
+        ready._process()
+        self.env['lark.metric']._flush()
+
+        if next_check or len(events) == limit:
+            cron = self.env.ref('xcd_lark_project_sync.ir_cron_process_lark_webhook_events', raise_if_not_found=False)
+            if cron:
+                cron._trigger(at=next_check if len(events) < limit else None)
+        return len(ready)
+
+    def _process(self):
+        """Fetch and upsert the tasks of the events through the regular sync path.
+
+        Events are grouped per connection and task: every task is fetched
+        once and all the updated tasks of a connection are upserted in one
+        batch. If the batch fails, the upsert is retried task by task with
+        the payloads already fetched, so a single bad task only fails its
+        own events.
+        """
+        default_api = self.env['lark.api'].search([], limit=1)
+        now = fields.Datetime.now()
+        ignored = self.filtered(lambda event: not event.task_guid or not (event.lark_api_id or default_api))
+        ignored.write({'state': 'ignored', 'processed_date': now})
+        if ignored:
+            metrics.inc(self.env.cr.dbname, 'lark_webhook_events_total', len(ignored), state='ignored')
+
+        bursts_by_api = defaultdict(lambda: defaultdict(self.browse))
+        for event in (self - ignored).sorted('id'):
+            bursts_by_api[event.lark_api_id or default_api][event.task_guid] |= event
+
+        for lark_api, bursts in bursts_by_api.items():
+            to_delete = [guid for guid, burst in bursts.items() if 'delete' in (burst[-1].event_type or '')]
+            fetched, failures = lark_api._fetch_lark_tasks([guid for guid in bursts if guid not in to_delete])
+            try:
+                with self.env.cr.savepoint():
+                    lark_api._archive_lark_tasks(to_delete)
+                    lark_api._apply_lark_tasks(fetched)
+            except Exception as e:
+                _logger.warning("Batch of %d Lark events failed, applying tasks one by one: %s", len(bursts), str(e))
+                for task_guid in bursts:
+                    if task_guid in failures:
+                        continue
+                    try:
+                        with self.env.cr.savepoint():
+                            if task_guid in to_delete:
+                                lark_api._archive_lark_tasks([task_guid])
+                            elif task_guid in fetched:
+                                lark_api._apply_lark_tasks({task_guid: fetched[task_guid]})
+                    except Exception as task_error:
+                        failures[task_guid] = str(task_error)
+
+            now = fields.Datetime.now()
+            done = merged = self.browse()
+            for task_guid, burst in bursts.items():
+                if task_guid in failures:
+                    burst._mark_failed(failures[task_guid])
+                    continue
+                done |= burst[-1]
+                merged |= burst[:-1]
+            done.write({'state': 'done', 'processed_date': now, 'error': False})
+            merged.write({'state': 'merged', 'processed_date': now, 'error': False})
+            dbname = self.env.cr.dbname
+            for state, events in (('done', done), ('merged', merged)):
+                if events:
+                    metrics.inc(dbname, 'lark_webhook_events_total', len(events), state=state)
+            for lag in (done | merged).mapped('lag'):
+                metrics.observe(dbname, 'lark_webhook_lag_seconds', lag, LAG_BUCKETS)
+            if failures:
+                metrics.inc(dbname, 'lark_webhook_events_total',
+                            sum(len(bursts[guid]) for guid in failures), state='failed')
+            if done:
+                _logger.info("Lark connection %s: applied %d webhook events as %d task fetches (max lag %.1fs)",
+                             lark_api.name, len(done) + len(merged), len(done),
+                             max((done | merged).mapped('lag')))
+
+    def _mark_failed(self, error):
+        """Retry the events later with a growing delay; they are given up after ``MAX_EVENT_ATTEMPTS``"""
+        _logger.warning("Could not apply Lark events %s: %s", self.mapped('event_id'), error)
+        now = fields.Datetime.now()
+        for event in self:
+            attempts = event.attempts + 1
+            vals = {'attempts': attempts, 'error': error}
+            if attempts < MAX_EVENT_ATTEMPTS:
+                vals.update(state='pending', date_planned=now + timedelta(minutes=OUTBOX_RETRY_DELAY_MINUTES * attempts))
+            else:
+                vals['state'] = 'failed'
+            event.write(vals)
+
+    def action_retry(self):
+        self.write({'state': 'pending', 'attempts': 0, 'date_planned': False, 'error': False})
@@ -1,9 +1,137 @@
-from odoo import models, fields, api
+from collections import defaultdict
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import MissingError
 import re
 
+
+def task_sequence_prefix(name):
+    """Return the 3-letter sequence prefix of a task name.
+
+    First 3 alphabetic characters of the name, uppercased and padded with X.
+    """
+    prefix = re.sub(r'[^a-zA-Z]', '', name or '')[:3].upper()
+    return prefix.ljust(3, 'X')
+
+
+class TaskSequenceAllocator(models.AbstractModel):
+    _name = 'lark.task.sequence.allocator'
+    _description = 'Task Sequence Allocator'
+
+    @api.model
+    def _assign_task_sequences(self, vals_list, code_prefix, name_prefix):
+        """Fill ``task_sequence`` in ``vals_list`` before the records are created.
+
+        Values are grouped by name prefix; each prefix resolves its sequence
+        once (cached) and reserves all the numbers it needs in one query.
+        A sequence created by another worker after the current transaction
+        started is not visible to it yet: its numbers are then reserved on
+        a cursor of their own.
+
+        :param list vals_list: values passed to ``create``, updated in place
+        :param str code_prefix: prefix of the ``ir.sequence`` codes, e.g. ``lark.task``
+        :param str name_prefix: prefix of the names of the sequences created on the fly
+        """
+        indexes_by_prefix = defaultdict(list)
+        for index, vals in enumerate(vals_list):
+            if not vals.get('task_sequence') and vals.get('name'):
+                indexes_by_prefix[task_sequence_prefix(vals['name'])].append(index)
+
+        Sequence = self.env['ir.sequence'].sudo()
+        for prefix, indexes in indexes_by_prefix.items():
+            code = f'{code_prefix}.{prefix.lower()}'
+            sequence = Sequence.browse(self._get_task_sequence_id(code, prefix, name_prefix))
+            try:
+                numbers = self._reserve_sequence_numbers(sequence, len(indexes))
+            except MissingError:
+                # Created by another transaction after this one started
+                with self.env.registry.cursor() as cr:
+                    numbers = self.with_env(self.env(cr=cr))._reserve_sequence_numbers(
+                        sequence.with_env(sequence.env(cr=cr)), len(indexes))
+            for index, number in zip(indexes, numbers):
+                vals_list[index]['task_sequence'] = number
+        return vals_list
+
+    @api.model
+    @tools.ormcache('code', 'prefix', 'name_prefix')
+    def _get_task_sequence_id(self, code, prefix, name_prefix):
+        """Return the id of the ``ir.sequence`` of ``code``, creating it if needed.
+
+        Never falsy: a missing sequence is created and committed before its
+        id gets cached, so a rolled back transaction can not leave the id
+        of a sequence that does not exist in the cache of the worker.
+        """
+        sequence = self.env['ir.sequence'].sudo().search([('code', '=', code)], limit=1)
+        return sequence.id or self._create_task_sequence(code, prefix, name_prefix)
+
+    @api.model
+    def _create_task_sequence(self, code, prefix, name_prefix):
+        """Create the sequence of ``code`` on a cursor of its own, once across workers.
+
+        Creators are serialized by a session advisory lock on the code; the
+        sequence is looked up again once the lock is held, in a transaction
+        started after the one of a concurrent creator committed.
+
+        :return: id of the committed sequence
+        """
+        with self.env.registry.cursor() as cr:
+            cr.execute("SELECT pg_advisory_lock(hashtext(%s))", [code])
+            try:
+                # Start a new transaction, hence snapshot, now that the lock is held
+                cr.commit()
+                Sequence = self.env(cr=cr)['ir.sequence'].sudo()
+                sequence = Sequence.search([('code', '=', code)], limit=1)
+                if not sequence:
+                    sequence = Sequence.create({
+                        'name': f'{name_prefix} {prefix} Sequence',
+                        'code': code,
+                        'prefix': f'{prefix}-',
+                        'padding': 4,
+                        'number_next_actual': 1,
+                        'number_increment': 1,
+                        'implementation': 'standard',
+                    })
+                sequence_id = sequence.id
+                cr.commit()
+            finally:
+                cr.rollback()
+                cr.execute("SELECT pg_advisory_unlock(hashtext(%s))", [code])
+        return sequence_id
+
+    @api.model
+    def _reserve_sequence_numbers(self, sequence, count):
+        """Reserve ``count`` numbers of ``sequence`` in one round trip.
+
+        :return: the formatted sequence values, in allocation order
+        """
+        if sequence.use_date_range:
+            # Date ranged sequences keep their own counters per range
+            return [sequence._next() for _i in range(count)]
+
+        if sequence.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                [f'ir_sequence_{sequence.id:03d}', count],
+            )
+            numbers = sorted(row[0] for row in self.env.cr.fetchall())
+        else:
+            sequence.flush_recordset(['number_next', 'number_increment'])
+            self.env.cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next, number_increment
+            """, [count, sequence.id])
+            number_next, increment = self.env.cr.fetchone()
+            sequence.invalidate_recordset(['number_next'])
+            first = number_next - increment * count
+            numbers = [first + increment * i for i in range(count)]
+        return [sequence.get_next_char(number) for number in numbers]
+
+
 class ProjectTask(models.Model):
     _inherit = 'project.task'
-    
+
     task_sequence = fields.Char(
         string='Task Number',
         readonly=True,
@@ -11,45 +139,10 @@ class ProjectTask(models.Model):
         index=True,
         help='Auto-generated task sequence number'
     )
-    
+
     @api.model_create_multi
     def create(self, vals_list):
-        # Call the original create method
-        tasks = super(ProjectTask, self).create(vals_list)
-        
-        for task in tasks:
-            # Generate the sequence if name exists
-            if task.name:
-                # Get first 3 characters of the task name, convert to uppercase, and remove any non-alphabetic characters
-                prefix = re.sub(r'[^a-zA-Z]', '', task.name)[:3].upper()
-                
-                # Ensure we have exactly 3 characters (pad with X if needed)
-                if len(prefix) < 3:
-                    prefix = prefix.ljust(3, 'X')
-                
-                # Get or create the sequence
-                sequence_code = f'project.task.{prefix.lower()}'
-                sequence = self.env['ir.sequence'].search([('code', '=', sequence_code)], limit=1)
-                
-                if not sequence:
-                    sequence = self.env['ir.sequence'].create({
-                        'name': f'Task {prefix} Sequence',
-                        'code': sequence_code,
-                        'prefix': f'{prefix}-',
-                        'padding': 4,
-                        'number_next_actual': 1,
-                        'number_increment': 1,
-                        'implementation': 'standard',
-                    })
-                
-                # Generate the sequence number
-                sequence_number = sequence.next_by_id()
-                
-                # Store the sequence number in the task_sequence field
-                if sequence_number:
-                    task.write({
-                        'task_sequence': sequence_number,
-                        # Keep the original name as is
-                    })
-        
-        return tasks
+        # Number the tasks in the INSERT itself, grouped by name prefix
+        self.env['lark.task.sequence.allocator']._assign_task_sequences(
+            vals_list, 'project.task', 'Task')
+        return super(ProjectTask, self).create(vals_list)
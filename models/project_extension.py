@@ -1,12 +1,26 @@
 import logging
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 from odoo.exceptions import UserError
-import requests
+from odoo.tools import html2plaintext
+
+from .lark_api import BULK_SYNC_CONTEXT, normalize_lark_task
+from .lark_outbox import LARK_ORIGIN_CONTEXT_KEY, LARK_PUSH_FIELDS
+
+TASK_CREATE_URL = 'https://open.larksuite.com/open-apis/task/v2/tasks'
+TASK_PATCH_URL = 'https://open.larksuite.com/open-apis/task/v2/tasks/%s'
+# PostgreSQL sequence keying the cached GUID -> project and stage lookups,
+# advanced after a commit that changed their inputs
+LARK_LOOKUP_GENERATION_SEQUENCE = 'lark_project_lookup_generation_seq'
 
 _logger = logging.getLogger(__name__)
 _logger.info("Loading project_extension.py")
 
+
+def _lark_timestamp(value):
+    """Lark timestamps are milliseconds since the epoch, as strings"""
+    return str(int(fields.Datetime.to_datetime(value).timestamp() * 1000))
+
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
 
@@ -53,6 +67,10 @@ class ProjectProject(models.Model):
         store=True
     )
     
+    def init(self):
+        super().init()
+        self.env.cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {LARK_LOOKUP_GENERATION_SEQUENCE}")
+
     @api.constrains('lark_tasklist_id')
     def _check_lark_tasklist_id(self):
         for project in self:
@@ -65,16 +83,146 @@ class ProjectProject(models.Model):
         for project in projects:
             if 'lark_tasklist_id' in self.env.context.get('default_lark_tasklist_id', {}):
                 project.lark_tasklist_id = self.env.context['default_lark_tasklist_id']
+        if projects._is_lark_linked():
+            self._invalidate_lark_lookups()
         return projects
     
     def write(self, vals):
+        lookup_fields = {'lark_id', 'lark_tasklist_id', 'active', 'type_ids'} & set(vals)
+        linked = lookup_fields and self._is_lark_linked()
         res = super().write(vals)
         if 'lark_tasklist_id' in vals:
             for project in self:
                 if project.lark_tasklist_id and project.lark_tasklist_id.project_id != project:
                     project.lark_tasklist_id.write({'project_id': project.id})
+        if lookup_fields and (linked or self._is_lark_linked()):
+            self._invalidate_lark_lookups()
         return res
     
+    def unlink(self):
+        linked = self._is_lark_linked()
+        res = super().unlink()
+        if linked:
+            self._invalidate_lark_lookups()
+        return res
+
+    def _get_lark_tasklist_guid(self):
+        """GUID of the Lark tasklist of the project (the parent one for a section), if any"""
+        return self.lark_parent_tasklist_guid or self.lark_id or False
+
+    def _is_lark_linked(self):
+        """Tell whether any of these projects is linked to a Lark tasklist or section"""
+        return any(project.lark_id or project.lark_tasklist_id for project in self)
+
+    @api.model
+    def _get_lark_lookup_generation(self):
+        """Generation of the cached GUID -> project and stage lookups.
+
+        0 while the current transaction changes their inputs: the lookups
+        are then computed without cache until it commits.
+        """
+        if self.env.cr.postcommit.data.get(LARK_LOOKUP_GENERATION_SEQUENCE):
+            return 0
+        self.env.cr.execute(f"SELECT last_value + is_called::int FROM {LARK_LOOKUP_GENERATION_SEQUENCE}")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _invalidate_lark_lookups(self):
+        """Invalidate the cached lookups of every worker once the transaction commits.
+
+        Only these two caches are dropped: their entries are keyed on the
+        generation, which a non transactional sequence moves forward.
+        """
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get(LARK_LOOKUP_GENERATION_SEQUENCE):
+            return
+        postcommit.data[LARK_LOOKUP_GENERATION_SEQUENCE] = True
+        registry = self.env.registry
+
+        @postcommit.add
+        def bump_generation():
+            try:
+                with registry.cursor() as cr:
+                    cr.execute("SELECT nextval(%s)", [LARK_LOOKUP_GENERATION_SEQUENCE])
+            except Exception as e:
+                _logger.warning("Could not invalidate the Lark project lookups: %s", str(e))
+    
+    @api.model
+    def _get_lark_guid_project_map(self):
+        """Return ``{tasklist/section GUID: project id}`` for every Lark-linked project.
+        
+        Cached until a project or tasklist link changes; callers must not
+        modify the returned dict.
+        """
+        generation = self._get_lark_lookup_generation()
+        if not generation:
+            return self._read_lark_guid_project_map()
+        return self._cached_lark_guid_project_map(generation)
+
+    @api.model
+    @tools.ormcache('generation')
+    def _cached_lark_guid_project_map(self, generation):
+        return self._read_lark_guid_project_map()
+
+    @api.model
+    def _read_lark_guid_project_map(self):
+        projects = self.sudo().search_fetch(
+            ['|', ('lark_id', '!=', False), ('lark_tasklist_id', '!=', False)],
+            ['lark_id', 'lark_tasklist_id'],
+        )
+        guid_map = {}
+        for project in projects:
+            if project.lark_id:
+                guid_map.setdefault(project.lark_id, project.id)
+        # A project's own GUID wins over the tasklist it is linked to
+        for project in projects:
+            if project.lark_tasklist_id.lark_guid:
+                guid_map.setdefault(project.lark_tasklist_id.lark_guid, project.id)
+        return guid_map
+    
+    @api.model
+    def _get_lark_stage_id(self, project_id, is_completed, generation=None):
+        """Get the stage of a synced task based on its completion status.
+        
+        Completed tasks go to the first "Done", "Completed" or "Closed" stage
+        (else the last stage), open tasks to the first stage. Cached until a
+        stage of a Lark-linked project changes.
+        
+        :param generation: ``_get_lark_lookup_generation()``, when the caller
+            resolves many stages at once
+        :return: stage id, or False if the project has no stages
+        """
+        if generation is None:
+            generation = self._get_lark_lookup_generation()
+        if not generation:
+            return self._read_lark_stage_id(project_id, is_completed)
+        return self._cached_lark_stage_id(project_id, is_completed, generation)
+
+    @api.model
+    @tools.ormcache('project_id', 'is_completed', 'generation')
+    def _cached_lark_stage_id(self, project_id, is_completed, generation):
+        return self._read_lark_stage_id(project_id, is_completed)
+
+    @api.model
+    def _read_lark_stage_id(self, project_id, is_completed):
+        stages = self.env['project.task.type'].sudo().search([('project_ids', 'in', [project_id])])
+        if not stages:
+            _logger.warning("No stages found for project ID %s", project_id)
+            return False
+        
+        if is_completed:
+            # Look for completed stages in order of preference
+            for stage_name in ['Done', 'Completed', 'Closed']:
+                done_stage = stages.filtered(
+                    lambda s: stage_name.lower() in s.name.lower()
+                )
+                if done_stage:
+                    return min(done_stage, key=lambda x: x.sequence).id
+            # If no specific done stage found, use the last stage in the sequence
+            return max(stages, key=lambda x: x.sequence).id
+        # For incomplete tasks, use the first stage in the sequence
+        return min(stages, key=lambda x: x.sequence).id
+    
     def create_in_lark(self):
         """Create this project in Lark"""
         self.ensure_one()
@@ -125,6 +273,31 @@ class ProjectProject(models.Model):
             raise UserError(_("No Lark tasklist is linked to this project."))
         return self.lark_tasklist_id.sync_tasks()
 
+class ProjectTaskType(models.Model):
+    _inherit = 'project.task.type'
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        stages = super().create(vals_list)
+        if stages.project_ids._is_lark_linked():
+            self.env['project.project']._invalidate_lark_lookups()
+        return stages
+    
+    def write(self, vals):
+        lookup_fields = {'name', 'sequence', 'project_ids'} & set(vals)
+        linked = lookup_fields and self.project_ids._is_lark_linked()
+        res = super().write(vals)
+        if lookup_fields and (linked or self.project_ids._is_lark_linked()):
+            self.env['project.project']._invalidate_lark_lookups()
+        return res
+    
+    def unlink(self):
+        linked = self.project_ids._is_lark_linked()
+        res = super().unlink()
+        if linked:
+            self.env['project.project']._invalidate_lark_lookups()
+        return res
+
 class ProjectTaskExtension(models.Model):
     _inherit = 'project.task'
     
@@ -174,13 +347,9 @@ class ProjectTaskExtension(models.Model):
         try:
             # Get task details from Lark
             url = f'https://open.larksuite.com/open-apis/task/v2/tasks/{self.lark_id}'
-            headers = {
-                "Authorization": f"Bearer {lark_api.user_access_token}",
-                "Content-Type": "application/json; charset=utf-8"
-            }
             
             _logger.info("Fetching task details from %s", url)
-            response = requests.get(url, headers=headers, timeout=30)
+            response = lark_api._get_lark_client().get(url)
             response.raise_for_status()
             
             data = response.json()
@@ -193,9 +362,8 @@ class ProjectTaskExtension(models.Model):
             # Map Lark assignee to Odoo user if possible
             assignee_id = False
             if task_data.get('assignee_id'):
-                user = self.env['res.users'].search([('lark_user_id', '=', task_data['assignee_id'])], limit=1)
-                if user:
-                    assignee_id = user.id
+                assignee_id = self.env['lark.user.map']._resolve_users(
+                    [task_data['assignee_id']], lark_api=lark_api).get(task_data['assignee_id'], False)
             
             # Update task fields
             update_vals = {
@@ -238,52 +406,115 @@ class ProjectTaskExtension(models.Model):
             raise UserError(_("Failed to sync task with Lark: %s") % str(e))
     
     def create_in_lark(self):
-        """Create this task in Lark"""
+        """Queue the creation of this task in Lark"""
         self.ensure_one()
         if not self.project_id.lark_id:
             raise UserError(_("This project is not linked to a Lark tasklist. Please link it first."))
-            
-        lark_api = self.env['lark.api'].search([], limit=1, order='id desc')
-        if not lark_api:
+        if not self.env['lark.api'].search([], limit=1):
             raise UserError(_("No Lark API configuration found. Please configure Lark integration first."))
-            
-        try:
-            task_data = {
-                'summary': self.name,
-                'description': self.description or '',
-                'due': {'date': self.date_deadline.isoformat() + 'Z'} if self.date_deadline else None,
-                'assignee_id': self.user_id.lark_user_id if hasattr(self.user_id, 'lark_user_id') else None,
-            }
-            
-            # Create task in Lark
-            response = lark_api._lark_request(
-                'POST',
-                f'/open-apis/task/v2/tasklists/{self.project_id.lark_id}/tasks',
-                json=task_data
-            )
-            
-            # Update task with Lark data
-            self.write({
-                'lark_id': response.get('id'),
-                'lark_guid': response.get('guid'),
-                'lark_etag': response.get('etag'),
-                'lark_updated': fields.Datetime.now(),
-            })
-            
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('Success'),
-                    'message': _('Task created in Lark successfully'),
-                    'type': 'success',
-                    'sticky': False,
-                }
+        self.env['lark.outbox']._enqueue(self, 'create', LARK_PUSH_FIELDS)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Queued'),
+                'message': _('Task will be created in Lark shortly'),
+                'type': 'success',
+                'sticky': False,
             }
-            
-        except Exception as e:
-            _logger.error("Failed to create task in Lark: %s", str(e), exc_info=True)
-            raise UserError(_("Failed to create task in Lark: %s") % str(e))
+        }
+
+    def write(self, vals):
+        pushed = LARK_PUSH_FIELDS.keys() & vals.keys()
+        if not pushed or self.env.context.get(LARK_ORIGIN_CONTEXT_KEY):
+            return super().write(vals)
+        was_done = {task.id: task.state == '1_done' for task in self} if 'state' in pushed else {}
+        res = super().write(vals)
+        tasks_by_fields = {}
+        for task in self.filtered('lark_guid'):
+            task_fields = set(pushed)
+            # Lark only knows completed or not: other stage changes are not pushed
+            if 'state' in task_fields and (task.state == '1_done') == was_done[task.id]:
+                task_fields.discard('state')
+            if task_fields:
+                key = frozenset(task_fields)
+                tasks_by_fields[key] = tasks_by_fields.get(key, self.browse()) | task
+        for task_fields, tasks in tasks_by_fields.items():
+            self.env['lark.outbox']._enqueue(tasks, 'update', task_fields)
+        return res
+
+    def _prepare_lark_task_payload(self, field_names):
+        """Lark task values of the given project.task fields.
+
+        :return: ``(task, update_fields)`` as expected by the Lark task API
+        """
+        self.ensure_one()
+        task = {}
+        for field_name in field_names:
+            lark_field = LARK_PUSH_FIELDS.get(field_name)
+            if lark_field == 'summary':
+                task['summary'] = self.name
+            elif lark_field == 'description':
+                task['description'] = html2plaintext(self.description or '')
+            elif lark_field == 'due':
+                task['due'] = {'timestamp': _lark_timestamp(self.date_deadline), 'is_all_day': False} \
+                    if self.date_deadline else None
+            elif lark_field == 'completed_at':
+                # Only queued when the task moved into or out of done
+                task['completed_at'] = _lark_timestamp(fields.Datetime.now()) if self.state == '1_done' else '0'
+        return task, sorted(task)
+
+    def _post_lark_task(self, lark_api):
+        """Create the task in Lark and return the created Lark task, without linking it"""
+        self.ensure_one()
+        task, _update_fields = self._prepare_lark_task_payload(LARK_PUSH_FIELDS)
+        task.pop('completed_at', None)
+        if not task.get('due'):
+            task.pop('due', None)
+        tasklist_guid = self.project_id._get_lark_tasklist_guid()
+        if tasklist_guid:
+            tasklist = {'tasklist_guid': tasklist_guid}
+            if self.project_id.lark_parent_tasklist_guid:
+                # The project is a section of that tasklist
+                tasklist['section_guid'] = self.project_id.lark_id
+            task['tasklists'] = [tasklist]
+        data = lark_api._lark_request('POST', TASK_CREATE_URL, json=task)
+        lark_task = data.get('task') or {}
+        if not lark_task.get('guid'):
+            raise UserError(_("Lark did not return the created task"))
+        return lark_task
+
+    def _patch_lark_task(self, lark_api, field_names):
+        self.ensure_one()
+        task, update_fields = self._prepare_lark_task_payload(field_names)
+        if not update_fields:
+            return
+        data = lark_api._lark_request('PATCH', TASK_PATCH_URL % self.lark_guid, json={
+            'task': task,
+            'update_fields': update_fields,
+        })
+        self._write_lark_reference(lark_api, data.get('task') or {})
+
+    def _write_lark_reference(self, lark_api, lark_task):
+        """Record the Lark version produced by a push.
+
+        The pushed task is also upserted into lark.task, in bulk sync mode
+        (no tracking values or messages), so the same version coming back in
+        the next pull or webhook fetch matches its etag (or payload hash) and
+        is skipped instead of being applied again.
+        """
+        self.ensure_one()
+        task = self.with_context(**{LARK_ORIGIN_CONTEXT_KEY: True})
+        vals = {'lark_updated': fields.Datetime.now()}
+        if lark_task.get('guid'):
+            vals.update(lark_id=lark_task['guid'], lark_guid=lark_task['guid'])
+        if lark_task.get('etag'):
+            vals['lark_etag'] = lark_task['etag']
+        task.write(vals)
+        normalized = normalize_lark_task(lark_task, self.project_id._get_lark_tasklist_guid())
+        if normalized and self.project_id:
+            lark_api.with_context(**BULK_SYNC_CONTEXT, **{LARK_ORIGIN_CONTEXT_KEY: True})._process_task_data(
+                [normalized], self.project_id.id)
 
 class ProjectProject(models.Model):
     _inherit = 'project.project'
@@ -50,11 +50,30 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='xcd_lark_project_sync.enable_sync',
         help='Enable/disable automatic synchronization with Lark'
     )
+    lark_log_retention_days = fields.Integer(
+        string='Log Retention (days)',
+        default=30,
+        config_parameter='xcd_lark_project_sync.log_retention_days',
+        help='Lark API logs older than this are deleted every night; 0 keeps them forever'
+    )
+    lark_metrics_token = fields.Char(
+        string='Metrics Token',
+        config_parameter='xcd_lark_project_sync.metrics_token',
+        help='Bearer token of the Prometheus scrapes of /xcd_lark_project_sync/metrics; '
+             'the endpoint is disabled while empty'
+    )
     lark_debug_mode = fields.Boolean(
         string='Debug Mode',
         default=False,
         config_parameter='xcd_lark_project_sync.debug_mode',
-        help='Enable debug logging for Lark integration'
+        help='Log the detail of every task processed by the syncs'
+    )
+    lark_trace_sample_rate = fields.Float(
+        string='Task Trace Sampling',
+        default=0.0,
+        digits=(3, 3),
+        config_parameter='xcd_lark_project_sync.trace_sample_rate',
+        help='Share of the synced tasks (0 to 1) whose detail is logged when debug mode is off'
     )
 
     @api.model
@@ -72,6 +91,9 @@ class ResConfigSettings(models.TransientModel):
             lark_sync_interval=int(get_param('xcd_lark_project_sync.sync_interval', '15')),
             lark_enable_sync=get_param('xcd_lark_project_sync.enable_sync', 'True').lower() == 'true',
             lark_debug_mode=get_param('xcd_lark_project_sync.debug_mode', 'False').lower() == 'true',
+            lark_log_retention_days=int(get_param('xcd_lark_project_sync.log_retention_days', '30')),
+            lark_metrics_token=get_param('xcd_lark_project_sync.metrics_token', ''),
+            lark_trace_sample_rate=float(get_param('xcd_lark_project_sync.trace_sample_rate', '0') or 0),
         )
         return res
 
@@ -91,4 +113,7 @@ class ResConfigSettings(models.TransientModel):
         set_param('xcd_lark_project_sync.webhook_encrypt_key', self.lark_webhook_encrypt_key or '')
         set_param('xcd_lark_project_sync.sync_interval', str(self.lark_sync_interval))
         set_param('xcd_lark_project_sync.enable_sync', str(self.lark_enable_sync))
-        set_param('xcd_lark_project_sync.debug_mode', str(self.lark_debug_mode))
\ No newline at end of file
+        set_param('xcd_lark_project_sync.debug_mode', str(self.lark_debug_mode))
+        set_param('xcd_lark_project_sync.log_retention_days', str(self.lark_log_retention_days))
+        set_param('xcd_lark_project_sync.metrics_token', self.lark_metrics_token or '')
+        set_param('xcd_lark_project_sync.trace_sample_rate', str(self.lark_trace_sample_rate or 0))
\ No newline at end of file
@@ -20,22 +20,11 @@ def post_init_hook(cr, registry=None):
         else:
             env = api.Environment(cr, SUPERUSER_ID, {})
         
-        # Add parent_id and has_children columns to lark_api_log
-        _logger.info('Adding parent_id and has_children fields to lark.api.log')
+        # Add parent_id column to lark_api_log
+        _logger.info('Adding parent_id field to lark.api.log')
         cr.execute("""
             ALTER TABLE lark_api_log 
             ADD COLUMN IF NOT EXISTS parent_id integer;
-            ALTER TABLE lark_api_log 
-            ADD COLUMN IF NOT EXISTS has_children boolean DEFAULT false;
-        """)
-        
-        # Update has_children flag for existing records
-        cr.execute("""
-            UPDATE lark_api_log SET has_children = true
-            WHERE id IN (
-                SELECT DISTINCT parent_id FROM lark_api_log
-                WHERE parent_id IS NOT NULL
-            );
         """)
         
         # Add Lark fields to project.task
@@ -0,0 +1,7 @@
+from . import test_lark_client
+from . import test_lark_subtask_links
+from . import test_lark_sync_watermark
+from . import test_lark_task_upsert
+from . import test_lark_user_map
+from . import test_lark_webhook
+from . import test_task_sequence
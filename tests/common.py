@@ -0,0 +1,35 @@
+from odoo.tests import TransactionCase
+
+
+class LarkSyncCase(TransactionCase):
+    """A Lark connection syncing to a project linked to a tasklist"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.project = cls.env['project.project'].create({
+            'name': 'Lark Sync Test',
+            'lark_id': 'tasklist-guid-1',
+        })
+        cls.lark_api = cls.env['lark.api'].create({
+            'name': 'Lark Sync Test',
+            'user_access_token': 'test-token',
+            'default_project_id': cls.project.id,
+        })
+
+    @classmethod
+    def _lark_task(cls, guid, summary=None, parent=None, due=None, updated_at=None, etag=None):
+        """A normalized Lark task, as produced by ``normalize_lark_task``"""
+        return {
+            'id': guid,
+            'guid': guid,
+            'summary': summary or f'Task {guid}',
+            'description': '',
+            'due': {'date': due} if due else None,
+            'status': 'todo',
+            'assignee_id': None,
+            'parent_id': parent,
+            'etag': etag,
+            'tasklist_guid': 'tasklist-guid-1',
+            'updated_at': updated_at,
+        }
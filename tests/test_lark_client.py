@@ -0,0 +1,191 @@
+from unittest.mock import MagicMock, patch
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models import lark_client
+from ..models.lark_client import CircuitBreaker, CircuitOpenError, LarkClient, RateLimiter, TokenBucket
+
+ENDPOINT = 'GET /open-apis/task/v2/tasklists/:id/tasks'
+TASKLIST_URL = '/open-apis/task/v2/tasklists/d300a75f-c56a-4be9-80d1-e47653028ceb/tasks'
+
+
+class FakeClock:
+    """Stands in for the ``time`` module of lark_client: sleeping moves the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class ClockCase(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.startPatcher(patch.object(lark_client, 'time', self.clock))
+
+
+@tagged('post_install', '-at_install')
+class TestTokenBucket(ClockCase):
+
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+        self.assertEqual(len(self.clock.slept), 1)
+
+    def test_throttle_halves_rate_and_pauses(self):
+        bucket = TokenBucket(rate=10, burst=10)
+        bucket.throttle(retry_after=2)
+        self.assertEqual(bucket.rate, 5.0)
+        self.assertEqual(bucket.tokens, 0.0)
+        self.assertAlmostEqual(bucket.acquire(), 2.0)
+
+    def test_throttle_never_goes_below_floor(self):
+        bucket = TokenBucket(rate=10, burst=10)
+        for _i in range(20):
+            bucket.throttle(retry_after=0)
+        self.assertEqual(bucket.rate, 10 * TokenBucket.MIN_RATE_RATIO)
+
+    def test_recover_is_additive_up_to_ceiling(self):
+        bucket = TokenBucket(rate=10, burst=10)
+        bucket.throttle(retry_after=0)
+        bucket.recover()
+        self.assertAlmostEqual(bucket.rate, 5.0 + 10 * TokenBucket.RECOVERY_RATIO)
+        for _i in range(100):
+            bucket.recover()
+        self.assertEqual(bucket.rate, 10.0)
+
+    def test_pause_keeps_rate(self):
+        bucket = TokenBucket(rate=10, burst=10)
+        bucket.pause(3)
+        self.assertEqual(bucket.rate, 10.0)
+        self.assertAlmostEqual(bucket.acquire(), 3.0)
+
+
+@tagged('post_install', '-at_install')
+class TestRateLimiter(ClockCase):
+
+    def test_buckets_per_endpoint(self):
+        limiter = RateLimiter({ENDPOINT: {'rate': 5, 'burst': 1}})
+        bucket = limiter.bucket(ENDPOINT)
+        self.assertIs(limiter.bucket(ENDPOINT), bucket)
+        self.assertEqual(bucket.max_rate, 5.0)
+        self.assertEqual(limiter.bucket('GET /other').max_rate, 50.0)
+
+    def test_configure_rebuilds_only_on_change(self):
+        limiter = RateLimiter({ENDPOINT: {'rate': 5}})
+        bucket = limiter.bucket(ENDPOINT)
+        limiter.configure({ENDPOINT: {'rate': 5}})
+        self.assertIs(limiter.bucket(ENDPOINT), bucket)
+        limiter.configure({ENDPOINT: {'rate': 20}})
+        self.assertEqual(limiter.bucket(ENDPOINT).max_rate, 20.0)
+
+
+@tagged('post_install', '-at_install')
+class TestBackoff(BaseCase):
+
+    def test_full_jitter_is_capped(self):
+        with patch.object(lark_client.random, 'uniform', side_effect=lambda low, high: high):
+            delays = [lark_client.backoff_delay(attempt, base=0.5, cap=8.0) for attempt in range(1, 8)]
+        self.assertEqual(delays, [0.5, 1.0, 2.0, 4.0, 8.0, 8.0, 8.0])
+
+    def test_jitter_stays_in_range(self):
+        for _i in range(50):
+            self.assertTrue(0.0 <= lark_client.backoff_delay(3, base=0.5, cap=8.0) <= 2.0)
+
+
+@tagged('post_install', '-at_install')
+class TestCircuitBreaker(ClockCase):
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(ENDPOINT, failure_threshold=3, reset_timeout=30)
+        self.assertFalse(breaker.record_failure())
+        self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_success_resets_count(self):
+        breaker = CircuitBreaker(ENDPOINT, failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertFalse(breaker.record_failure())
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_single_probe(self):
+        breaker = CircuitBreaker(ENDPOINT, failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.clock.now += 30
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(ENDPOINT, failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.clock.now += 30
+        breaker.before_call()
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.clock.now += 29
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_released_probe_lets_next_call_through(self):
+        breaker = CircuitBreaker(ENDPOINT, failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.clock.now += 30
+        breaker.before_call()
+        breaker.release()
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+@tagged('post_install', '-at_install')
+class TestLarkClientBreaker(ClockCase):
+
+    def setUp(self):
+        super().setUp()
+        self.startPatcher(patch.dict(lark_client._breakers, clear=True))
+        self.startPatcher(patch.object(lark_client, 'rate_limiter', RateLimiter()))
+        self.startPatcher(patch.object(lark_client, 'metrics', MagicMock()))
+
+    def _client(self, status, dbname='db1', app_id='app1'):
+        response = MagicMock(status_code=status, headers={}, content=b'{}')
+        response.request.body = None
+        session = MagicMock()
+        session.request.return_value = response
+        return LarkClient(session, access_token='token', max_retries=0, dbname=dbname, app_id=app_id)
+
+    def test_breakers_are_scoped_by_database_and_app(self):
+        failing = self._client(503)
+        for _i in range(lark_client.BREAKER_FAILURE_THRESHOLD):
+            failing.get(TASKLIST_URL)
+        with self.assertRaises(CircuitOpenError):
+            failing.get(TASKLIST_URL)
+
+        for other in (self._client(200, dbname='db2'), self._client(200, app_id='app2')):
+            self.assertEqual(other.get(TASKLIST_URL).status_code, 200)
+
+    def test_client_errors_do_not_open_breaker(self):
+        client = self._client(404)
+        for _i in range(lark_client.BREAKER_FAILURE_THRESHOLD + 1):
+            self.assertEqual(client.get(TASKLIST_URL).status_code, 404)
+        breaker = lark_client.get_circuit_breaker(ENDPOINT, ('db1', 'app1'))
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.failures, 0)
@@ -0,0 +1,57 @@
+from odoo.tests import tagged
+
+from .common import LarkSyncCase
+
+
+@tagged('post_install', '-at_install')
+class TestLarkSubtaskLinks(LarkSyncCase):
+
+    def _lark_tasks(self, *lark_ids):
+        return self.env['lark.task'].search([('lark_id', 'in', list(lark_ids))]).grouped('lark_id')
+
+    def test_child_page_before_parent_page(self):
+        id_map, parent_links = {}, {}
+        self.lark_api._process_task_data(
+            [self._lark_task('child-1', parent='parent-1'), self._lark_task('child-2', parent='parent-1')],
+            self.project.id, id_map=id_map, parent_links=parent_links)
+        # The parent is not synced yet: the links wait for it
+        self.assertEqual(self.lark_api._link_lark_subtasks(parent_links, id_map), 0)
+        self.assertEqual(parent_links, {'child-1': 'parent-1', 'child-2': 'parent-1'})
+
+        self.lark_api._process_task_data(
+            [self._lark_task('parent-1')], self.project.id, id_map=id_map, parent_links=parent_links)
+        self.assertEqual(self.lark_api._link_lark_subtasks(parent_links, id_map), 2)
+        self.assertFalse(parent_links)
+
+        tasks = self._lark_tasks('parent-1', 'child-1', 'child-2')
+        self.assertEqual(tasks['child-1'].parent_id, tasks['parent-1'])
+        self.assertEqual(tasks['child-2'].parent_id, tasks['parent-1'])
+        self.assertFalse(tasks['parent-1'].parent_id)
+        self.assertEqual(tasks['parent-1'].child_ids, tasks['child-1'] | tasks['child-2'])
+
+    def test_parent_outside_run_costs_one_query(self):
+        # Synced by an earlier run, unchanged since and so not listed again
+        self.lark_api._process_task_data([self._lark_task('parent-1')], self.project.id)
+
+        id_map, parent_links = {}, {}
+        self.lark_api._process_task_data(
+            [self._lark_task('child-1', parent='parent-1')], self.project.id,
+            id_map=id_map, parent_links=parent_links)
+        self.assertNotIn('parent-1', id_map)
+        self.env.flush_all()
+
+        # One query for the missing parents, one for the links
+        with self.assertQueryCount(2):
+            self.assertEqual(self.lark_api._link_lark_subtasks(parent_links, id_map), 1)
+        tasks = self._lark_tasks('parent-1', 'child-1')
+        self.assertEqual(tasks['child-1'].parent_id, tasks['parent-1'])
+
+    def test_parent_in_run_needs_no_lookup(self):
+        id_map, parent_links = {}, {}
+        self.lark_api._process_task_data(
+            [self._lark_task('parent-1'), self._lark_task('child-1', parent='parent-1')], self.project.id,
+            id_map=id_map, parent_links=parent_links)
+        self.env.flush_all()
+
+        with self.assertQueryCount(1):
+            self.assertEqual(self.lark_api._link_lark_subtasks(parent_links, id_map), 1)
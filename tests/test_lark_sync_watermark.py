@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models.lark_api import filter_tasks_updated_since
+from ..models.lark_client import LarkClient
+from .common import LarkSyncCase
+
+WATERMARK = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def lark_ms(value):
+    return str(int(value.replace(tzinfo=timezone.utc).timestamp() * 1000))
+
+
+@tagged('post_install', '-at_install')
+class TestFilterTasksUpdatedSince(BaseCase):
+
+    def test_full_sync_keeps_every_task(self):
+        tasks = [{'id': 'a', 'updated_at': lark_ms(WATERMARK)}, {'id': 'b'}]
+        changed, newest = filter_tasks_updated_since(tasks, False)
+        self.assertEqual(changed, tasks)
+        self.assertEqual(newest, WATERMARK)
+
+    def test_equal_second_boundary(self):
+        watermark_ms = int(lark_ms(WATERMARK))
+        tasks = [
+            {'id': 'before', 'updated_at': str(watermark_ms - 1)},
+            {'id': 'same-second', 'updated_at': str(watermark_ms)},
+            # The watermark is stored without its milliseconds
+            {'id': 'same-second-later', 'updated_at': str(watermark_ms + 999)},
+            {'id': 'after', 'updated_at': str(watermark_ms + 1000)},
+            {'id': 'no-timestamp'},
+        ]
+        changed, newest = filter_tasks_updated_since(tasks, WATERMARK)
+        self.assertEqual([task['id'] for task in changed],
+                         ['same-second', 'same-second-later', 'after', 'no-timestamp'])
+        self.assertEqual(newest, datetime(2024, 5, 1, 12, 0, 1))
+
+    def test_newest_includes_filtered_tasks(self):
+        tasks = [{'id': 'old', 'updated_at': lark_ms(datetime(2024, 4, 1))}]
+        changed, newest = filter_tasks_updated_since(tasks, WATERMARK)
+        self.assertEqual(changed, [])
+        self.assertEqual(newest, datetime(2024, 4, 1))
+
+    def test_invalid_timestamp_counts_as_changed(self):
+        changed, newest = filter_tasks_updated_since([{'id': 'a', 'updated_at': 'garbage'}], WATERMARK)
+        self.assertEqual(len(changed), 1)
+        self.assertFalse(newest)
+
+
+@tagged('post_install', '-at_install')
+class TestStreamTaskPages(LarkSyncCase):
+
+    def test_filtered_out_page_moves_the_page_token(self):
+        old, new = lark_ms(datetime(2024, 4, 1)), lark_ms(datetime(2024, 6, 1))
+        pages = [
+            ([{'guid': 'old-1', 'updated_at': old}], 'token-2'),
+            ([{'guid': 'new-1', 'updated_at': new}], None),
+        ]
+        spec = self.lark_api._prepare_task_fetch_specs(self.project)[0]
+        spec['watermark'] = WATERMARK
+        with patch.object(LarkClient, 'iter_pages', return_value=iter(pages)):
+            events = list(self.lark_api._stream_task_pages([spec]))
+        self.assertEqual([(event, payload[1] if event == 'page' else payload) for event, _spec, payload in events],
+                         [('page', 'token-2'), ('page', None), ('done', None)])
+        self.assertEqual(events[0][2][0], [])
+        self.assertEqual([task['id'] for task in events[1][2][0]], ['new-1'])
+        self.assertEqual(spec['tasks_skipped'], 1)
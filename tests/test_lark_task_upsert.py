@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from ..models.lark_api import BULK_SYNC_CONTEXT, LARK_TASK_ROW_FIELDS
+from .common import LarkSyncCase
+
+
+@tagged('post_install', '-at_install')
+class TestLarkTaskUpsert(LarkSyncCase):
+
+    def _create_tasks(self, *guids):
+        LarkTask = self.env['lark.task']
+        return LarkTask.union(*(
+            LarkTask.create(self.lark_api._prepare_lark_task_values(
+                self._lark_task(guid, due='2020-01-01 10:00:00'), self.project.id))
+            for guid in guids
+        ))
+
+    def test_row_update_matches_orm_write(self):
+        row_task, orm_task = self._create_tasks('guid-row', 'guid-orm')
+        self.assertTrue(row_task.is_overdue)
+        lark_api = self.lark_api.with_context(**BULK_SYNC_CONTEXT)
+        new_values = {}
+        for lark_task in (row_task, orm_task):
+            new_values[lark_task] = lark_api._prepare_lark_task_values(
+                self._lark_task(lark_task.lark_id, summary='Renamed', due='2999-01-01 10:00:00', etag='v2'),
+                self.project.id)
+
+        lark_api._write_lark_task_rows([(row_task, new_values[row_task])])
+        orm_task.with_context(**BULK_SYNC_CONTEXT).write(new_values[orm_task])
+        self.env.flush_all()
+        self.env.invalidate_all()
+
+        compared = list(LARK_TASK_ROW_FIELDS) + ['is_overdue', 'write_date', 'write_uid', 'status', 'project_id']
+        row, orm = row_task.read(compared)[0], orm_task.read(compared)[0]
+        for fname in compared:
+            if fname in ('lark_guid', 'json_data', 'lark_payload_hash'):
+                continue
+            self.assertEqual(row[fname], orm[fname], fname)
+        self.assertFalse(row_task.is_overdue)
+        self.assertEqual(row_task.lark_guid, 'guid-row')
+        self.assertEqual(row_task.lark_payload_hash, new_values[row_task]['lark_payload_hash'])
+
+    def test_row_update_only_in_bulk_sync(self):
+        lark_task = self._create_tasks('guid-1')
+        task_data = self._lark_task('guid-1', summary='Renamed', etag='v2')
+        task_batch = {'guid-1': (task_data, self.lark_api._prepare_lark_task_values(task_data, self.project.id))}
+        with patch.object(type(self.lark_api), '_write_lark_task_rows') as write_rows:
+            # A mail flag alone does not switch to the raw UPDATE
+            stats = self.lark_api.with_context(tracking_disable=True)._upsert_lark_tasks(task_batch)
+        write_rows.assert_not_called()
+        self.assertEqual(stats['updated'], 1)
+        self.assertEqual(lark_task.name, 'Renamed')
+
+        task_data = dict(task_data, summary='Renamed again', etag='v3')
+        task_batch = {'guid-1': (task_data, self.lark_api._prepare_lark_task_values(task_data, self.project.id))}
+        stats = self.lark_api.with_context(**BULK_SYNC_CONTEXT)._upsert_lark_tasks(task_batch)
+        self.assertEqual(stats['updated'], 1)
+        self.assertEqual(lark_task.name, 'Renamed again')
+
+    def test_same_etag_with_new_odoo_mapping_is_rewritten(self):
+        task_data = self._lark_task('guid-1', etag='v1')
+        task_batch = {'guid-1': (task_data, self.lark_api._prepare_lark_task_values(task_data, self.project.id))}
+        self.assertEqual(self.lark_api._upsert_lark_tasks(task_batch)['created'], 1)
+        self.assertEqual(self.lark_api._upsert_lark_tasks(task_batch)['unchanged'], 1)
+
+        # The Lark user got mapped in Odoo meanwhile: same ETag, new assignee
+        values = dict(task_batch['guid-1'][1], assignee_id=self.env.user.id)
+        stats = self.lark_api._upsert_lark_tasks({'guid-1': (task_data, values)})
+        self.assertEqual(stats['updated'], 1)
+        lark_task = self.env['lark.task'].search([('lark_id', '=', 'guid-1')])
+        self.assertEqual(lark_task.assignee_id, self.env.user)
@@ -0,0 +1,59 @@
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+from ..models.lark_user_map import user_cache
+
+
+@tagged('post_install', '-at_install')
+class TestLarkUserMap(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.UserMap = cls.env['lark.user.map']
+        cls.user_a = new_test_user(cls.env, login='lark_map_user_a')
+        cls.user_b = new_test_user(cls.env, login='lark_map_user_b')
+
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+
+    def _commit(self):
+        # The generation only moves once the mapping change is committed
+        self.env.flush_all()
+        self.env.cr.postcommit.run()
+
+    def test_mapping_change_invalidates_cache(self):
+        mapping = self.UserMap.create({'lark_open_id': 'ou_a', 'user_id': self.user_a.id})
+        self._commit()
+        self.assertEqual(self.UserMap._resolve_users(['ou_a']), {'ou_a': self.user_a.id})
+
+        mapping.user_id = self.user_b
+        self.env.flush_all()
+        self.assertEqual(self.UserMap._resolve_users(['ou_a']), {'ou_a': self.user_a.id},
+                         "the cache is kept until the change is committed")
+        self._commit()
+        self.assertEqual(self.UserMap._resolve_users(['ou_a']), {'ou_a': self.user_b.id})
+
+        mapping.unlink()
+        self._commit()
+        self.assertEqual(self.UserMap._resolve_users(['ou_a']), {'ou_a': False})
+
+    def test_created_mapping_replaces_cached_unknown_user(self):
+        self.assertEqual(self.UserMap._resolve_users(['ou_new']), {'ou_new': False})
+        self.UserMap.create({'lark_open_id': 'ou_new', 'user_id': self.user_a.id})
+        self._commit()
+        self.assertEqual(self.UserMap._resolve_users(['ou_new']), {'ou_new': self.user_a.id})
+
+    def test_generation_does_not_touch_other_databases(self):
+        user_cache.set(('other_db', 'ou_x'), 42)
+        self.UserMap.create({'lark_open_id': 'ou_b', 'user_id': self.user_b.id})
+        self._commit()
+        self.UserMap._resolve_users(['ou_b'])
+        self.assertEqual(user_cache.get(('other_db', 'ou_x')), 42)
+
+    def test_mapping_changes_write_no_config_parameter(self):
+        params = self.env['ir.config_parameter'].sudo().search_count([])
+        self.UserMap.create({'lark_open_id': 'ou_c', 'user_id': self.user_a.id})
+        self._commit()
+        self.assertEqual(self.env['ir.config_parameter'].sudo().search_count([]), params)
@@ -0,0 +1,90 @@
+import json
+import time
+
+from odoo.tests import HttpCase, tagged
+
+from ..models.lark_webhook_event import (
+    WEBHOOK_ENCRYPT_KEY_PARAM,
+    WEBHOOK_VERIFY_TOKEN_PARAM,
+    decrypt_lark_payload,
+    encrypt_lark_payload,
+    lark_signature,
+)
+
+WEBHOOK_URL = '/xcd_lark_project_sync/webhook'
+ENCRYPT_KEY = 'test-encrypt-key'
+VERIFY_TOKEN = 'test-verify-token'
+
+
+@tagged('post_install', '-at_install')
+class TestLarkWebhook(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        set_param = self.env['ir.config_parameter'].sudo().set_param
+        set_param(WEBHOOK_ENCRYPT_KEY_PARAM, ENCRYPT_KEY)
+        set_param(WEBHOOK_VERIFY_TOKEN_PARAM, VERIFY_TOKEN)
+
+    def _task_event(self, event_id='evt-1', task_guid='task-guid-1'):
+        return {
+            'schema': '2.0',
+            'header': {
+                'event_id': event_id,
+                'event_type': 'task.task.update_tenant_v1',
+                'token': VERIFY_TOKEN,
+            },
+            'event': {'task_guid': task_guid},
+        }
+
+    def _post(self, event, sign=True, encrypt=True, signature=None):
+        body = json.dumps({'encrypt': encrypt_lark_payload(ENCRYPT_KEY, event)} if encrypt else event)
+        headers = {'Content-Type': 'application/json'}
+        if sign:
+            timestamp, nonce = str(int(time.time())), 'nonce-1'
+            headers.update({
+                'X-Lark-Request-Timestamp': timestamp,
+                'X-Lark-Request-Nonce': nonce,
+                'X-Lark-Signature': signature or lark_signature(timestamp, nonce, ENCRYPT_KEY, body),
+            })
+        return self.url_open(WEBHOOK_URL, data=body, headers=headers)
+
+    def _stored(self, event_id='evt-1'):
+        return self.env['lark.webhook.event'].sudo().search([('event_id', '=', event_id)])
+
+    def test_encrypt_decrypt_round_trip(self):
+        event = self._task_event()
+        self.assertEqual(decrypt_lark_payload(ENCRYPT_KEY, encrypt_lark_payload(ENCRYPT_KEY, event)), event)
+        with self.assertRaises(ValueError):
+            decrypt_lark_payload(ENCRYPT_KEY, 'dG9vIHNob3J0')
+
+    def test_url_verification(self):
+        response = self._post({'type': 'url_verification', 'challenge': 'abc', 'token': VERIFY_TOKEN}, sign=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'challenge': 'abc'})
+
+    def test_signed_encrypted_event_is_stored(self):
+        response = self._post(self._task_event())
+        self.assertEqual(response.status_code, 200)
+        stored = self._stored()
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored.task_guid, 'task-guid-1')
+        self.assertEqual(stored.state, 'pending')
+
+        # Lark redelivers events it got no timely answer for
+        self.assertEqual(self._post(self._task_event()).status_code, 200)
+        self.assertEqual(len(self._stored()), 1)
+
+    def test_unsigned_event_is_rejected(self):
+        self.assertEqual(self._post(self._task_event(), sign=False).status_code, 401)
+        self.assertEqual(self._post(self._task_event(), signature='0' * 64).status_code, 401)
+        self.assertFalse(self._stored())
+
+    def test_plaintext_event_is_rejected_with_encrypt_key(self):
+        self.assertEqual(self._post(self._task_event(), sign=False, encrypt=False).status_code, 400)
+        self.assertFalse(self._stored())
+
+    def test_invalid_token_is_rejected(self):
+        event = self._task_event()
+        event['header']['token'] = 'forged'
+        self.assertEqual(self._post(event).status_code, 401)
+        self.assertFalse(self._stored())
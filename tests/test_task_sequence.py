@@ -0,0 +1,51 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestTaskSequence(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Allocator = cls.env['lark.task.sequence.allocator']
+
+    def _sequence(self, code, implementation):
+        sequence = self.env['ir.sequence'].create({
+            'name': f'Test {implementation}',
+            'code': code,
+            'prefix': 'TST-',
+            'padding': 4,
+            'number_next': 5,
+            'number_increment': 1,
+            'implementation': implementation,
+        })
+        sequence.read(['prefix', 'suffix', 'padding', 'use_date_range', 'implementation', 'number_increment'])
+        return sequence
+
+    def test_standard_numbers_reserved_in_one_query(self):
+        sequence = self._sequence('lark.test.standard', 'standard')
+        with self.assertQueryCount(1):
+            numbers = self.Allocator._reserve_sequence_numbers(sequence, 3)
+        self.assertEqual(numbers, ['TST-0005', 'TST-0006', 'TST-0007'])
+        self.assertEqual(sequence.next_by_id(), 'TST-0008')
+
+    def test_no_gap_numbers_reserved_in_one_query(self):
+        sequence = self._sequence('lark.test.no_gap', 'no_gap')
+        with self.assertQueryCount(1):
+            numbers = self.Allocator._reserve_sequence_numbers(sequence, 3)
+        self.assertEqual(numbers, ['TST-0005', 'TST-0006', 'TST-0007'])
+        self.assertEqual(sequence.number_next, 8)
+        self.assertEqual(sequence.next_by_id(), 'TST-0008')
+
+    def test_batch_resolves_its_sequence_once(self):
+        self._sequence('lark.test.tes', 'standard')
+        self.env.registry.clear_cache()
+        vals_list = [{'name': 'Test one'}, {'name': 'Test two'}, {'name': 'Numbered', 'task_sequence': 'X'}]
+        self.Allocator._assign_task_sequences(vals_list, 'lark.test', 'Test')
+        self.assertEqual([vals['task_sequence'] for vals in vals_list], ['TST-0005', 'TST-0006', 'X'])
+
+        # The sequence id is cached: one query for the numbers of the batch
+        vals_list = [{'name': 'Test three'}, {'name': 'Test four'}]
+        with self.assertQueryCount(1):
+            self.Allocator._assign_task_sequences(vals_list, 'lark.test', 'Test')
+        self.assertEqual([vals['task_sequence'] for vals in vals_list], ['TST-0007', 'TST-0008'])